@@ -2,14 +2,18 @@
 
 import os
 import json
-import time
+from contextlib import contextmanager
 from fastapi import HTTPException, Header
-from pydantic import BaseModel
-from typing import Type
+from pydantic import BaseModel, ValidationError
+from typing import Type, Optional
 
 # +++ 核心改动：导入正确的验证函数 +++
 # (我们只导入新的 verify_signature，旧的 _verify_signature_from_dict 由 sign_message 的对等方使用)
 from shared.crypto_utils import verify_signature
+from backend.db import replay_guard
+from backend.api import sessions
+from backend.api.sessions import verify_session_token
+from backend.db.aio import queries_user as aio_queries_user
 
 # --- 导入模型 ---
 from backend.api.models import (
@@ -40,6 +44,9 @@ def get_verified_message(request: MarketSignedRequest, model: Type[BaseModel]):
         # 1. 仍然解析 JSON 以便验证模型和提取 owner_key
         message_dict = json.loads(request.message_json)
         message = model(**message_dict)
+    except ValidationError as e:
+        # 字段校验失败 (例如金额超过 6 位小数) 与 FastAPI 的请求体校验一致返回 422
+        raise HTTPException(status_code=422, detail=f"无效的消息体: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"无效的消息体: {e}")
         
@@ -53,8 +60,10 @@ def get_verified_message(request: MarketSignedRequest, model: Type[BaseModel]):
         raise HTTPException(status_code=403, detail="签名无效")
     # +++ 核心改动结束 +++
         
-    if (time.time() - message.timestamp) > 300: # 5分钟有效期
-        raise HTTPException(status_code=400, detail="请求已过期")
+    # 有效期 (5分钟) 内同一条签名消息只能使用一次
+    accepted, reason = replay_guard.check_and_record(request.message_json, message.timestamp)
+    if not accepted:
+        raise HTTPException(status_code=400, detail=reason)
         
     return message # 返回 Pydantic 模型
 
@@ -65,6 +74,8 @@ def get_verified_nft_action_message(request: NFTActionRequest, model: Type[BaseM
     try:
         message_dict = json.loads(request.message_json)
         message = model(**message_dict)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"无效的消息体: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"无效的消息体: {e}")
         
@@ -76,7 +87,55 @@ def get_verified_nft_action_message(request: NFTActionRequest, model: Type[BaseM
         raise HTTPException(status_code=403, detail="签名无效")
     # +++ 核心改动结束 +++
         
-    if (time.time() - message.timestamp) > 300:
-        raise HTTPException(status_code=400, detail="请求已过期")
+    accepted, reason = replay_guard.check_and_record(request.message_json, message.timestamp)
+    if not accepted:
+        raise HTTPException(status_code=400, detail=reason)
         
-    return message
\ No newline at end of file
+    return message
+
+@contextmanager
+def release_on_failure(request, message):
+    """
+    包住已验签消息对应的操作: 操作抛出异常 (包括查询层返回失败后路由抛出的 HTTPException) 时撤销防重放记录，
+    客户端可以重新提交同一条签名消息。与 /batch 的规则一致: 只有没有提交的操作才撤销，成功提交后仍然只能使用一次。
+    """
+    try:
+        yield
+    except Exception:
+        replay_guard.release(request.message_json, message.timestamp)
+        raise
+
+# --- Session Tokens ---
+
+async def get_session_public_key(authorization: str = Header(None)) -> Optional[str]:
+    """
+    解析 "Authorization: Bearer <token>" 会话令牌，返回令牌所属的公钥；未携带令牌时返回 None。
+    (async: 通常只做一次 HMAC 比较；每隔 SESSION_ACTIVE_CHECK_SECONDS 用异步查询确认用户未被禁用)
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="无效的 Authorization 头")
+    valid, result = verify_session_token(token.strip())
+    if not valid:
+        raise HTTPException(status_code=401, detail=result)
+    if sessions.active_check_due(result):
+        active = await aio_queries_user.is_user_active(result)
+        sessions.record_active_check(result, active)
+        if not active:
+            raise HTTPException(status_code=401, detail="用户不存在或已被禁用")
+    return result
+
+def resolve_reader_key(public_key: Optional[str], session_key: Optional[str]) -> str:
+    """
+    读接口的用户公钥: 优先使用会话令牌中的公钥，兼容仍然直接传 public_key 参数的旧客户端。
+    两者同时提供且不一致时拒绝。
+    """
+    if session_key:
+        if public_key and public_key != session_key:
+            raise HTTPException(status_code=403, detail="public_key 与会话令牌不一致")
+        return session_key
+    if not public_key:
+        raise HTTPException(status_code=400, detail="必须提供公钥或会话令牌")
+    return public_key
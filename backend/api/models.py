@@ -1,7 +1,44 @@
 # backend/api/models.py
 
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, AfterValidator
+from typing import Optional, List, Dict, Any, Annotated
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+# --- 金额 ---
+# 数据库金额列为 NUMERIC(20, 6)，查询返回 Decimal；响应模型中的 float 字段在序列化时自动转换。
+# 请求中的金额最多 6 位小数，超出精度的金额直接拒绝 (422)，避免 0.0000001 这类金额通过 "> 0" 校验后被数据库舍入为 0；
+# 签名消息中的金额不做静默舍入，实际入账的金额必须与用户签名的金额一致。服务器自己计算出的金额才使用 to_money 舍入。
+MONEY_DECIMAL_PLACES = 6
+_MONEY_QUANTUM = Decimal(1).scaleb(-MONEY_DECIMAL_PLACES)
+
+def to_money(value) -> Decimal:
+    """将数值转换为 6 位小数的 Decimal (经由 str 转换，不引入二进制浮点误差)。"""
+    return Decimal(str(value)).quantize(_MONEY_QUANTUM, rounding=ROUND_HALF_UP)
+
+def _check_money_precision(value: float) -> float:
+    try:
+        exact = to_money(value) == Decimal(str(value))
+    except InvalidOperation:
+        exact = False
+    if not exact:
+        raise ValueError(f"金额最多保留 {MONEY_DECIMAL_PLACES} 位小数")
+    return value
+
+# 请求模型中的金额字段类型
+Money = Annotated[float, AfterValidator(_check_money_precision)]
+
+def _decimals_to_float(value):
+    """将查询结果中的 Decimal 转为 float。pydantic 会把 dict 里的 Decimal 序列化成字符串，前端和机器人需要数字。"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {k: _decimals_to_float(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decimals_to_float(v) for v in value]
+    return value
+
+# 响应模型中直接返回查询行 (dict) 且包含金额时使用
+MoneyDict = Annotated[dict, AfterValidator(_decimals_to_float)]
 
 # --- Pydantic 模型定义 ---
 class UserRegisterRequest(BaseModel):
@@ -25,6 +62,20 @@ class UserLoginResponse(BaseModel):
     username: str
     uid: str
 
+class SessionChallengeResponse(BaseModel):
+    challenge: str
+    expires_at: float
+
+class SessionLoginMessage(BaseModel):
+    owner_key: str
+    challenge: str
+    timestamp: float
+
+class SessionLoginResponse(BaseModel):
+    token: str
+    public_key: str
+    expires_at: float
+
 class FriendActionMessage(BaseModel):
     owner_key: str
     target_key: str
@@ -60,7 +111,7 @@ class FriendshipStatusResponse(BaseModel):
 class TransactionMessage(BaseModel):
     from_key: str
     to_key: str
-    amount: float
+    amount: Money
     timestamp: float
     note: Optional[str] = None
 
@@ -73,7 +124,7 @@ class BalanceResponse(BaseModel):
     balance: float
 
 class HistoryResponse(BaseModel):
-    transactions: List[dict]
+    transactions: List[MoneyDict]
     
 class UserDetailsResponse(BaseModel):
     public_key: str
@@ -130,7 +181,7 @@ class NFTListResponse(BaseModel):
     
 class AdminIssueRequest(BaseModel):
     to_key: str 
-    amount: float
+    amount: Money
     note: Optional[str] = None
     
 class AdminMultiIssueRequest(BaseModel):
@@ -139,7 +190,7 @@ class AdminMultiIssueRequest(BaseModel):
 
 class AdminBurnRequest(BaseModel):
     from_key: str 
-    amount: float
+    amount: Money
     note: Optional[str] = None
 
 class AdminDeleteUserRequest(BaseModel):
@@ -161,7 +212,134 @@ class AdminSetUserActiveStatusRequest(BaseModel):
     is_active: bool
 
 class AdminBalancesResponse(BaseModel):
-    balances: List[dict]
+    balances: List[MoneyDict]
+
+class AdminPoolStatsResponse(BaseModel):
+    min_connections: int
+    max_connections: int
+    timeout_seconds: float
+    idle_timeout_seconds: float
+    opened: int
+    in_use: int
+    idle: int
+    waiting: int
+    peak_in_use: int
+    checkouts: int
+    waited_checkouts: int
+    exhausted_events: int
+    connections_created: int
+    connections_closed: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    wait_histogram: Dict[str, int]
+
+class CryptoKeyCacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+    hit_rate: float
+
+class CryptoVerifyStats(BaseModel):
+    verified: int
+    failed: int
+    failure_reasons: Dict[str, int]
+    avg_verify_us: float
+    max_verify_us: float
+    latency_histogram: Dict[str, int]
+    trace_level: str
+    trace_sample_rate: float
+
+class ReplayGuardStats(BaseModel):
+    backend: str
+    window_seconds: int
+    entries: int
+    max_entries: int
+    buckets: int
+    accepted: int
+    replayed: int
+    expired: int
+    rejected_full: int
+    released: int
+    database_errors: int
+
+class SessionTokenStats(BaseModel):
+    ttl_seconds: int
+    cached_claims: int
+    issued: int
+    verified: int
+    cache_hits: int
+    rejected: int
+    active_checks: int
+    inactive_rejected: int
+
+class PasswordHashStats(BaseModel):
+    method: str
+    workers: int
+    max_pending: int
+    hashed: int
+    verified: int
+    rejected_busy: int
+    avg_ms: float
+    max_ms: float
+
+class KeyPoolStats(BaseModel):
+    alive: bool
+    size: int
+    target_size: int
+    low_watermark: int
+    taken: int
+    misses: int
+    generated: int
+    refills: int
+    last_refill_ms: float
+
+class AdminCryptoStatsResponse(BaseModel):
+    public_key_cache: CryptoKeyCacheStats
+    verify: CryptoVerifyStats
+    replay_guard: ReplayGuardStats
+    sessions: SessionTokenStats
+    password_hashing: PasswordHashStats
+    key_pool: KeyPoolStats
+
+class AdminReconcileMismatch(BaseModel):
+    public_key: str
+    balance: float
+    expected_balance: float
+    difference: float
+
+class AdminReconcileResponse(BaseModel):
+    accounts_checked: int
+    mismatched_accounts: int
+    total_balance: float
+    total_expected: float
+    mismatches: List[AdminReconcileMismatch]
+
+class AdminAuctionSettlementStatsResponse(BaseModel):
+    worker_alive: bool
+    interval_seconds: float
+    batch_size: int
+    batches: int
+    total_settled: int
+    total_failed: int
+    retry_suppressed: int
+    last_batch_at: Optional[float] = None
+    last_batch_claimed: int
+    last_batch_duration_ms: float
+    throughput_per_minute: float
+    last_lag_seconds: float
+    avg_lag_seconds: float
+    max_lag_seconds: float
+    backlog_pending: int
+    backlog_oldest_lag_seconds: float
+    scheduler_alive: bool
+    scheduler_pending: int
+    scheduler_fired: int
+    scheduler_settled: int
+    scheduler_dropped: int
+    scheduler_notified: int
+    scheduler_last_fire_delay_seconds: float
+    scheduler_max_fire_delay_seconds: float
 
 class AdminResetPasswordRequest(BaseModel):
     public_key: str
@@ -213,7 +391,7 @@ class MarketListingRequest(BaseModel):
     nft_id: Optional[str] = None
     nft_type: str
     description: str
-    price: float
+    price: Money
     auction_hours: Optional[float] = None
 
 class MarketActionMessage(BaseModel):
@@ -225,7 +403,7 @@ class MarketBidRequest(BaseModel):
     owner_key: str
     timestamp: float
     listing_id: str
-    amount: float
+    amount: Money
 
 class BidHistoryResponse(BaseModel):
     bid_amount: float
@@ -249,20 +427,42 @@ class ShopCreateNftRequest(BaseModel):
     owner_key: str
     timestamp: float
     nft_type: str
-    cost: float
+    cost: Money
     data: dict
 
 class ShopActionRequest(BaseModel):
     owner_key: str
     timestamp: float
     nft_type: str
-    cost: float
+    cost: Money
     data: dict
 
+# --- 批量签名操作 (/batch) ---
+class BatchItem(BaseModel):
+    op: str # nft_action / buy / place_bid / create_listing / cancel_listing
+    message_json: str
+    signature: str
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    atomic: bool = False # True: 任一项失败则全部回滚；False: 每项独立 (保存点)
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    success: bool
+    status_code: int
+    detail: str
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
 class AdminCreateBotRequest(BaseModel):
     username: Optional[str] = None
     bot_type: str
-    initial_funds: float
+    initial_funds: Money
     action_probability: float
 
 class AdminBotInfo(BaseModel):
@@ -281,6 +481,76 @@ class AdminSetBotConfigRequest(BaseModel):
     public_key: str
     action_probability: float
 
+class BotHttpPoolStats(BaseModel):
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry_seconds: float
+    http2: bool
+    registered_clients: int
+    open_connections: int
+    idle_connections: int
+    active_connections: int
+    requests: int
+    errors: int
+    in_flight: int
+    peak_in_flight: int
+    clients_created: int
+    avg_ms: float
+    max_ms: float
+
+class BotLogWriterStats(BaseModel):
+    alive: bool
+    pending: int
+    max_pending: int
+    flush_size: int
+    flush_interval_seconds: float
+    enqueued: int
+    written: int
+    dropped: int
+    sampled_out: int
+    flushes: int
+    failed_flushes: int
+    failed_rows: int
+    last_flush_ms: float
+
+class BotMarketSnapshotStats(BaseModel):
+    loads: int
+    reads: int
+    removed: int
+    repriced: int
+    invalidations: int
+    slices: int
+    listings: int
+
+class AdminBotRuntimeStatsResponse(BaseModel):
+    client_mode: str
+    active_bots: int
+    http_pool: BotHttpPoolStats
+    log_writer: BotLogWriterStats
+    market_snapshot: Optional[BotMarketSnapshotStats] = None # 最近一个回合，尚未运行过回合时为空
+
+class BotShardInfo(BaseModel):
+    shard_id: str
+    host: Optional[str] = None
+    pid: Optional[int] = None
+    alive: bool
+    bots: int
+    ticks: int
+    last_acting: int
+    last_tick_ms: float
+    avg_tick_ms: float
+    max_tick_ms: float
+    tick_errors: int
+    rebalances: int
+    started_at: Optional[float] = None
+    last_heartbeat: float
+    last_tick_at: Optional[float] = None
+
+class AdminBotShardsResponse(BaseModel):
+    runner_mode: str # embedded / external
+    heartbeat_timeout_seconds: float
+    shards: List[BotShardInfo]
+
 class BotLogEntry(BaseModel):
     log_id: str
     timestamp: float
@@ -293,6 +563,42 @@ class BotLogEntry(BaseModel):
 class AdminBotLogResponse(BaseModel):
     logs: List[BotLogEntry]
 
+class BotLogRollupEntry(BaseModel):
+    bucket: float
+    bot_key: str
+    bot_username: Optional[str] = None
+    action_type: str
+    log_count: int
+
+class AdminBotLogRollupResponse(BaseModel):
+    rollups: List[BotLogRollupEntry]
+
+class LogPartitionInfo(BaseModel):
+    name: str
+    lower: float
+    upper: float
+
+class LogTableOverview(BaseModel):
+    partitions: List[LogPartitionInfo]
+    default_rows: int
+
+class AdminLogMaintenanceStatsResponse(BaseModel):
+    runs: int
+    errors: int
+    last_run_at: Optional[float] = None
+    last_duration_ms: float
+    last_error: Optional[str] = None
+    partitions_created: int
+    partitions_dropped: int
+    rollup_rows: int
+    rolled_up_to: Optional[float] = None
+    worker_alive: bool
+    interval_seconds: float
+    partition_interval: str
+    bot_log_retention_days: float
+    notification_retention_days: float
+    tables: Dict[str, LogTableOverview]
+
 class AdminMarketTradeHistoryEntry(BaseModel):
     trade_id: str
     listing_id: str
@@ -9,13 +9,30 @@ from backend.api.models import (
     AdminAdjustUserQuotaRequest, AdminSetUserActiveStatusRequest,
     AdminResetPasswordRequest, AdminPurgeUserRequest, AdminCreateBotRequest,
     AdminBotInfo, AdminBotListResponse, AdminSetBotConfigRequest,
-    AdminBotLogResponse, AdminMarketTradeHistoryResponse
+    AdminBotLogResponse, AdminMarketTradeHistoryResponse, AdminPoolStatsResponse,
+    AdminAuctionSettlementStatsResponse, AdminReconcileResponse, AdminCryptoStatsResponse,
+    AdminBotRuntimeStatsResponse, AdminBotLogRollupResponse, AdminLogMaintenanceStatsResponse,
+    AdminBotShardsResponse
 )
 from backend.api.dependencies import verify_admin
 from backend.nft_logic import get_handler, get_available_nft_types
 from backend.nft_admin_utils import get_mint_info_for_type
 from backend.bots import BOT_LOGIC_MAP
+from backend.bots.bot_runner import get_bot_runtime_stats, BOT_RUNNER_MODE
+from backend.bots.shard_runner import BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS
 from backend.db import queries_user # 需要 get_user_details
+from backend.db.database import get_pool_stats
+from backend.db.replay_guard import get_replay_guard_stats
+from backend.api.sessions import get_session_stats
+from backend.db import password_hashing
+from backend.db.password_hashing import get_password_hash_stats
+from backend.workers import key_pool
+from backend.workers.key_pool import get_key_pool_stats
+from backend.workers.auction_settlement import get_settlement_stats
+from backend.workers.log_maintenance import get_log_maintenance_stats
+from backend.db.log_retention import get_bot_log_rollups
+from shared.crypto_utils import get_public_key_cache_stats
+from shared.crypto_trace import get_verify_stats
 
 router = APIRouter()
 
@@ -80,6 +97,12 @@ def api_admin_get_all_balances():
     balances = queries_system.get_all_balances(include_inactive=True)
     return AdminBalancesResponse(balances=balances)
 
+@router.get("/reconcile", response_model=AdminReconcileResponse, tags=["Admin"], dependencies=[Depends(verify_admin)])
+def api_admin_reconcile(limit: int = 100):
+    """对账: 校验每个账户的余额是否等于其流水净额。"""
+    if limit > 1000: limit = 1000
+    return AdminReconcileResponse(**queries_system.reconcile_balances(limit=limit))
+
 @router.get("/setting/{key}", tags=["Admin"], dependencies=[Depends(verify_admin)])
 def api_admin_get_setting(key: str):
     from backend.db.database import get_setting # 避免循环导入
@@ -114,7 +137,12 @@ def api_admin_set_user_active_status(request: AdminSetUserActiveStatusRequest):
 def api_admin_reset_user_password(request: AdminResetPasswordRequest):
     if not request.new_password or len(request.new_password) < 6:
         raise HTTPException(status_code=400, detail="新密码至少需要6个字符。")
-    success, detail = queries_system.admin_reset_user_password(request.public_key, request.new_password)
+    # 先计算哈希再进入事务 (不在持有数据库连接时计算)
+    try:
+        new_password_hash = password_hashing.hash_password(request.new_password)
+    except password_hashing.PasswordHashBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    success, detail = queries_system.admin_reset_user_password(request.public_key, new_password_hash)
     if not success:
         raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
@@ -139,6 +167,11 @@ def api_admin_get_market_trade_history(limit: int = 100):
     history = queries_market.admin_get_market_trade_history(limit=limit)
     return AdminMarketTradeHistoryResponse(history=history)
 
+@router.get("/market/settlement_stats", response_model=AdminAuctionSettlementStatsResponse, tags=["Admin"], dependencies=[Depends(verify_admin)])
+def api_admin_get_settlement_stats():
+    """拍卖结算 worker 的吞吐量、结算延迟和当前积压。"""
+    return AdminAuctionSettlementStatsResponse(**get_settlement_stats())
+
 # --- Admin Bots ---
 @router.get("/bots/types", response_model=Dict, tags=["Admin Bots"], dependencies=[Depends(verify_admin)])
 def api_admin_get_bot_types():
@@ -168,7 +201,8 @@ def api_admin_create_bot(request: AdminCreateBotRequest):
         username=request.username,
         bot_type=request.bot_type,
         initial_funds=request.initial_funds,
-        action_probability=request.action_probability
+        action_probability=request.action_probability,
+        key_pair=key_pool.take_key_pair()
     )
     
     if not success:
@@ -190,4 +224,47 @@ def api_admin_set_bot_config(request: AdminSetBotConfigRequest):
 def api_admin_get_bot_logs(public_key: str = None, limit: int = 100):
     if limit > 500: limit = 500
     logs = queries_bots.admin_get_bot_logs(bot_key=public_key, limit=limit)
-    return AdminBotLogResponse(logs=logs)
\ No newline at end of file
+    return AdminBotLogResponse(logs=logs)
+
+@router.get("/bots/log_rollups", response_model=AdminBotLogRollupResponse, tags=["Admin Bots"], dependencies=[Depends(verify_admin)])
+def api_admin_get_bot_log_rollups(public_key: str = None, hours: int = 24):
+    """按小时汇总的机器人日志条数 (原始日志超过保留期被删除后仍然保留)。"""
+    if hours > 24 * 366: hours = 24 * 366
+    return AdminBotLogRollupResponse(rollups=get_bot_log_rollups(bot_key=public_key, hours=hours))
+
+@router.get("/bots/runtime_stats", response_model=AdminBotRuntimeStatsResponse, tags=["Admin Bots"], dependencies=[Depends(verify_admin)])
+def api_admin_get_bot_runtime_stats():
+    return AdminBotRuntimeStatsResponse(**get_bot_runtime_stats())
+
+@router.get("/bots/shards", response_model=AdminBotShardsResponse, tags=["Admin Bots"], dependencies=[Depends(verify_admin)])
+def api_admin_get_bot_shards():
+    """独立分片运行器 (shard_runner) 各分片的心跳和回合指标。"""
+    return AdminBotShardsResponse(
+        runner_mode=BOT_RUNNER_MODE,
+        heartbeat_timeout_seconds=BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS,
+        shards=queries_bots.get_bot_shards(BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS)
+    )
+
+# --- Admin DB ---
+@router.get("/db/pool_stats", response_model=AdminPoolStatsResponse, tags=["Admin DB"], dependencies=[Depends(verify_admin)])
+def api_admin_get_pool_stats():
+    try:
+        return AdminPoolStatsResponse(**get_pool_stats())
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/db/log_maintenance", response_model=AdminLogMaintenanceStatsResponse, tags=["Admin DB"], dependencies=[Depends(verify_admin)])
+def api_admin_get_log_maintenance_stats():
+    return AdminLogMaintenanceStatsResponse(**get_log_maintenance_stats())
+
+# --- Admin Crypto ---
+@router.get("/crypto/stats", response_model=AdminCryptoStatsResponse, tags=["Admin Crypto"], dependencies=[Depends(verify_admin)])
+def api_admin_get_crypto_stats():
+    return AdminCryptoStatsResponse(
+        public_key_cache=get_public_key_cache_stats(),
+        verify=get_verify_stats(),
+        replay_guard=get_replay_guard_stats(),
+        sessions=get_session_stats(),
+        password_hashing=get_password_hash_stats(),
+        key_pool=get_key_pool_stats()
+    )
@@ -0,0 +1,186 @@
+# backend/api/routes_batch.py
+
+import os
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException
+from backend.db import queries_market, replay_guard
+from backend.db.database import get_db_connection, transaction_aborted
+from backend.api.models import (
+    BatchRequest, BatchResponse, BatchItemResult,
+    MarketSignedRequest, NFTActionRequest, NFTActionMessage,
+    MarketListingRequest, MarketActionMessage, MarketBidRequest
+)
+from backend.api.dependencies import get_verified_message, get_verified_nft_action_message
+from backend.api.routes_nft import _execute_nft_action
+
+"""
+批量提交已签名操作: 先并行验签，再在同一个数据库事务中依次执行。
+- 非原子模式 (默认): 每一项使用独立的保存点，失败只回滚该项，其余照常提交；
+- 原子模式: 任一项验签或执行失败，整批回滚。
+验签时已记录防重放摘要；最终被回滚的项撤销其记录，客户端可以原样重新提交。
+"""
+
+router = APIRouter()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_VERIFY_WORKERS = int(os.getenv("BATCH_VERIFY_WORKERS", "4"))
+
+_verify_pool = ThreadPoolExecutor(max_workers=BATCH_VERIFY_WORKERS, thread_name_prefix="batch-verify")
+
+
+# --- 各操作的执行函数: (conn, message) -> (success, detail, post_commit_hook) ---
+# 执行函数不提交也不回滚；post_commit_hook 在整批提交后调用 (例如登记拍卖调度)。
+
+def _run_nft_action(conn, message):
+    return True, _execute_nft_action(message, conn), None
+
+def _run_buy(conn, message):
+    success, detail = queries_market.execute_sale_in_tx(conn, message.owner_key, message.listing_id)
+    return success, detail, None
+
+def _run_place_bid(conn, message):
+    success, detail = queries_market.place_auction_bid_in_tx(conn, message.owner_key, message.listing_id, message.amount)
+    return success, detail, None
+
+def _run_create_listing(conn, message):
+    success, detail, listing = queries_market.create_market_listing_in_tx(
+        conn, message.owner_key, message.listing_type, message.nft_id, message.nft_type,
+        message.description, message.price, message.auction_hours
+    )
+    return success, detail, (lambda: queries_market.after_listing_created(listing)) if success else None
+
+def _run_cancel_listing(conn, message):
+    success, detail = queries_market.cancel_market_listing_in_tx(conn, message.owner_key, message.listing_id)
+    return success, detail, (lambda: queries_market.after_listing_cancelled(message.listing_id)) if success else None
+
+# 操作名 -> (请求结构, 消息模型, 验签函数, 执行函数)，与对应的单条接口保持一致
+BATCH_OPERATIONS = {
+    "nft_action": (NFTActionRequest, NFTActionMessage, get_verified_nft_action_message, _run_nft_action),
+    "buy": (MarketSignedRequest, MarketActionMessage, get_verified_message, _run_buy),
+    "place_bid": (MarketSignedRequest, MarketBidRequest, get_verified_message, _run_place_bid),
+    "create_listing": (MarketSignedRequest, MarketListingRequest, get_verified_message, _run_create_listing),
+    "cancel_listing": (MarketSignedRequest, MarketActionMessage, get_verified_message, _run_cancel_listing),
+}
+
+
+def _verify_item(item):
+    """验签单个操作，返回 (message, None) 或 (None, HTTPException)。在线程池中运行。"""
+    operation = BATCH_OPERATIONS.get(item.op)
+    if not operation:
+        return None, HTTPException(status_code=400, detail=f"不支持的批量操作: {item.op}")
+    request_model, message_model, verify, _ = operation
+    try:
+        request = request_model(message_json=item.message_json, signature=item.signature)
+        return verify(request, message_model), None
+    except HTTPException as e:
+        return None, e
+
+
+def _execute_item(conn, op: str, message) -> (bool, int, str, object):
+    """在保存点中执行单个操作，返回 (success, status_code, detail, post_commit_hook)。"""
+    with conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT batch_item")
+    try:
+        success, detail, hook = BATCH_OPERATIONS[op][3](conn, message)
+        status_code = 200 if success else 400
+    except HTTPException as e:
+        success, status_code, detail, hook = False, e.status_code, e.detail, None
+    except Exception as e:
+        success, status_code, detail, hook = False, 500, f"执行失败: {e}", None
+    if success and transaction_aborted(conn):
+        # 内部函数吞掉了 SQL 错误: 只回滚该项，不能让 RELEASE 失败拖垮整批
+        success, status_code, detail, hook = False, 500, "执行失败: 有 SQL 语句失败，事务已中止", None
+
+    with conn.cursor() as cursor:
+        if success:
+            cursor.execute("RELEASE SAVEPOINT batch_item")
+        else:
+            cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+    return success, status_code, detail, hook
+
+
+@router.post("/batch", response_model=BatchResponse, tags=["Batch"])
+def api_submit_batch(request: BatchRequest):
+    """
+    批量提交已签名的操作 (nft_action / buy / place_bid / create_listing / cancel_listing)。
+    每一项的 message_json 和 signature 与对应的单条接口完全相同，按提交顺序执行。
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="批量操作不能为空")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多提交 {BATCH_MAX_ITEMS} 个操作")
+
+    # --- 1. 并行验签 (执行前完成，不占用数据库连接) ---
+    verified = list(_verify_pool.map(_verify_item, request.items))
+    return execute_batch(
+        [item.op for item in request.items], verified, request.atomic,
+        message_jsons=[item.message_json for item in request.items]
+    )
+
+
+def _release_rolled_back(verified: list, message_jsons: List[str], committed: list):
+    """撤销已通过验签 (已记录防重放摘要) 但最终没有提交的项的记录。验签失败的项没有记录，不能撤销。"""
+    if not message_jsons:
+        return
+    for index, (message, error) in enumerate(verified):
+        if error is None and not committed[index]:
+            replay_guard.release(message_jsons[index], message.timestamp)
+
+
+def execute_batch(ops: List[str], verified: list, atomic: bool, message_jsons: List[str] = None) -> BatchResponse:
+    """
+    在同一个事务中依次执行已验证的操作。verified[i] 为 (message, None) 或 (None, HTTPException)。
+    message_jsons: 各项的原始签名消息，用于撤销被回滚项的防重放记录。
+    (进程内机器人客户端直接构造消息模型后调用此函数，跳过验签和防重放检查)
+    """
+    results = [None] * len(ops)
+    for index, (op, (message, error)) in enumerate(zip(ops, verified)):
+        if error:
+            results[index] = BatchItemResult(index=index, op=op, success=False, status_code=error.status_code, detail=str(error.detail))
+
+    aborted = atomic and any(error for _, error in verified)
+
+    # --- 2. 在同一个事务中依次执行 ---
+    hooks = []
+    if not aborted:
+        with get_db_connection() as conn:
+            try:
+                for index, (op, (message, error)) in enumerate(zip(ops, verified)):
+                    if error:
+                        continue
+                    success, status_code, detail, hook = _execute_item(conn, op, message)
+                    results[index] = BatchItemResult(index=index, op=op, success=success, status_code=status_code, detail=str(detail))
+                    if hook:
+                        hooks.append(hook)
+                    if not success and atomic:
+                        aborted = True
+                        break
+
+                if aborted:
+                    conn.rollback()
+                    hooks = []
+                else:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                _release_rolled_back(verified, message_jsons, [False] * len(ops))
+                raise
+
+    for hook in hooks:
+        hook()
+
+    # --- 3. 原子模式下整批回滚: 未执行或已回滚的项标记为失败 ---
+    if aborted:
+        for index, op in enumerate(ops):
+            result = results[index]
+            if result is None or result.success:
+                results[index] = BatchItemResult(
+                    index=index, op=op, success=False, status_code=409,
+                    detail="批次中有其他操作失败，本操作未执行或已回滚"
+                )
+
+    _release_rolled_back(verified, message_jsons, [result.success for result in results])
+
+    succeeded = sum(1 for r in results if r.success)
+    return BatchResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
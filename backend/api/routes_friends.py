@@ -7,7 +7,7 @@ from backend.api.models import (
     FriendActionMessage, FriendRespondMessage, FriendListResponse,
     FriendRequestListResponse
 )
-from backend.api.dependencies import get_verified_message
+from backend.api.dependencies import get_verified_message, release_on_failure
 
 router = APIRouter()
 
@@ -22,37 +22,40 @@ def api_get_friendship_status(target_key: str, current_user_key: str): # <-- 函
 @router.post("/friends/request", response_model=SuccessResponse, tags=["Friends"])
 def api_send_friend_request(request: MarketSignedRequest):
     message = get_verified_message(request, FriendActionMessage)
-    success, detail = queries_user.send_friend_request(
-        requester_key=message.owner_key,
-        target_key=message.target_key
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_user.send_friend_request(
+            requester_key=message.owner_key,
+            target_key=message.target_key
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 
 @router.post("/friends/respond", response_model=SuccessResponse, tags=["Friends"])
 def api_respond_to_friend_request(request: MarketSignedRequest):
     message = get_verified_message(request, FriendRespondMessage)
-    success, detail = queries_user.respond_to_friend_request(
-        responder_key=message.owner_key,
-        requester_key=message.requester_key,
-        accept=message.accept
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_user.respond_to_friend_request(
+            responder_key=message.owner_key,
+            requester_key=message.requester_key,
+            accept=message.accept
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 
 @router.post("/friends/delete", response_model=SuccessResponse, tags=["Friends"])
 def api_delete_friend(request: MarketSignedRequest):
     message = get_verified_message(request, FriendActionMessage)
-    success, detail = queries_user.delete_friend(
-        deleter_key=message.owner_key,
-        friend_to_delete_key=message.target_key
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_user.delete_friend(
+            deleter_key=message.owner_key,
+            friend_to_delete_key=message.target_key
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 
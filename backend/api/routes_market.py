@@ -1,8 +1,9 @@
 # backend/api/routes_market.py
 
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Depends
+from typing import List, Dict, Optional
 from backend.db import queries_market, queries_user
+from backend.db.aio import queries_market as aio_queries_market
 from backend.db.database import get_db_connection, _create_system_transaction, BURN_ACCOUNT
 from backend.api.models import (
     MarketSignedRequest, MarketListingRequest, SuccessResponse,
@@ -10,39 +11,64 @@ from backend.api.models import (
     MarketOfferRequest, MarketOfferResponseRequest,
     ShopCreateNftRequest, ShopActionRequest
 )
-from backend.api.dependencies import get_verified_message
+from backend.api.dependencies import get_verified_message, release_on_failure, get_session_public_key, resolve_reader_key
 from backend.nft_logic import NFT_HANDLERS, get_handler
 from backend.db import queries_user
 
 router = APIRouter()
 @router.get("/listings", tags=["Market"])
-def api_get_market_listings(listing_type: str, exclude_owner: str = None, search_term: str = None): # <-- 核心修改: 添加 search_term
-    items_raw = queries_market.get_market_listings( # <--- 1. 获取原始数据
-        listing_type=listing_type, 
-        exclude_owner=exclude_owner,
-        search_term=search_term
-    )
+async def api_get_market_listings(
+    listing_type: str, exclude_owner: str = None, search_term: str = None,
+    nft_type: str = None, min_price: float = None, max_price: float = None,
+    sort: str = None, cursor: str = None, limit: int = queries_market.MARKET_LISTINGS_DEFAULT_LIMIT
+):
+    """
+    分页获取挂单。过滤 (nft_type / 价格区间 / 搜索词) 与排序均在数据库中完成。
+    sort: newest | price_asc | price_desc | relevance (需提供 search_term)；
+    价格排序和价格区间均按当前价格 (拍卖为最高出价，无出价时为起拍价)。
+    未指定时，有搜索词则按相关度排序，否则按最新排序。翻页时传回上一页返回的 next_cursor。
+    """
+    try:
+        # (异步查询层，不占用线程池)
+        page = await aio_queries_market.get_market_listings( # <--- 1. 获取原始数据
+            listing_type=listing_type,
+            exclude_owner=exclude_owner,
+            search_term=search_term,
+            nft_type=nft_type,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # --- 2. 在 API 层处理业务逻辑 ---
-    processed_items = []
-    for item in items_raw:
+    _attach_trade_descriptions(page['listings'])
+
+    return page # <--- 3. 返回 {"listings": [...], "next_cursor": ...}
+
+def _attach_trade_descriptions(listings: list):
+    """为挂单补充 trade_description (每种 NFT 类型只实例化一次处理器)。"""
+    handlers = {}
+    for item in listings:
         if item.get('nft_data'):
-            nft_type = item.get('nft_type')
-            handler = get_handler(nft_type)
+            nft_type_of_item = item.get('nft_type')
+            if nft_type_of_item not in handlers:
+                handlers[nft_type_of_item] = get_handler(nft_type_of_item)
+            handler = handlers[nft_type_of_item]
             if handler:
-                temp_nft_for_desc = {"data": item['nft_data'], "nft_type": nft_type}
+                temp_nft_for_desc = {"data": item['nft_data'], "nft_type": nft_type_of_item}
                 item['trade_description'] = handler.get_trade_description(temp_nft_for_desc)
             else:
                 item['trade_description'] = item['description'] # 备用
         else:
              item['trade_description'] = item['description'] # 备用 (例如 SEEK)
-        processed_items.append(item)
-    # --- 处理结束 ---
-
-    return {"listings": processed_items} # <--- 3. 返回处理后的数据
 
 @router.get("/my_activity", tags=["Market"])
-def api_get_my_activity(public_key: str):
+def api_get_my_activity(public_key: str = None, session_key: Optional[str] = Depends(get_session_public_key)):
+    public_key = resolve_reader_key(public_key, session_key)
     activity = queries_market.get_my_market_activity(public_key)
     return activity
 
@@ -72,75 +98,81 @@ def api_get_bid_history(listing_id: str):
 @router.post("/create_listing", response_model=SuccessResponse, tags=["Market"])
 def api_create_listing(request: MarketSignedRequest):
     message = get_verified_message(request, MarketListingRequest)
-    success, detail = queries_market.create_market_listing(
-        lister_key=message.owner_key,
-        listing_type=message.listing_type,
-        nft_id=message.nft_id,
-        nft_type=message.nft_type,
-        description=message.description,
-        price=message.price,
-        auction_hours=message.auction_hours
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.create_market_listing(
+            lister_key=message.owner_key,
+            listing_type=message.listing_type,
+            nft_id=message.nft_id,
+            nft_type=message.nft_type,
+            description=message.description,
+            price=message.price,
+            auction_hours=message.auction_hours
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.post("/cancel_listing", response_model=SuccessResponse, tags=["Market"])
 def api_cancel_listing(request: MarketSignedRequest):
     message = get_verified_message(request, MarketActionMessage)
-    success, detail = queries_market.cancel_market_listing(
-        lister_key=message.owner_key,
-        listing_id=message.listing_id
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.cancel_market_listing(
+            lister_key=message.owner_key,
+            listing_id=message.listing_id
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.post("/buy", response_model=SuccessResponse, tags=["Market"])
 def api_buy_nft(request: MarketSignedRequest):
     message = get_verified_message(request, MarketActionMessage)
-    success, detail = queries_market.execute_sale(
-        buyer_key=message.owner_key,
-        listing_id=message.listing_id
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.execute_sale(
+            buyer_key=message.owner_key,
+            listing_id=message.listing_id
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.post("/place_bid", response_model=SuccessResponse, tags=["Market"])
 def api_place_bid(request: MarketSignedRequest):
     message = get_verified_message(request, MarketBidRequest)
-    success, detail = queries_market.place_auction_bid(
-        bidder_key=message.owner_key,
-        listing_id=message.listing_id,
-        bid_amount=message.amount
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.place_auction_bid(
+            bidder_key=message.owner_key,
+            listing_id=message.listing_id,
+            bid_amount=message.amount
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.post("/make_offer", response_model=SuccessResponse, tags=["Market"])
 def api_make_offer(request: MarketSignedRequest):
     message = get_verified_message(request, MarketOfferRequest)
-    success, detail = queries_market.make_seek_offer(
-        offerer_key=message.owner_key,
-        listing_id=message.listing_id,
-        offered_nft_id=message.offered_nft_id
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.make_seek_offer(
+            offerer_key=message.owner_key,
+            listing_id=message.listing_id,
+            offered_nft_id=message.offered_nft_id
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.post("/respond_offer", response_model=SuccessResponse, tags=["Market"])
 def api_respond_offer(request: MarketSignedRequest):
     message = get_verified_message(request, MarketOfferResponseRequest)
-    success, detail = queries_market.respond_to_seek_offer(
-        seeker_key=message.owner_key,
-        offer_id=message.offer_id,
-        accept=message.accept
-    )
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
+    with release_on_failure(request, message):
+        success, detail = queries_market.respond_to_seek_offer(
+            seeker_key=message.owner_key,
+            offer_id=message.offer_id,
+            accept=message.accept
+        )
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail=detail)
 
 @router.get("/creatable_nfts", tags=["Market"])
@@ -155,7 +187,11 @@ def api_get_creatable_nfts():
 @router.post("/create_nft", response_model=Dict, tags=["Market"])
 def api_create_nft_from_shop(request: MarketSignedRequest):
     message = get_verified_message(request, ShopCreateNftRequest)
-    
+    with release_on_failure(request, message):
+        return _create_nft_from_shop(message)
+
+def _create_nft_from_shop(message: ShopCreateNftRequest) -> dict:
+    """执行已验签的商店铸造，返回 {"detail", "nft_id"}；失败时抛出 HTTPException。"""
     handler = get_handler(message.nft_type)
     if not handler:
         raise HTTPException(status_code=400, detail="无效的NFT类型")
@@ -196,7 +232,11 @@ def api_create_nft_from_shop(request: MarketSignedRequest):
 @router.post("/shop_action", response_model=Dict, tags=["Market"])
 def api_perform_shop_action(request: MarketSignedRequest):
     message = get_verified_message(request, ShopActionRequest)
+    with release_on_failure(request, message):
+        return _perform_shop_action(message)
 
+def _perform_shop_action(message: ShopActionRequest) -> dict:
+    """执行已验签的商店动作，返回 {"detail", "nft_id"}；失败时抛出 HTTPException。"""
     handler = get_handler(message.nft_type)
     if not handler:
         raise HTTPException(status_code=400, detail="无效的NFT类型")
@@ -1,16 +1,16 @@
 # backend/api/routes_nft.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 import json
-from typing import List
+from typing import List, Optional
 from backend.db import queries_nft
-from backend.db import queries_user
+from backend.db.aio import queries_nft as aio_queries_nft
 from backend.api.models import (
     NFTListResponse, NFTResponse, NFTActionRequest,
     NFTActionMessage, SuccessResponse,
     AccumulatedJphResponse
 )
-from backend.api.dependencies import get_verified_nft_action_message
+from backend.api.dependencies import get_verified_nft_action_message, release_on_failure, get_session_public_key, resolve_reader_key
 from backend.nft_logic import NFT_HANDLERS, get_handler
 # (V3 新增导入)
 from backend.db.database import get_db_connection, _create_system_transaction, BURN_ACCOUNT, GENESIS_ACCOUNT
@@ -27,10 +27,28 @@ def api_get_nft_display_names():
     return names
 
 @router.get("/my", response_model=NFTListResponse, tags=["NFT"])
-def api_get_my_nfts(public_key: str):
-    if not public_key:
-        raise HTTPException(status_code=400, detail="必须提供公钥")
-    nfts = queries_nft.get_nfts_by_owner(public_key)
+async def api_get_my_nfts(public_key: str = None, session_key: Optional[str] = Depends(get_session_public_key)):
+    public_key = resolve_reader_key(public_key, session_key)
+    nfts = await aio_queries_nft.get_nfts_by_owner(public_key)
+    return NFTListResponse(nfts=nfts)
+
+@router.get("/search", response_model=NFTListResponse, tags=["NFT"])
+def api_search_nfts(
+    nft_type: str = None, owner_key: str = None, species_rarity: str = None,
+    min_rarity_total: float = None, min_total_jph: float = None,
+    sort_by: str = "created_at", descending: bool = True,
+    limit: int = 50, offset: int = 0
+):
+    """按 NFT 属性在数据库中过滤和排序 (例如按星球稀有度或灵宠 JPH 排行)。"""
+    if limit > 200: limit = 200
+    try:
+        nfts = queries_nft.search_nfts(
+            nft_type=nft_type, owner_key=owner_key, species_rarity=species_rarity,
+            min_rarity_total=min_rarity_total, min_total_jph=min_total_jph,
+            sort_by=sort_by, descending=descending, limit=limit, offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return NFTListResponse(nfts=nfts)
 
 @router.get("/{nft_id}", response_model=NFTResponse, tags=["NFT"])
@@ -84,11 +102,16 @@ def api_get_nft_jph_status(nft_id: str):
         is_ready=is_ready,
         cooldown_left_seconds=cd_left
     )
-@router.post("/action", response_model=SuccessResponse, tags=["NFT"])
-def api_perform_nft_action(request: NFTActionRequest):
-    message = get_verified_nft_action_message(request, NFTActionMessage)
-    
-    nft = queries_nft.get_nft_by_id(message.nft_id)
+# 需要在事务中处理费用/产出的动作 (其余动作如 rename、destroy 不涉及资金)
+TRANSACTIONAL_NFT_ACTIONS = ['scan', 'harvest', 'train', 'breed']
+
+def _execute_nft_action(message: NFTActionMessage, conn) -> str:
+    """
+    在给定事务中执行一个已验签的 NFT 动作，返回成功信息。
+    失败时抛出 HTTPException；不提交也不回滚，由调用方 (/nfts/action 或 /batch) 处理。
+    """
+    # 锁定 NFT 行，同一 NFT 的并发动作 (例如重复收获) 串行执行
+    nft = queries_nft.get_nft_by_id(message.nft_id, conn=conn, for_update=True)
     if not nft or nft['owner_key'] != message.owner_key:
         raise HTTPException(status_code=404, detail="未找到 NFT 或你不是所有者")
 
@@ -104,86 +127,79 @@ def api_perform_nft_action(request: NFTActionRequest):
     if not is_valid:
         raise HTTPException(status_code=400, detail=reason)
 
-    # (V3 核心修改：将 'scan', 'harvest', 'train', 'breed' 纳入事务处理)
-    if message.action in ['scan', 'harvest', 'train', 'breed']: # <<< (2) 新增 'train', 'breed'
-        
-        with get_db_connection() as conn:
-            
-            # --- 1. 处理成本 (如果是 'scan' 或 'train') ---
-            cost = 0.0
-            note = ""
-            
-            if message.action == 'scan':
-                cost = PLANET_ECONOMICS.get('SCAN_COST', 10.0) 
-                note = f"NFT 扫描: {nft['nft_id'][:8]}"
-            
-            elif message.action == 'train': # <<< (3) 新增 'train' 成本逻辑
-                level = nft['data'].get('level', 1)
-                cost = PET_ECONOMICS.get('TRAIN_COST_PER_LEVEL', 5.0) * level
-                note = f"灵宠训练: {nft['nft_id'][:8]}"
-            
-            if cost > 0:
-                current_balance = queries_user.get_balance(message.owner_key) 
-                if current_balance < cost:
-                    raise HTTPException(status_code=400, detail=f"余额不足以支付 {cost} FC 的{message.action}费用")
-                
-                success_pay, detail_pay = _create_system_transaction(
-                    message.owner_key, BURN_ACCOUNT, cost, note, conn
-                )
-                if not success_pay:
-                    conn.rollback()
-                    raise HTTPException(status_code=500, detail=f"支付失败: {detail_pay}")
-
-            # --- 2. 执行动作 (scan, harvest, train, breed) ---
-            # <<< (4) 传递 conn 到 perform_action >>>
-            success, detail, updated_data = handler.perform_action(nft, message.action, message.action_data, message.owner_key, conn=conn)
-            if not success:
-                conn.rollback()
-                raise HTTPException(status_code=500, detail=detail)
-
-            # --- 3. (V3 新增) 处理产出 (如果是 'harvest') ---
-            if message.action == 'harvest':
-                jcoin_produced = updated_data.pop('__jcoin_produced__', 0.0)
-                if jcoin_produced > 0:
-                    success_grant, detail_grant = _create_system_transaction(
-                        GENESIS_ACCOUNT, message.owner_key, jcoin_produced, f"NFT 收获: {nft['nft_id'][:8]}", conn
-                    )
-                    if not success_grant:
-                        conn.rollback()
-                        raise HTTPException(status_code=500, detail=f"收获成功但JCoin发放失败: {detail_grant}")
-
-            # --- 4. 更新 NFT 数据 ---
-            new_status = updated_data.pop('__new_status__', None)
-            from backend.db.queries_nft import update_nft # 避免循环导入
-            
-            # 在同一个事务连接中更新 NFT
-            data_json = json.dumps(updated_data, ensure_ascii=False)
-            try:
-                cursor = conn.cursor()
-                if new_status:
-                    cursor.execute("UPDATE nfts SET data = %s, status = %s WHERE nft_id = %s", (data_json, new_status, message.nft_id))
-                else:
-                    cursor.execute("UPDATE nfts SET data = %s WHERE nft_id = %s", (data_json, message.nft_id))
-                if cursor.rowcount == 0:
-                    conn.rollback()
-                    raise HTTPException(status_code=500, detail="执行成功但数据更新失败: 未找到 NFT")
-            except Exception as e:
-                conn.rollback()
-                raise HTTPException(status_code=500, detail=f"执行成功但数据更新失败: {e}")
-
-            conn.commit()
-            return SuccessResponse(detail=detail)
-
-    else:
-        # --- 处理不需要支付的动作 (例如 'rename', 'destroy') ---
-        success, detail, updated_data = handler.perform_action(nft, message.action, message.action_data, message.owner_key, conn=None) # <<< (5) 传递 conn=None
-        if not success:
-            raise HTTPException(status_code=500, detail=detail)
-
-        new_status = updated_data.pop('__new_status__', None)
-
-        update_success, update_detail = queries_nft.update_nft(message.nft_id, updated_data, new_status)
-        if not update_success:
-            raise HTTPException(status_code=500, detail=f"执行成功但数据更新失败: {update_detail}")
-
-        return SuccessResponse(detail=detail)
\ No newline at end of file
+    is_transactional = message.action in TRANSACTIONAL_NFT_ACTIONS
+
+    # --- 1. 处理成本 (如果是 'scan' 或 'train') ---
+    cost = 0.0
+    note = ""
+    if message.action == 'scan':
+        cost = PLANET_ECONOMICS.get('SCAN_COST', 10.0) 
+        note = f"NFT 扫描: {nft['nft_id'][:8]}"
+    elif message.action == 'train':
+        level = nft['data'].get('level', 1)
+        cost = PET_ECONOMICS.get('TRAIN_COST_PER_LEVEL', 5.0) * level
+        note = f"灵宠训练: {nft['nft_id'][:8]}"
+
+    if cost > 0:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT balance FROM balances WHERE public_key = %s", (message.owner_key,))
+            row = cursor.fetchone()
+        if not row or row[0] < cost:
+            raise HTTPException(status_code=400, detail=f"余额不足以支付 {cost} FC 的{message.action}费用")
+
+        success_pay, detail_pay = _create_system_transaction(
+            message.owner_key, BURN_ACCOUNT, cost, note, conn
+        )
+        if not success_pay:
+            raise HTTPException(status_code=500, detail=f"支付失败: {detail_pay}")
+
+    # --- 2. 执行动作 (只有涉及资金的动作需要事务连接) ---
+    success, detail, updated_data = handler.perform_action(
+        nft, message.action, message.action_data, message.owner_key, conn=conn if is_transactional else None
+    )
+    if not success:
+        raise HTTPException(status_code=500, detail=detail)
+
+    # --- 3. 处理产出 (如果是 'harvest') ---
+    if message.action == 'harvest':
+        jcoin_produced = updated_data.pop('__jcoin_produced__', 0.0)
+        if jcoin_produced > 0:
+            success_grant, detail_grant = _create_system_transaction(
+                GENESIS_ACCOUNT, message.owner_key, jcoin_produced, f"NFT 收获: {nft['nft_id'][:8]}", conn
+            )
+            if not success_grant:
+                raise HTTPException(status_code=500, detail=f"收获成功但JCoin发放失败: {detail_grant}")
+
+    # --- 4. 在同一个事务连接中更新 NFT 数据 ---
+    new_status = updated_data.pop('__new_status__', None)
+    data_json = json.dumps(updated_data, ensure_ascii=False)
+    try:
+        with conn.cursor() as cursor:
+            if new_status:
+                cursor.execute("UPDATE nfts SET data = %s, status = %s WHERE nft_id = %s", (data_json, new_status, message.nft_id))
+            else:
+                cursor.execute("UPDATE nfts SET data = %s WHERE nft_id = %s", (data_json, message.nft_id))
+            updated = cursor.rowcount
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"执行成功但数据更新失败: {e}")
+    if updated == 0:
+        raise HTTPException(status_code=500, detail="执行成功但数据更新失败: 未找到 NFT")
+
+    return detail
+
+@router.post("/action", response_model=SuccessResponse, tags=["NFT"])
+def api_perform_nft_action(request: NFTActionRequest):
+    message = get_verified_nft_action_message(request, NFTActionMessage)
+    with release_on_failure(request, message):
+        return _perform_nft_action(message)
+
+def _perform_nft_action(message: NFTActionMessage) -> SuccessResponse:
+    """在独立事务中执行已验签的 NFT 动作。"""
+    with get_db_connection() as conn:
+        try:
+            detail = _execute_nft_action(message, conn)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return SuccessResponse(detail=detail)
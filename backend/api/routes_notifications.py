@@ -1,21 +1,21 @@
 # backend/api/routes_notifications.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
 from backend.db import queries_notifications
+from backend.db.aio import queries_notifications as aio_queries_notifications
 from backend.api.models import (
     NotificationListResponse, SuccessResponse,
     MarketSignedRequest, MarketActionMessage 
 )
-from backend.api.dependencies import get_verified_message
+from backend.api.dependencies import get_verified_message, release_on_failure, get_session_public_key, resolve_reader_key
 
 router = APIRouter()
 
 @router.get("/notifications/my", response_model=NotificationListResponse, tags=["Notifications"])
-def api_get_my_notifications(public_key: str):
-    if not public_key:
-        raise HTTPException(status_code=400, detail="必须提供 public_key")
-    
-    data = queries_notifications.get_notifications_by_user(public_key)
+async def api_get_my_notifications(public_key: str = None, session_key: Optional[str] = Depends(get_session_public_key)):
+    public_key = resolve_reader_key(public_key, session_key)
+    data = await aio_queries_notifications.get_notifications_by_user(public_key)
     return NotificationListResponse(**data)
 
 @router.post("/notifications/mark_read", response_model=SuccessResponse, tags=["Notifications"])
@@ -25,8 +25,9 @@ def api_mark_notification_as_read(request: MarketSignedRequest):
     notif_id = message.listing_id 
     user_key = message.owner_key
 
-    success, detail = queries_notifications.mark_notification_as_read(notif_id, user_key)
+    with release_on_failure(request, message):
+        success, detail = queries_notifications.mark_notification_as_read(notif_id, user_key)
 
-    if not success and detail != "通知不存在或已读":
-        raise HTTPException(status_code=400, detail=detail)
+        if not success and detail != "通知不存在或已读":
+            raise HTTPException(status_code=400, detail=detail)
     return SuccessResponse(detail="通知状态已更新")
\ No newline at end of file
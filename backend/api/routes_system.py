@@ -1,10 +1,11 @@
 # backend/api/routes_system.py
 
 from fastapi import APIRouter, HTTPException
-from backend.db import queries_system
+from backend.db import queries_system, password_hashing
+from backend.workers import key_pool
 from backend.api.models import GenesisRegisterRequest, GenesisRegisterResponse,PublicSettingsResponse
 from backend.api.dependencies import GENESIS_PASSWORD
-from backend.db.database import get_setting
+from backend.db.database import get_settings_snapshot
 router = APIRouter()
 
 @router.get("/status", tags=["System"])
@@ -26,9 +27,16 @@ def api_genesis_register(request: GenesisRegisterRequest):
     if not request.password or len(request.password) < 6:
         raise HTTPException(status_code=400, detail="用户密码至少需要6个字符")
 
+    # 先计算哈希、取出密钥对，再进入事务 (不在持有数据库连接时做哈希和密钥运算)
+    try:
+        password_hash = password_hashing.hash_password(request.password)
+    except password_hashing.PasswordHashBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
     success, detail, user_data = queries_system.create_genesis_user(
         username=request.username, 
-        password=request.password
+        password_hash=password_hash,
+        key_pair=key_pool.take_key_pair()
     )
 
     if not success:
@@ -43,9 +51,10 @@ def api_get_public_settings():
     获取公开的、非敏感的系统设置，例如邀请奖励。
     """
     try:
-        # 从数据库的 settings 表中读取值
-        welcome_str = get_setting('welcome_bonus_amount')
-        inviter_str = get_setting('inviter_bonus_amount')
+        # 从设置缓存中读取值 (缓存过期时才会查询 settings 表)
+        settings = get_settings_snapshot()
+        welcome_str = settings.get('welcome_bonus_amount')
+        inviter_str = settings.get('inviter_bonus_amount')
         
         # 转换为浮点数，如果不存在则默认为 0.0
         welcome_bonus = float(welcome_str) if welcome_str else 0.0
@@ -1,30 +1,42 @@
 # backend/api/routes_user.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
 from backend.db import queries_user
+from backend.db.aio import queries_user as aio_queries_user
 from backend.api.models import (
     UserLoginRequest, UserLoginResponse, UserRegisterRequest, UserRegisterResponse,
     UserProfileResponse, MarketSignedRequest, ProfileUpdateRequest, SuccessResponse,
     TransactionRequest, TransactionMessage, BalanceResponse, HistoryResponse,
     UserDetailsResponse, UserListResponse, InvitationCodeResponse,
-    MessageGenerateCode, InvitationCodeListResponse
+    MessageGenerateCode, InvitationCodeListResponse,
+    SessionChallengeResponse, SessionLoginMessage, SessionLoginResponse
 )
-from backend.api.dependencies import get_verified_message
+from backend.api.dependencies import get_verified_message, release_on_failure, get_session_public_key, resolve_reader_key
+from backend.api import sessions
+from backend.db import password_hashing
+from backend.workers import key_pool
 from backend.db.queries_user import get_user_details as db_get_user_details # 避免命名冲突
 from backend.db.queries_user import get_friends as db_get_friends
 from backend.db.queries_user import get_all_active_users as db_get_all_active_users
 import json
+from pydantic import ValidationError
 
 router = APIRouter()
 
 @router.post("/login", response_model=UserLoginResponse, tags=["User"])
-def api_login(request: UserLoginRequest):
+async def api_login(request: UserLoginRequest):
     if not request.username_or_uid or not request.password:
         raise HTTPException(status_code=400, detail="用户名/UID和密码不能为空")
 
-    success, detail, user_data = queries_user.authenticate_user(
-        request.username_or_uid, request.password
-    )
+    # (async: 密码校验在专用的哈希线程池中等待，登录高峰不会占满处理其他接口的线程池)
+    try:
+        success, detail, user_data = await aio_queries_user.authenticate_user(
+            request.username_or_uid, request.password
+        )
+    except password_hashing.PasswordHashBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if not success:
         raise HTTPException(status_code=401, detail=detail)
@@ -33,7 +45,7 @@ def api_login(request: UserLoginRequest):
 
 
 @router.post("/register", response_model=UserRegisterResponse, tags=["User"])
-def api_register_user(request: UserRegisterRequest):
+async def api_register_user(request: UserRegisterRequest):
     if not request.username or len(request.username) < 3:
         raise HTTPException(status_code=400, detail="用户名至少需要3个字符")
     
@@ -43,10 +55,23 @@ def api_register_user(request: UserRegisterRequest):
     if not request.invitation_code:
         raise HTTPException(status_code=400, detail="必须提供邀请码")
         
-    success, detail, new_user_info = queries_user.register_user(
-        username=request.username, 
-        password=request.password,
-        invitation_code=request.invitation_code.upper()
+    invitation_code = request.invitation_code.upper()
+    valid, reason = await aio_queries_user.check_invitation_code(invitation_code)
+    if not valid:
+        raise HTTPException(status_code=409, detail=reason)
+
+    # 先在哈希线程池中计算密码哈希、取出预生成的密钥对，再进入注册事务 (不在持有数据库连接时做密钥和哈希运算)
+    try:
+        password_hash = await password_hashing.hash_password_async(request.password)
+    except password_hashing.PasswordHashBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    success, detail, new_user_info = await run_in_threadpool(
+        queries_user.register_user,
+        username=request.username,
+        password_hash=password_hash,
+        invitation_code=invitation_code,
+        key_pair=key_pool.take_key_pair()
     )
     
     if not success:
@@ -54,6 +79,25 @@ def api_register_user(request: UserRegisterRequest):
         
     return UserRegisterResponse(**new_user_info)
 
+# --- 会话令牌 (读接口免去逐次传公钥，见 backend/api/sessions.py) ---
+@router.get("/session/challenge", response_model=SessionChallengeResponse, tags=["User"])
+def api_get_session_challenge(public_key: str):
+    challenge, expires_at = sessions.issue_challenge(public_key)
+    return SessionChallengeResponse(challenge=challenge, expires_at=expires_at)
+
+@router.post("/session/login", response_model=SessionLoginResponse, tags=["User"])
+def api_session_login(request: MarketSignedRequest):
+    message = get_verified_message(request, SessionLoginMessage)
+    with release_on_failure(request, message):
+        valid, reason = sessions.verify_challenge(message.owner_key, message.challenge)
+        if not valid:
+            raise HTTPException(status_code=401, detail=reason)
+        if not queries_user.is_user_active(message.owner_key):
+            raise HTTPException(status_code=403, detail="用户不存在或已被禁用")
+
+        token, expires_at = sessions.issue_session_token(message.owner_key)
+    return SessionLoginResponse(token=token, public_key=message.owner_key, expires_at=expires_at)
+
 @router.get("/profile/{uid_or_username}", response_model=UserProfileResponse, tags=["User"])
 def api_get_user_profile(uid_or_username: str):
     profile_data = queries_user.get_user_profile(uid_or_username)
@@ -64,16 +108,16 @@ def api_get_user_profile(uid_or_username: str):
 @router.post("/profile/update", response_model=SuccessResponse, tags=["User"])
 def api_update_user_profile(request: MarketSignedRequest):
     message = get_verified_message(request, ProfileUpdateRequest)
-    
-    success, detail = queries_user.update_user_profile(
-        public_key=message.owner_key,
-        signature=message.signature,
-        displayed_nfts=message.displayed_nfts
-    )
-    
-    if not success:
-        raise HTTPException(status_code=400, detail=detail)
-    
+    with release_on_failure(request, message):
+        success, detail = queries_user.update_user_profile(
+            public_key=message.owner_key,
+            signature=message.signature,
+            displayed_nfts=message.displayed_nfts
+        )
+
+        if not success:
+            raise HTTPException(status_code=400, detail=detail)
+
     return SuccessResponse(detail=detail)
 
 @router.post("/transaction", response_model=SuccessResponse, tags=["User"])
@@ -81,6 +125,8 @@ def api_create_transaction(request: TransactionRequest):
     try:
         message = json.loads(request.message_json)
         msg_model = TransactionMessage(**message)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"无效的交易消息体: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"无效的交易消息体: {e}")
 
@@ -99,13 +145,15 @@ def api_create_transaction(request: TransactionRequest):
     return SuccessResponse(detail=detail)
 
 @router.get("/balance", response_model=BalanceResponse, tags=["User"])
-def api_get_balance(public_key: str):
+def api_get_balance(public_key: str = None, session_key: Optional[str] = Depends(get_session_public_key)):
+    public_key = resolve_reader_key(public_key, session_key)
     balance = queries_user.get_balance(public_key)
     return BalanceResponse(public_key=public_key, balance=balance)
 
 @router.get("/history", response_model=HistoryResponse, tags=["User"])
-def api_get_history(public_key: str):
-    history = queries_user.get_transaction_history(public_key)
+async def api_get_history(public_key: str = None, session_key: Optional[str] = Depends(get_session_public_key)):
+    public_key = resolve_reader_key(public_key, session_key)
+    history = await aio_queries_user.get_transaction_history(public_key)
     return HistoryResponse(transactions=history)
 
 @router.get("/user/details", response_model=UserDetailsResponse, tags=["User"])
@@ -134,12 +182,12 @@ def api_get_all_users(public_key: str):
 @router.post("/user/generate_invitation", response_model=InvitationCodeResponse, tags=["User"])
 def api_generate_invitation(request: MarketSignedRequest):
     message = get_verified_message(request, MessageGenerateCode)
-    
-    success, code_or_error = queries_user.generate_invitation_code(message.owner_key)
-    
-    if not success:
-        raise HTTPException(status_code=400, detail=code_or_error)
-        
+    with release_on_failure(request, message):
+        success, code_or_error = queries_user.generate_invitation_code(message.owner_key)
+
+        if not success:
+            raise HTTPException(status_code=400, detail=code_or_error)
+
     return InvitationCodeResponse(code=code_or_error)
 
 @router.get("/user/my_invitations", response_model=InvitationCodeListResponse, tags=["User"])
@@ -0,0 +1,148 @@
+# backend/api/sessions.py
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+"""
+短期会话令牌 (HMAC-SHA256)。
+- 登录流程: GET /session/challenge 取得挑战 -> 用私钥签名 {owner_key, challenge, timestamp} -> POST /session/login 换取令牌；
+- 挑战本身也是 HMAC (绑定公钥和签发时间)，服务端无需保存状态，多个 worker 进程共享同一个 SESSION_SECRET 即可；
+- 令牌格式: base64url(claims_json).base64url(hmac)，验证只需一次常数时间的 HMAC 比较，已验证的令牌缓存其声明；
+- 令牌只用于读接口 (代替裸 public_key 参数)；转账、交易等写操作仍然需要逐条 Ed25519 签名；
+- 用户被禁用后令牌随之失效: 携带令牌的请求每隔 SESSION_ACTIVE_CHECK_SECONDS 重新确认一次用户仍为启用状态
+  (见 dependencies.get_session_public_key)，因此禁用最多延迟这么久才对已签发的令牌生效。
+"""
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "900"))
+SESSION_CHALLENGE_TTL_SECONDS = int(os.getenv("SESSION_CHALLENGE_TTL_SECONDS", "60"))
+SESSION_CLAIMS_CACHE_SIZE = int(os.getenv("SESSION_CLAIMS_CACHE_SIZE", "10000"))
+SESSION_ACTIVE_CHECK_SECONDS = float(os.getenv("SESSION_ACTIVE_CHECK_SECONDS", "30"))
+
+_secret_env = os.getenv("SESSION_SECRET")
+if _secret_env:
+    _SECRET = _secret_env.encode('utf-8')
+else:
+    # 未配置时每次启动随机生成: 重启后旧令牌失效，且多个 worker 进程之间的令牌不通用
+    _SECRET = secrets.token_bytes(32)
+    print("--- 警告: 未设置 SESSION_SECRET，会话令牌仅在当前进程内有效 ---")
+
+_CHALLENGE_KEY = hmac.new(_SECRET, b"jcoin-session-challenge", hashlib.sha256).digest()
+_TOKEN_KEY = hmac.new(_SECRET, b"jcoin-session-token", hashlib.sha256).digest()
+
+_lock = threading.Lock()
+_claims_cache = OrderedDict() # token -> claims (已通过 HMAC 验证)
+_active_checked = OrderedDict() # public_key -> 最近一次确认用户为启用状态的时间
+_stats = {"issued": 0, "verified": 0, "cache_hits": 0, "rejected": 0, "active_checks": 0, "inactive_rejected": 0}
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode('ascii')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _mac(key: bytes, data: str) -> str:
+    return _b64encode(hmac.new(key, data.encode('utf-8'), hashlib.sha256).digest())
+
+
+# --- 挑战 ---
+
+def issue_challenge(public_key: str) -> (str, float):
+    """为公钥签发登录挑战，返回 (challenge, expires_at)。"""
+    issued_at = int(time.time())
+    nonce = _b64encode(secrets.token_bytes(12))
+    body = f"{issued_at}.{nonce}"
+    return f"{body}.{_mac(_CHALLENGE_KEY, f'{public_key}|{body}')}", issued_at + SESSION_CHALLENGE_TTL_SECONDS
+
+def verify_challenge(public_key: str, challenge: str) -> (bool, str):
+    """检查挑战由本服务签发给该公钥且未过期。一次性使用由签名消息的防重放保护保证。"""
+    try:
+        issued_at, nonce, mac = challenge.split(".")
+        issued_at = int(issued_at)
+    except (ValueError, AttributeError):
+        return False, "无效的挑战"
+    if not hmac.compare_digest(mac, _mac(_CHALLENGE_KEY, f"{public_key}|{issued_at}.{nonce}")):
+        return False, "无效的挑战"
+    if time.time() - issued_at > SESSION_CHALLENGE_TTL_SECONDS:
+        return False, "挑战已过期"
+    return True, "OK"
+
+
+# --- 令牌 ---
+
+def issue_session_token(public_key: str) -> (str, float):
+    """签发会话令牌，返回 (token, expires_at)。"""
+    now = int(time.time())
+    claims = {"sub": public_key, "iat": now, "exp": now + SESSION_TTL_SECONDS}
+    body = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    with _lock:
+        _stats["issued"] += 1
+    return f"{body}.{_mac(_TOKEN_KEY, body)}", claims["exp"]
+
+def verify_session_token(token: str) -> (bool, str):
+    """验证会话令牌。成功返回 (True, public_key)，失败返回 (False, 原因)。"""
+    now = time.time()
+    with _lock:
+        claims = _claims_cache.get(token)
+        if claims is not None:
+            _claims_cache.move_to_end(token)
+            _stats["cache_hits"] += 1
+
+    if claims is None:
+        try:
+            body, mac = token.split(".")
+        except (ValueError, AttributeError):
+            return _reject("无效的会话令牌")
+        if not hmac.compare_digest(mac, _mac(_TOKEN_KEY, body)):
+            return _reject("无效的会话令牌")
+        try:
+            claims = json.loads(_b64decode(body))
+        except Exception:
+            return _reject("无效的会话令牌")
+        with _lock:
+            _stats["verified"] += 1
+            _claims_cache[token] = claims
+            if len(_claims_cache) > SESSION_CLAIMS_CACHE_SIZE:
+                _claims_cache.popitem(last=False)
+
+    if now > claims["exp"]:
+        with _lock:
+            _claims_cache.pop(token, None)
+        return _reject("会话已过期，请重新登录")
+    return True, claims["sub"]
+
+def active_check_due(public_key: str) -> bool:
+    """是否需要重新确认该公钥的用户仍为启用状态。"""
+    with _lock:
+        checked_at = _active_checked.get(public_key)
+    return checked_at is None or time.time() - checked_at > SESSION_ACTIVE_CHECK_SECONDS
+
+def record_active_check(public_key: str, active: bool):
+    """记录启用状态的检查结果。已禁用的用户不缓存，之后每次请求都会重新检查。"""
+    with _lock:
+        _stats["active_checks"] += 1
+        if not active:
+            _stats["inactive_rejected"] += 1
+            _active_checked.pop(public_key, None)
+            return
+        _active_checked[public_key] = time.time()
+        _active_checked.move_to_end(public_key)
+        if len(_active_checked) > SESSION_CLAIMS_CACHE_SIZE:
+            _active_checked.popitem(last=False)
+
+def _reject(reason: str) -> (bool, str):
+    with _lock:
+        _stats["rejected"] += 1
+    return False, reason
+
+
+def get_session_stats() -> dict:
+    with _lock:
+        return {"ttl_seconds": SESSION_TTL_SECONDS, "cached_claims": len(_claims_cache), **_stats}
@@ -2,6 +2,7 @@
 
 from abc import ABC, abstractmethod
 from backend.bots.bot_client import BotClient
+from backend.workers import bot_log_writer
 # REMOVED: from backend.db import queries_bots  # +++ 导入 ledger +++
 import json # +++ 导入 json +++
 class BaseBot(ABC):
@@ -14,24 +15,22 @@ class BaseBot(ABC):
         self.username = client.username
         # +++ (修改) 定义日志前缀，供 print 使用 +++
         self.log_prefix = f"🤖 '{self.username}' ({self.__class__.__name__}):"
+        # 本回合共享的市场快照 (由 bot_runner 在每个回合开始前设置，为 None 时直接查询市场接口)
+        self.market_snapshot = None
         print(f"💡 Bot logic '{self.__class__.__name__}' 已附加到 client '{self.username}'")
 
     # +++ (新增) 中心的、可写入数据库的 log 方法 +++
     def log(self, message: str, action_type: str = "INFO", data_snapshot: dict = None):
         """
         记录一条日志。
-        它会同时 print 到控制台并尝试写入 `bot_logs` 数据库表。
+        它会同时 print 到控制台并放入日志缓冲队列 (批量写入 `bot_logs` 数据库表)。
         """
         # 1. 打印到控制台 (保持不变)
         print(f"{self.log_prefix} {message}")
         
-        # 2. 尝试写入数据库
+        # 2. 放入缓冲队列，由后台线程批量写入 bot_logs (不在回合中访问数据库)
         try:
-            # +++ 核心修改: 延迟导入以解决循环依赖 +++
-            from backend.db import queries_bots
-            # +++ 核心修改结束 +++
-            # (这是一个线程安全的函数)
-            queries_bots.log_bot_action(
+            bot_log_writer.enqueue(
                 bot_key=self.client.public_key,
                 bot_username=self.username,
                 action_type=action_type.upper(),
@@ -40,7 +39,7 @@ class BaseBot(ABC):
             )
         except Exception as e:
             # 写入日志失败绝不能让机器人崩溃
-            print(f"❌ {self.log_prefix} 无法将日志写入数据库: {e}")
+            print(f"❌ {self.log_prefix} 无法记录日志: {e}")
             
     # +++ (新增) 辅助函数，用于记录回合快照 +++
     def log_turn_snapshot(self, balance: float, nfts: list, listings: list):
@@ -59,6 +58,47 @@ class BaseBot(ABC):
         except Exception as e:
             self.log(f"记录快照失败: {e}", action_type="ERROR")
 
+    # --- 市场读取与交易 (经由回合共享的市场快照) ---
+
+    async def get_market_listings(self, listing_type: str, nft_type: str, max_price: float = None) -> list:
+        """
+        获取其他人的 nft_type 挂单 (只含带 NFT 数据的挂单)。
+        有市场快照时从快照读取 (按当前价格升序，max_price 以上的直接截掉)，否则请求市场接口。
+        """
+        if self.market_snapshot is not None:
+            return await self.market_snapshot.listings(
+                listing_type, nft_type, exclude_owner=self.client.public_key, max_price=max_price
+            )
+        listings = await self.client.get_market_listings(listing_type, nft_type=nft_type)
+        return [item for item in listings if item['nft_type'] == nft_type and item.get('nft_data')]
+
+    async def buy_listing(self, item: dict) -> (bool, str):
+        """买入一个挂单，并同步市场快照 (成功移除该挂单；失败说明快照可能已过期)。"""
+        success, detail = await self.client.buy_item(item['listing_id'])
+        if self.market_snapshot is not None:
+            if success:
+                self.market_snapshot.remove(item['listing_id'])
+            else:
+                self.market_snapshot.invalidate(item['listing_type'], item['nft_type'])
+        return success, detail
+
+    async def bid_listing(self, item: dict, amount: float) -> (bool, str):
+        """对拍卖出价，成功时更新市场快照中的最高出价。"""
+        success, detail = await self.client.place_bid(item['listing_id'], amount)
+        if self.market_snapshot is not None:
+            if success:
+                self.market_snapshot.update_bid(item['listing_id'], amount, self.client.public_key)
+            else:
+                self.market_snapshot.invalidate(item['listing_type'], item['nft_type'])
+        return success, detail
+
+    async def create_listing(self, nft_id: str, nft_type: str, price: float, description: str, listing_type: str = "SALE", auction_hours: float = None) -> (bool, str):
+        """上架一个 NFT，成功时使市场快照中对应的分片过期 (新挂单对本回合后续的机器人可见)。"""
+        success, detail = await self.client.create_listing(nft_id, nft_type, price, description, listing_type, auction_hours)
+        if success and self.market_snapshot is not None:
+            self.market_snapshot.invalidate(listing_type, nft_type)
+        return success, detail
+
     @abstractmethod
     async def execute_turn(self):
         """
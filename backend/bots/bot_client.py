@@ -4,36 +4,20 @@ import httpx
 import json
 import time
 from typing import Optional, List, Dict
-from shared.crypto_utils import generate_key_pair, sign_message
-from cryptography.hazmat.primitives import serialization
+from shared.crypto_utils import SigningContext
+from backend.bots import http_pool
 
 """
 机器人 API 客户端 (BotClient) V2
 - 这是一个异步客户端 (使用 httpx)，允许机器人并发执行操作。
 - (重构) 它不再需要登录。它在初始化时直接接收私钥。
+- 所有机器人共享同一个 HTTP 连接池 (见 http_pool)，机器人被移除时调用 close() 注销。
 """
-# --- 添加递归排序辅助函数 ---
-def _get_canonical_object(obj):
-    """
-    (新增) 递归排序对象，以匹配前端 crypto.js 的 getCanonicalObject。
-    确保嵌套列表和字典的签名一致性。
-    """
-    if obj is None or not isinstance(obj, (dict, list)):
-        return obj
-    
-    if isinstance(obj, list):
-        # 递归处理列表中的每个元素
-        return [_get_canonical_object(item) for item in obj]
-
-    if isinstance(obj, dict):
-        # 排序键并递归处理值
-        sorted_obj = {}
-        for key in sorted(obj.keys()):
-            sorted_obj[key] = _get_canonical_object(obj[key])
-        return sorted_obj
-        
-    # Should not be reached for dicts/lists, but good practice
-    return obj
+# 会话令牌在到期前多少秒刷新
+SESSION_REFRESH_MARGIN_SECONDS = 60
+
+# 单次 /batch 请求的最大操作数 (不超过服务端 BATCH_MAX_ITEMS 的默认值)
+BATCH_CHUNK_SIZE = 50
 
 class BotClient:
     def __init__(self, base_url: str, username: str, public_key: str, private_key_pem: str, uid: str):
@@ -46,16 +30,17 @@ class BotClient:
         }
         
         try:
-            # 加载并存储私钥对象以便后续签名
-            self.private_key_obj = serialization.load_pem_private_key(
-                private_key_pem.encode('utf-8'),
-                password=None
-            )
+            # 私钥只在初始化时解析一次，之后的签名直接复用
+            self.signer = SigningContext(private_key_pem)
         except Exception as e:
             print(f"❌ Bot '{self.username}' 严重错误: 无法加载私钥: {e}")
             raise e # 启动失败
             
-        self.client = httpx.AsyncClient(base_url=base_url, timeout=30.0)
+        http_pool.acquire()
+        self._closed = False
+        # 读接口使用的会话令牌 (签名挑战换取，跨回合复用直到快过期)
+        self.session_token = None
+        self.session_expires_at = 0.0
         print(f"🤖 BotClient for '{username}' (PK: {public_key[:10]}...) 已初始化。")
 
     # (login 方法已被移除)
@@ -64,81 +49,116 @@ class BotClient:
     def public_key(self) -> Optional[str]:
         return self.auth_info.get('public_key')
 
+    async def close(self):
+        """注销共享连接池的引用 (重复调用无副作用)。"""
+        if self._closed:
+            return
+        self._closed = True
+        self.session_token = None
+        await http_pool.release()
+
     def _sign_payload(self, message: dict) -> dict:
-        """(内部) 对消息字典进行签名，返回 API 兼容的载荷。"""
+        """(内部) 对消息字典进行签名，返回 API 兼容的载荷 (message_json 为规范化 JSON，见 crypto_utils.canonical_json)。"""
         try:
-            # --- 使用递归排序 ---
-            # 1. 准备消息
-            canonical_message = _get_canonical_object(message)
-            
-            message_json_str = json.dumps(
-                canonical_message, 
-                sort_keys=True, # 保持 sort_keys 作为双重保险
-                ensure_ascii=False, 
-                separators=(',', ':')
-            )
-            message_bytes = message_json_str.encode('utf-8')
-
-            # 2. 签名
-            signature_bytes = self.private_key_obj.sign(message_bytes)
-            
-            # 3. Base64 编码
-            import base64
-            signature_b64 = base64.b64encode(signature_bytes).decode('utf-8')
-            
-            # 4. 返回 API 载荷 (确保使用排序后的 message_json_str)
-            return {
-                "message_json": message_json_str,
-                "signature": signature_b64,
-            }
+            return self.signer.sign(message)
         except Exception as e:
             print(f"❌ Bot '{self.username}' 签名失败: {e}")
             return None
 
-    async def api_call(self, method: str, endpoint: str, params: dict = None, payload: dict = None) -> (Optional[dict], str):
+    async def api_call(self, method: str, endpoint: str, params: dict = None, payload: dict = None, headers: dict = None) -> (Optional[dict], str):
         """通用的 API 调用辅助函数。"""
+        data, error, _ = await self._request(method, endpoint, params, payload, headers)
+        return data, error
+
+    async def _request(self, method: str, endpoint: str, params: dict = None, payload: dict = None, headers: dict = None) -> (Optional[dict], str, int):
+        """与 api_call 相同，额外返回 HTTP 状态码 (请求未发出时为 0)。"""
         try:
-            response = await self.client.request(method, endpoint, params=params, json=payload)
+            response = await http_pool.request(method, self.base_url + endpoint, params=params, json=payload, headers=headers)
             if 200 <= response.status_code < 300:
                 try:
-                    return response.json(), None
+                    return response.json(), None, response.status_code
                 except json.JSONDecodeError:
-                    return {"detail": response.text}, None # 容错
+                    return {"detail": response.text}, None, response.status_code # 容错
             else:
                 error_detail = "未知错误"
                 try:
                     error_detail = response.json().get('detail', response.text)
                 except json.JSONDecodeError:
                     error_detail = response.text
-                return None, error_detail
+                return None, error_detail, response.status_code
         except httpx.ConnectError as e:
-            return None, f"网络连接错误: {e}"
+            return None, f"网络连接错误: {e}", 0
         except Exception as e:
-            return None, str(e)
+            return None, str(e), 0
+
+    # --- 会话令牌 ---
+
+    async def ensure_session(self) -> bool:
+        """确保持有未过期的会话令牌 (签名一次挑战即可在有效期内免签名读取)。"""
+        if self.session_token and time.time() < self.session_expires_at - SESSION_REFRESH_MARGIN_SECONDS:
+            return True
+        self.session_token = None
+
+        data, error = await self.api_call('GET', '/session/challenge', params={"public_key": self.public_key})
+        if error:
+            return False
+        signed_payload = self._sign_payload({
+            "owner_key": self.public_key,
+            "challenge": data['challenge'],
+            "timestamp": time.time()
+        })
+        if not signed_payload:
+            return False
+        data, error = await self.api_call('POST', '/session/login', payload=signed_payload)
+        if error:
+            print(f"❌ Bot '{self.username}' 会话登录失败: {error}")
+            return False
+        self.session_token = data['token']
+        self.session_expires_at = data['expires_at']
+        return True
+
+    async def read_call(self, endpoint: str, params: dict = None) -> (Optional[dict], str):
+        """调用读自己数据的接口: 优先携带会话令牌，令牌不可用时退回 public_key 参数。"""
+        params = dict(params or {})
+        if await self.ensure_session():
+            data, error, status_code = await self._request('GET', endpoint, params=params, headers={"Authorization": f"Bearer {self.session_token}"})
+            if status_code != 401:
+                return data, error
+            # 令牌被拒绝 (服务重启导致 SESSION_SECRET 变化、用户被禁用等)，下次重新登录；本次退回 public_key 参数
+            self.session_token = None
+        params["public_key"] = self.public_key
+        return await self.api_call('GET', endpoint, params=params)
 
     # --- 机器人常用动作 ---
     
     async def get_balance(self) -> float:
-        data, error = await self.api_call('GET', '/balance', params={"public_key": self.public_key})
+        data, error = await self.read_call('/balance')
         return data.get('balance', 0.0) if data else 0.0
 
     async def get_my_nfts(self) -> List[dict]:
-        data, error = await self.api_call('GET', '/nfts/my', params={"public_key": self.public_key})
+        data, error = await self.read_call('/nfts/my')
         return data.get('nfts', []) if data else []
 
     async def get_my_activity(self) -> tuple[List[dict], List[dict]]:
         """(新增) 获取机器人自己的市场活动。"""
-        data, error = await self.api_call('GET', '/market/my_activity', params={"public_key": self.public_key})
+        data, error = await self.read_call('/market/my_activity')
         if error:
             print(f"❌ Bot '{self.username}' 无法获取 /market/my_activity: {error}")
             return [], [] # 返回空列表以防止崩溃
         return data.get('listings', []), data.get('offers', [])
 
-    async def get_market_listings(self, listing_type: str) -> List[dict]:
-        data, error = await self.api_call('GET', '/market/listings', params={
+    async def get_market_listings(self, listing_type: str, nft_type: str = None, sort: str = "newest", limit: int = 100, exclude_self: bool = True) -> List[dict]:
+        """获取市场挂单的第一页 (类型过滤和排序在服务端完成)。exclude_self=False 时包含自己的挂单 (供回合共享的市场快照使用)。"""
+        params = {
             "listing_type": listing_type,
-            "exclude_owner": self.public_key # 自动排除自己的
-        })
+            "sort": sort,
+            "limit": limit
+        }
+        if exclude_self:
+            params["exclude_owner"] = self.public_key # 自动排除自己的
+        if nft_type:
+            params["nft_type"] = nft_type
+        data, error = await self.api_call('GET', '/market/listings', params=params)
         return data.get('listings', []) if data else []
 
     async def buy_item(self, listing_id: str) -> (bool, str):
@@ -237,4 +257,43 @@ class BotClient:
         }
         signed_payload = self._sign_payload(message)
         data, error = await self.api_call('POST', '/nfts/action', payload=signed_payload)
-        return (True, data.get('detail')) if not error else (False, error)
\ No newline at end of file
+        return (True, data.get('detail')) if not error else (False, error)
+
+    # +++ (新增) 批量提交已签名操作 +++
+    def build_batch_item(self, op: str, message: dict) -> dict:
+        """签名一条消息并包装为 /batch 的单项 (op 见 routes_batch.BATCH_OPERATIONS)。签名失败返回 None。"""
+        message.setdefault("owner_key", self.public_key)
+        message.setdefault("timestamp", time.time())
+        signed_payload = self._sign_payload(message)
+        if not signed_payload:
+            return None
+        return {"op": op, **signed_payload}
+
+    def build_nft_action_item(self, nft_id: str, action: str, action_data: dict) -> dict:
+        return self.build_batch_item("nft_action", {
+            "nft_id": nft_id,
+            "action": action,
+            "action_data": action_data
+        })
+
+    async def submit_batch(self, items: List[dict], atomic: bool = False) -> (List[dict], Optional[str]):
+        """
+        一次请求提交多个已签名操作。返回 (每项结果列表, 错误)。
+        每项结果包含 index / op / success / status_code / detail，顺序与提交顺序一致。
+        """
+        if not items:
+            return [], None
+        if atomic and len(items) > BATCH_CHUNK_SIZE:
+            return [], f"原子批量最多 {BATCH_CHUNK_SIZE} 项"
+
+        # 超过服务端单批上限时分块提交，结果中的 index 换算回原列表下标
+        results = []
+        for offset in range(0, len(items), BATCH_CHUNK_SIZE):
+            chunk = items[offset:offset + BATCH_CHUNK_SIZE]
+            data, error = await self.api_call('POST', '/batch', payload={"items": chunk, "atomic": atomic})
+            if error:
+                return results, error
+            for result in data.get('results', []):
+                result['index'] += offset
+                results.append(result)
+        return results, None
@@ -1,21 +1,37 @@
 # backend/bots/bot_runner.py
 
+import os
 import time
 import asyncio
 import random
 from backend.bots import BOT_LOGIC_MAP
 from backend.bots.bot_client import BotClient
-from backend.db import queries_bots,database,queries_market
+from backend.bots.local_client import LocalBotClient
+from backend.bots import http_pool
+from backend.bots.market_snapshot import MarketSnapshot
+from backend.db import queries_bots,database
+from backend.workers import bot_log_writer
 
-API_BASE_URL = "http://backend:8000"
+API_BASE_URL = os.getenv("BOT_API_BASE_URL", "http://backend:8000")
+
+# 机器人运行位置: embedded (API 进程内的后台线程，默认) / external (由独立的 shard_runner 进程按分片运行，API 进程不再运行机器人)
+BOT_RUNNER_MODE = os.getenv("BOT_RUNNER_MODE", "embedded").lower()
+
+# 机器人客户端模式: http (经由 API_BASE_URL 调用接口) / local (进程内直接调用，受信任身份，跳过签名和 HTTP)
+BOT_CLIENT_MODE = os.getenv("BOT_CLIENT_MODE", "http").lower()
+BOT_CLIENT_CLASSES = {"http": BotClient, "local": LocalBotClient}
 
 # --- 内部状态 (重构) ---
 # { "public_key_abc": {"client": BotClient, "logic": ShopEnthusiastBot_instance, "info": {...db_row...}} }
 _active_bots = {} 
 
-async def update_active_bots():
+# 最近一个回合的市场快照统计 (加载次数 / 读取次数 / 增量失效等)
+_last_market_snapshot_stats = None
+
+async def update_active_bots(owns=None):
     """
     (重构) 根据数据库，动态创建和管理机器人实例。
+    owns: 可选的 public_key -> bool 过滤函数 (分片运行时只保留分配给本分片的机器人)。
     """
     global _active_bots
     
@@ -24,12 +40,12 @@ async def update_active_bots():
         # (这是一个IO调用，但在
 # 循环中是可接受的)
         active_db_bots_list = queries_bots.get_all_bots(include_inactive=False)
-        active_db_bots = {bot['public_key']: bot for bot in active_db_bots_list}
+        active_db_bots = {bot['public_key']: bot for bot in active_db_bots_list if owns is None or owns(bot['public_key'])}
         
     except Exception as e:
         print(f"❌ Bot Runner: 无法从数据库获取机器人列表: {e}")
         # 清空所有机器人以防万一
-        _active_bots.clear()
+        await stop_all_bots()
         return
 
     current_bot_keys = set(_active_bots.keys())
@@ -39,7 +55,7 @@ async def update_active_bots():
     bots_to_remove = current_bot_keys - desired_bot_keys
     for key in bots_to_remove:
         print(f"🤖 机器人 '{_active_bots[key]['info']['username']}' 已被禁用或删除，正在停止...")
-        del _active_bots[key]
+        await _active_bots.pop(key)["client"].close()
 
     # 3. 供给并登录新机器人
     bots_to_add = desired_bot_keys - current_bot_keys
@@ -56,7 +72,8 @@ async def update_active_bots():
         
         try:
             # (核心重构) 直接使用私钥初始化客户端，不再需要登录
-            client = BotClient(
+            client_class = BOT_CLIENT_CLASSES.get(BOT_CLIENT_MODE, BotClient)
+            client = client_class(
                 base_url=API_BASE_URL,
                 username=username,
                 public_key=bot_info['public_key'],
@@ -75,11 +92,83 @@ async def update_active_bots():
             print(f"❌ 激活机器人 '{username}' 失败: {e}")
 
 
+async def stop_all_bots():
+    """移除所有机器人实例，并注销它们对共享 HTTP 连接池的引用。"""
+    bots = list(_active_bots.values())
+    _active_bots.clear()
+    for bot in bots:
+        await bot["client"].close()
+
+
+def attach_market_snapshot(logics: list) -> MarketSnapshot:
+    """为本回合要行动的机器人创建一个共享的市场快照 (用第一个机器人的客户端加载)。"""
+    snapshot = MarketSnapshot(logics[0].client)
+    for logic in logics:
+        logic.market_snapshot = snapshot
+    return snapshot
+
+
+def detach_market_snapshot(logics: list, snapshot: MarketSnapshot):
+    """回合结束: 解除快照 (下个回合重新加载) 并记录统计。"""
+    global _last_market_snapshot_stats
+    for logic in logics:
+        logic.market_snapshot = None
+    _last_market_snapshot_stats = snapshot.get_stats()
+
+
+def get_bot_runtime_stats() -> dict:
+    """机器人运行时状态 (供管理接口读取，调用方不在机器人线程中)。"""
+    return {
+        "client_mode": BOT_CLIENT_MODE,
+        "active_bots": len(_active_bots),
+        "http_pool": http_pool.get_http_pool_stats(),
+        "log_writer": bot_log_writer.get_bot_log_writer_stats(),
+        "market_snapshot": _last_market_snapshot_stats,
+    }
+
+
+def read_bot_settings() -> (bool, int):
+    """读取机器人系统开关和回合间隔 (进程内设置缓存，缓存未过期时不访问数据库)。读取失败时返回 (True, 30)。"""
+    try:
+        settings = database.get_settings_snapshot()
+        interval_str = settings.get("bot_check_interval_seconds")
+        return settings.get("bot_system_enabled") == 'True', int(interval_str) if interval_str else 30
+    except Exception as e:
+        print(f"❌ Bot Runner: 无法从数据库读取全局配置: {e}。使用默认值。")
+        return True, 30
+
+
+def run_bot_turn(loop) -> int:
+    """执行一个回合: 按概率挑选行动的机器人并发执行，返回行动的机器人数量。"""
+    acting = []
+    for key, bot_instance in _active_bots.items():
+        logic_instance = bot_instance["logic"]
+        bot_info = bot_instance["info"]
+        
+        probability = bot_info.get("action_probability", 0.1)
+        
+        # 核心：概率性触发
+        if random.random() < probability:
+            print(f"🎲 机器人 '{bot_info['username']}' 触发行动 (概率: {probability*100}%)")
+            acting.append(logic_instance)
+    
+    if acting:
+        # 本回合所有行动的机器人共享同一个市场快照，每类挂单只查询一次
+        snapshot = attach_market_snapshot(acting)
+        try:
+            loop.run_until_complete(asyncio.gather(*(logic.execute_turn() for logic in acting), return_exceptions=True))
+        finally:
+            detach_market_snapshot(acting, snapshot)
+    return len(acting)
+
+
 def run_bot_loop():
     """
     机器人运行器的主循环（在单独的线程中运行）。
     """
-    print("--- 机器人调度器 (V2) 启动 ---")
+    print(f"--- 机器人调度器 (V2) 启动 (客户端模式: {BOT_CLIENT_MODE}) ---")
+    if BOT_CLIENT_MODE not in BOT_CLIENT_CLASSES:
+        print(f"⚠️ 警告: 未知的 BOT_CLIENT_MODE '{BOT_CLIENT_MODE}'，使用 http 模式。")
     
     # 0. 稍微等待 Uvicorn 服务器启动
     print(f"--- 机器人调度器：等待 {API_BASE_URL} 启动... ---")
@@ -93,35 +182,16 @@ def run_bot_loop():
     
     while True:
         try:
-            # +++ (新增) 1. 从数据库读取宏观设置 +++
-            try:
-                # (这是同步函数，但在此线程循环中是允许的)
-                enabled_str = database.get_setting("bot_system_enabled")
-                interval_str = database.get_setting("bot_check_interval_seconds")
-                
-                bot_system_enabled = enabled_str == 'True'
-                check_interval = int(interval_str) if interval_str else 30
-                
-                if not bot_system_enabled:
-                    print(f"--- 机器人系统：系统在设置中被禁用。将在 {check_interval} 秒后重试... ---")
-                    if _active_bots:
-                         _active_bots.clear() # 清空内存中的机器人
-                    time.sleep(check_interval)
-                    continue
-                    
-            except Exception as e:
-                print(f"❌ Bot Runner: 无法从数据库读取全局配置: {e}。使用默认值。")
-                check_interval = 30
-            # +++ 新增结束 +++
-
-            # 1. (新增) 在机器人回合开始前，先结算一次拍卖
-            print(f"--- 机器人回合：正在结算已结束的拍卖... ---")
-            try:
-                resolved_count = queries_market.resolve_finished_auctions()
-                if resolved_count > 0:
-                    print(f"--- 机器人回合：成功结算了 {resolved_count} 场拍卖。 ---")
-            except Exception as e:
-                print(f"❌ Bot Runner: 结算拍卖时出错: {e}")
+            # 1. 从数据库读取宏观设置
+            bot_system_enabled, check_interval = read_bot_settings()
+            if not bot_system_enabled:
+                print(f"--- 机器人系统：系统在设置中被禁用。将在 {check_interval} 秒后重试... ---")
+                if _active_bots:
+                     loop.run_until_complete(stop_all_bots()) # 清空内存中的机器人 (并释放连接)
+                time.sleep(check_interval)
+                continue
+
+            # (拍卖结算已移至独立的 workers.auction_settlement，不再依赖机器人回合)
 
             # 2. 动态调整机器人实例 (登录/注销)
             loop.run_until_complete(update_active_bots())
@@ -133,25 +203,11 @@ def run_bot_loop():
 
             # 3. 概率性触发机器人动作
             print(f"\n--- 机器人回合开始 (T={time.strftime('%H:%M:%S')}) ---")
-            
-            tasks = []
-            for key, bot_instance in _active_bots.items():
-                logic_instance = bot_instance["logic"]
-                bot_info = bot_instance["info"]
-                
-                probability = bot_info.get("action_probability", 0.1)
-                
-                # 核心：概率性触发
-                if random.random() < probability:
-                    print(f"🎲 机器人 '{bot_info['username']}' 触发行动 (概率: {probability*100}%)")
-                    tasks.append(logic_instance.execute_turn())
-            
-            if tasks:
-                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            run_bot_turn(loop)
             
             print(f"--- 机器人回合结束。下一周期检查在 {check_interval} 秒后 ---")
             time.sleep(check_interval)
 
         except Exception as e:
             print(f"❌ 机器人主循环出错: {e}")
-            time.sleep(60) # 发生错误时，延长休眠时间
\ No newline at end of file
+            time.sleep(60) # 发生错误时，延长休眠时间
@@ -0,0 +1,152 @@
+# backend/bots/http_pool.py
+
+import os
+import time
+import asyncio
+import threading
+import httpx
+
+"""
+所有 BotClient 共享的 HTTP 连接池。
+- 每个事件循环只有一个 httpx.AsyncClient (bot_runner 只有一个循环)，总连接数和 keep-alive 连接数都有上限；
+- BotClient 创建时登记 (acquire)，机器人被移除时注销 (release)；最后一个机器人注销后关闭客户端，释放所有连接；
+- BOT_HTTP2=true 且安装了 h2 时启用 HTTP/2。注意 HTTP/2 只在 https 且服务端支持时协商成功，
+  uvicorn 只支持 HTTP/1.1，因此默认关闭。
+"""
+
+BOT_HTTP_MAX_CONNECTIONS = int(os.getenv("BOT_HTTP_MAX_CONNECTIONS", "50"))
+BOT_HTTP_MAX_KEEPALIVE = int(os.getenv("BOT_HTTP_MAX_KEEPALIVE", "20"))
+BOT_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("BOT_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+BOT_HTTP_TIMEOUT_SECONDS = float(os.getenv("BOT_HTTP_TIMEOUT_SECONDS", "30"))
+BOT_HTTP2 = os.getenv("BOT_HTTP2", "false").lower() == "true"
+
+try:
+    import h2 # noqa: F401 (httpx 的 HTTP/2 支持依赖 h2)
+    _h2_available = True
+except ImportError:
+    _h2_available = False
+
+_http2_enabled = BOT_HTTP2 and _h2_available
+if BOT_HTTP2 and not _h2_available:
+    print("--- 警告: BOT_HTTP2=true 但未安装 h2 (pip install httpx[http2])，机器人使用 HTTP/1.1 ---")
+
+_client = None
+_client_loop = None
+_refs = 0
+
+_lock = threading.Lock()
+_stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "clients_created": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+def _create_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=BOT_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=BOT_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=BOT_HTTP_KEEPALIVE_EXPIRY_SECONDS
+    )
+    with _lock:
+        _stats["clients_created"] += 1
+    return httpx.AsyncClient(limits=limits, timeout=BOT_HTTP_TIMEOUT_SECONDS, http2=_http2_enabled)
+
+def get_client() -> httpx.AsyncClient:
+    """返回当前事件循环的共享客户端 (必须在事件循环中调用)。"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        # 旧客户端属于已结束的事件循环 (例如基准脚本多次 asyncio.run)，其连接随循环一起失效
+        _client = _create_client()
+        _client_loop = loop
+    return _client
+
+
+# --- 引用计数 ---
+
+def acquire():
+    global _refs
+    with _lock:
+        _refs += 1
+
+async def release():
+    """注销一个 BotClient；没有机器人使用时关闭共享客户端。"""
+    global _refs
+    with _lock:
+        _refs = max(0, _refs - 1)
+        should_close = _refs == 0
+    if should_close:
+        await close()
+
+async def close():
+    """关闭当前的共享客户端 (下次请求时重新创建)。"""
+    global _client
+    client = _client
+    _client = None
+    if client is not None and not client.is_closed:
+        try:
+            await client.aclose()
+        except RuntimeError as e:
+            # 客户端属于另一个 (已关闭的) 事件循环，连接已随循环释放
+            print(f"⚠️ 关闭机器人 HTTP 客户端时出错: {e}")
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """经由共享客户端发送请求，并记录耗时和并发数。"""
+    client = get_client()
+    with _lock:
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    started = time.perf_counter()
+    try:
+        return await client.request(method, url, **kwargs)
+    except Exception:
+        with _lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            _stats["in_flight"] -= 1
+            _stats["total_ms"] += elapsed_ms
+            _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+
+
+def _connection_counts() -> dict:
+    """读取 httpcore 连接池中的连接状态 (私有属性，版本不兼容时返回 0)。"""
+    counts = {"open_connections": 0, "idle_connections": 0, "active_connections": 0}
+    client = _client
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if client is None or client.is_closed or pool is None:
+        return counts
+    try:
+        connections = list(pool.connections)
+    except Exception:
+        return counts
+    for connection in connections:
+        if connection.is_closed():
+            continue
+        counts["open_connections"] += 1
+        if connection.is_idle():
+            counts["idle_connections"] += 1
+        else:
+            counts["active_connections"] += 1
+    return counts
+
+def get_http_pool_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        refs = _refs
+    return {
+        "max_connections": BOT_HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": BOT_HTTP_MAX_KEEPALIVE,
+        "keepalive_expiry_seconds": BOT_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        "http2": _http2_enabled,
+        "registered_clients": refs,
+        **_connection_counts(),
+        "requests": stats["requests"],
+        "errors": stats["errors"],
+        "in_flight": stats["in_flight"],
+        "peak_in_flight": stats["peak_in_flight"],
+        "clients_created": stats["clients_created"],
+        "avg_ms": stats["total_ms"] / stats["requests"] if stats["requests"] else 0.0,
+        "max_ms": stats["max_ms"],
+    }
@@ -0,0 +1,193 @@
+# backend/bots/local_client.py
+
+import asyncio
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from backend.bots.bot_client import BotClient
+from backend.db import queries_user, queries_nft, queries_market
+from backend.api.models import (
+    BalanceResponse, NFTListResponse, UserProfileResponse, SuccessResponse,
+    MarketListingRequest, MarketActionMessage, MarketBidRequest,
+    ShopCreateNftRequest, ShopActionRequest, ProfileUpdateRequest, NFTActionMessage
+)
+from backend.api.routes_market import _attach_trade_descriptions, _create_nft_from_shop, _perform_shop_action
+from backend.api.routes_nft import _perform_nft_action
+from backend.api.routes_batch import BATCH_OPERATIONS, BATCH_MAX_ITEMS, execute_batch
+
+"""
+进程内机器人客户端 (LocalBotClient)
+- 接口与 BotClient 完全相同，但不经过 HTTP 回环: api_call 直接分派到查询层和路由的执行函数；
+- 机器人作为受信任身份运行: 不签名、不验签、不做防重放检查，消息中的 owner_key 固定为机器人自己的公钥；
+- 消息仍按对应接口的 Pydantic 模型校验，返回值按 JSON 规则编码 (Decimal -> float)，与 HTTP 模式的响应一致；
+- 同步的数据库调用放到默认线程池执行，同一回合内多个机器人仍然并发。
+只能在后端进程内使用 (bot_runner 由 main.py 启动)，通过 BOT_CLIENT_MODE=local 开启。
+"""
+
+
+def _parse_message(model, message: dict, public_key: str):
+    """按接口模型校验消息，owner_key 强制为机器人自己的公钥。"""
+    try:
+        return model(**{**(message or {}), "owner_key": public_key})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"无效的消息体: {e}")
+
+def _success_response(result: (bool, str)) -> SuccessResponse:
+    success, detail = result
+    if not success:
+        raise HTTPException(status_code=400, detail=detail)
+    return SuccessResponse(detail=detail)
+
+
+# --- 各接口的进程内实现: (public_key, params, message) -> 响应 ---
+
+def _get_balance(public_key, params, message):
+    return BalanceResponse(public_key=public_key, balance=queries_user.get_balance(public_key))
+
+def _get_my_nfts(public_key, params, message):
+    return NFTListResponse(nfts=queries_nft.get_nfts_by_owner(public_key))
+
+def _get_my_activity(public_key, params, message):
+    return queries_market.get_my_market_activity(public_key)
+
+def _get_market_listings(public_key, params, message):
+    try:
+        page = queries_market.get_market_listings(**params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _attach_trade_descriptions(page['listings'])
+    return page
+
+def _get_user_profile(public_key, params, message):
+    profile_data = queries_user.get_user_profile(params['uid_or_username'])
+    if not profile_data:
+        raise HTTPException(status_code=404, detail="未找到该用户")
+    return UserProfileResponse(**profile_data)
+
+def _create_listing(public_key, params, message):
+    return _success_response(queries_market.create_market_listing(
+        lister_key=message.owner_key,
+        listing_type=message.listing_type,
+        nft_id=message.nft_id,
+        nft_type=message.nft_type,
+        description=message.description,
+        price=message.price,
+        auction_hours=message.auction_hours
+    ))
+
+def _cancel_listing(public_key, params, message):
+    return _success_response(queries_market.cancel_market_listing(message.owner_key, message.listing_id))
+
+def _buy(public_key, params, message):
+    return _success_response(queries_market.execute_sale(message.owner_key, message.listing_id))
+
+def _place_bid(public_key, params, message):
+    return _success_response(queries_market.place_auction_bid(message.owner_key, message.listing_id, message.amount))
+
+def _update_profile(public_key, params, message):
+    return _success_response(queries_user.update_user_profile(
+        public_key=message.owner_key,
+        signature=message.signature,
+        displayed_nfts=message.displayed_nfts
+    ))
+
+def _create_nft(public_key, params, message):
+    return _create_nft_from_shop(message)
+
+def _shop_action(public_key, params, message):
+    return _perform_shop_action(message)
+
+def _nft_action(public_key, params, message):
+    return _perform_nft_action(message)
+
+def _submit_batch(public_key, params, payload):
+    """payload 为 {"items": [{"op", "message"}...], "atomic"}，每项按批量操作表中的模型校验。"""
+    items = payload.get("items") or []
+    if not items:
+        raise HTTPException(status_code=400, detail="批量操作不能为空")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多提交 {BATCH_MAX_ITEMS} 个操作")
+
+    ops, verified = [], []
+    for item in items:
+        op = item.get("op")
+        ops.append(op)
+        operation = BATCH_OPERATIONS.get(op)
+        if not operation:
+            verified.append((None, HTTPException(status_code=400, detail=f"不支持的批量操作: {op}")))
+            continue
+        try:
+            verified.append((_parse_message(operation[1], item.get("message"), public_key), None))
+        except HTTPException as e:
+            verified.append((None, e))
+    return execute_batch(ops, verified, bool(payload.get("atomic")))
+
+
+# (method, endpoint) -> (消息模型, 实现)。消息模型为 None 时实现直接收到原始载荷
+LOCAL_ROUTES = {
+    ("GET", "/balance"): (None, _get_balance),
+    ("GET", "/nfts/my"): (None, _get_my_nfts),
+    ("GET", "/market/my_activity"): (None, _get_my_activity),
+    ("GET", "/market/listings"): (None, _get_market_listings),
+    ("POST", "/market/create_listing"): (MarketListingRequest, _create_listing),
+    ("POST", "/market/cancel_listing"): (MarketActionMessage, _cancel_listing),
+    ("POST", "/market/buy"): (MarketActionMessage, _buy),
+    ("POST", "/market/place_bid"): (MarketBidRequest, _place_bid),
+    ("POST", "/market/create_nft"): (ShopCreateNftRequest, _create_nft),
+    ("POST", "/market/shop_action"): (ShopActionRequest, _shop_action),
+    ("POST", "/profile/update"): (ProfileUpdateRequest, _update_profile),
+    ("POST", "/nfts/action"): (NFTActionMessage, _nft_action),
+    ("POST", "/batch"): (None, _submit_batch),
+}
+
+
+class LocalBotClient(BotClient):
+    def __init__(self, base_url: str, username: str, public_key: str, private_key_pem: str, uid: str):
+        # 不创建 HTTP 客户端，也不需要解析私钥 (base_url / private_key_pem 仅为与 BotClient 保持相同的构造参数)
+        self.base_url = None
+        self.username = username
+        self.auth_info = {
+            "public_key": public_key,
+            "username": username,
+            "uid": uid
+        }
+        print(f"🤖 LocalBotClient for '{username}' (PK: {public_key[:10]}...) 已初始化 (进程内模式)。")
+
+    async def close(self):
+        pass # 未使用共享 HTTP 连接池
+
+    def _sign_payload(self, message: dict) -> dict:
+        """(受信任身份) 不签名，原样携带消息。"""
+        return {"message": message}
+
+    async def ensure_session(self) -> bool:
+        return True
+
+    async def read_call(self, endpoint: str, params: dict = None) -> (Optional[dict], str):
+        return await self.api_call('GET', endpoint, params=params)
+
+    async def api_call(self, method: str, endpoint: str, params: dict = None, payload: dict = None, headers: dict = None) -> (Optional[dict], str):
+        """与 BotClient.api_call 相同的返回约定: 成功 (data, None)，失败 (None, detail)。"""
+        try:
+            return await asyncio.to_thread(self._dispatch, method, endpoint, dict(params or {}), payload), None
+        except HTTPException as e:
+            return None, e.detail
+        except Exception as e:
+            return None, str(e)
+
+    def _dispatch(self, method: str, endpoint: str, params: dict, payload: Optional[dict]):
+        """(在线程池中运行) 查找并执行进程内实现，返回 JSON 编码后的响应。"""
+        route = LOCAL_ROUTES.get((method, endpoint))
+        if route is None and method == 'GET' and endpoint.startswith('/profile/'):
+            route = (None, _get_user_profile)
+            params['uid_or_username'] = endpoint[len('/profile/'):]
+        if route is None:
+            raise HTTPException(status_code=404, detail=f"进程内模式不支持该接口: {method} {endpoint}")
+
+        model, handler = route
+        if model is not None:
+            message = _parse_message(model, (payload or {}).get("message"), self.public_key)
+        else:
+            message = payload or {}
+        return jsonable_encoder(handler(self.public_key, params, message))
@@ -0,0 +1,129 @@
+# backend/bots/market_snapshot.py
+
+import os
+import asyncio
+import bisect
+from typing import List, Optional
+
+"""
+机器人回合内共享的市场快照 (MarketSnapshot)
+- 每个回合由 bot_runner 创建一个快照并交给本回合所有机器人；
+  每个 (listing_type, nft_type) 分片在第一次被读取时才加载 (一次 /market/listings 请求，当前价格最低的 BOT_MARKET_SNAPSHOT_LIMIT 条)，
+  之后同一回合内的其它机器人直接读取内存中的数据，不再重复扫描挂单表；
+- 分片内按当前价格升序排列 (拍卖按最高出价，无出价时按起拍价)，读取时可以用二分直接截掉买不起的挂单；
+- 增量失效: 机器人买入成功 -> 移除该挂单；出价成功 -> 更新最高出价并重新排序；
+  新挂单或买入失败 (挂单可能已被他人买走) -> 只把对应分片标记为过期，下次读取时重新加载。
+快照中的挂单字典由所有机器人共享，机器人只能读取，不能修改。
+"""
+
+BOT_MARKET_SNAPSHOT_LIMIT = int(os.getenv("BOT_MARKET_SNAPSHOT_LIMIT", "200"))
+
+
+def _current_price(item: dict) -> float:
+    """挂单的当前价格: 拍卖为最高出价 (无出价时为起拍价)，一口价为售价。"""
+    return float(item.get('highest_bid') or item.get('price') or 0.0)
+
+
+class _Slice:
+    """一个 (listing_type, nft_type) 分片: 按当前价格升序排列的挂单和对应的价格列表 (用于二分)。"""
+
+    def __init__(self):
+        self.items = []
+        self.prices = []
+        self.loaded = False
+        self.lock = asyncio.Lock()
+
+    def replace(self, items: List[dict]):
+        self.items = sorted(items, key=_current_price)
+        self.prices = [_current_price(item) for item in self.items]
+        self.loaded = True
+
+    def index_of(self, listing_id: str) -> int:
+        for i, item in enumerate(self.items):
+            if item['listing_id'] == listing_id:
+                return i
+        return -1
+
+
+class MarketSnapshot:
+    def __init__(self, client):
+        # 用于加载分片的客户端 (任意一个机器人的客户端；加载时不排除挂单者，过滤在读取时完成)
+        self.client = client
+        self._slices = {}
+        self.stats = {"loads": 0, "reads": 0, "removed": 0, "repriced": 0, "invalidations": 0}
+
+    def _slice(self, listing_type: str, nft_type: str) -> _Slice:
+        key = (listing_type, nft_type)
+        if key not in self._slices:
+            self._slices[key] = _Slice()
+        return self._slices[key]
+
+    async def _ensure_loaded(self, listing_type: str, nft_type: str) -> _Slice:
+        market_slice = self._slice(listing_type, nft_type)
+        if market_slice.loaded:
+            return market_slice
+        # 多个机器人同时读取同一分片时只加载一次
+        async with market_slice.lock:
+            if not market_slice.loaded:
+                items = await self.client.get_market_listings(
+                    listing_type, nft_type=nft_type, sort="price_asc", limit=BOT_MARKET_SNAPSHOT_LIMIT, exclude_self=False
+                )
+                market_slice.replace([item for item in items if item.get('nft_type') == nft_type])
+                self.stats["loads"] += 1
+        return market_slice
+
+    async def listings(self, listing_type: str, nft_type: str, exclude_owner: str = None, max_price: float = None) -> List[dict]:
+        """
+        返回该分片中的挂单 (按当前价格升序)。
+        exclude_owner: 排除该公钥自己的挂单；max_price: 只返回当前价格不超过该值的挂单。
+        """
+        market_slice = await self._ensure_loaded(listing_type, nft_type)
+        self.stats["reads"] += 1
+        end = len(market_slice.items) if max_price is None else bisect.bisect_right(market_slice.prices, max_price)
+        return [
+            item for item in market_slice.items[:end]
+            if item.get('nft_data') and item.get('lister_key') != exclude_owner
+        ]
+
+    def _find(self, listing_id: str) -> (Optional[_Slice], int):
+        for market_slice in self._slices.values():
+            index = market_slice.index_of(listing_id)
+            if index >= 0:
+                return market_slice, index
+        return None, -1
+
+    def remove(self, listing_id: str):
+        """挂单已成交: 从快照中移除。"""
+        market_slice, index = self._find(listing_id)
+        if market_slice is None:
+            return
+        del market_slice.items[index]
+        del market_slice.prices[index]
+        self.stats["removed"] += 1
+
+    def update_bid(self, listing_id: str, amount: float, bidder_key: str):
+        """拍卖出价成功: 更新最高出价并移动到新的排序位置 (挂单字典被替换，不修改其它机器人已取得的对象)。"""
+        market_slice, index = self._find(listing_id)
+        if market_slice is None:
+            return
+        item = {**market_slice.items[index], "highest_bid": amount, "highest_bidder": bidder_key}
+        del market_slice.items[index]
+        del market_slice.prices[index]
+        position = bisect.bisect_right(market_slice.prices, amount)
+        market_slice.items.insert(position, item)
+        market_slice.prices.insert(position, amount)
+        self.stats["repriced"] += 1
+
+    def invalidate(self, listing_type: str, nft_type: str):
+        """分片内容已过期 (有新挂单或成交结果未知)，下次读取时重新加载。"""
+        market_slice = self._slices.get((listing_type, nft_type))
+        if market_slice is not None and market_slice.loaded:
+            market_slice.loaded = False
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "slices": len(self._slices),
+            "listings": sum(len(s.items) for s in self._slices.values()),
+        }
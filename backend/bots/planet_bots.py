@@ -69,10 +69,12 @@ class PlanetCapitalistBot(BaseBot):
         try:
             val_config = PlanetHandler.get_economic_config_and_valuation()
             self.calculate_planet_value = val_config["calculate_value_func"]
+            self.calculate_planet_values = val_config["calculate_values_func"] # 批量 (向量化) 估值
         except Exception as e:
             self.log(f"❌ 严重错误：无法加载星球估值函数: {e}", "ERROR")
             # 创建一个回退函数
             self.calculate_planet_value = lambda data: 1.0 
+            self.calculate_planet_values = lambda datas: [1.0] * len(datas)
 
         # --- 生成“个性” ---
         self.config = {
@@ -124,6 +126,7 @@ class PlanetCapitalistBot(BaseBot):
         """(挖矿) 检查所有星球并收获"""
         self.log("检查星球 JPH 产出...", action_type="HARVEST_CHECK")
         harvested_count = 0
+        batch_items, batch_names = [], []
         
         for nft in my_planets:
             data = nft.get('data', {})
@@ -138,13 +141,22 @@ class PlanetCapitalistBot(BaseBot):
                 # 可以收获
                 name = data.get('custom_name') or nft['nft_id'][:6]
                 self.log(f"正在收获 {name} (JPH: {jph:.2f})...", action_type="NFT_ACTION_HARVEST")
-                success, detail = await self.client.nft_action(nft['nft_id'], 'harvest', {})
-                if success:
-                    harvested_count += 1
-                    # (余额会在下次循环开始时更新，这里不模拟加法)
-                    self.log(f"收获成功: {detail}", "NFT_ACTION_SUCCESS")
-                else:
-                    self.log(f"收获失败: {detail}", "NFT_ACTION_FAIL")
+                item = self.client.build_nft_action_item(nft['nft_id'], 'harvest', {})
+                if item:
+                    batch_items.append(item)
+                    batch_names.append(name)
+
+        # 所有可收获的 NFT 合并为一次 /batch 请求 (每项独立保存点，单项失败不影响其他)
+        results, error = await self.client.submit_batch(batch_items)
+        if error:
+            self.log(f"批量收获失败: {error}", "NFT_ACTION_FAIL")
+        for result in results:
+            name = batch_names[result['index']]
+            if result['success']:
+                harvested_count += 1
+                self.log(f"收获成功 ({name}): {result['detail']}", "NFT_ACTION_SUCCESS")
+            else:
+                self.log(f"收获失败 ({name}): {result['detail']}", "NFT_ACTION_FAIL")
         
         if harvested_count > 0:
             new_balance = await self.client.get_balance()
@@ -204,17 +216,9 @@ class PlanetCapitalistBot(BaseBot):
         """(交易) 基于内在价值进行买卖和拍卖 (V2 逻辑)"""
         
         # --- 同时获取拍卖和销售列表 ---
-        sale_listings_raw = await self.client.get_market_listings("SALE")
-        auction_listings_raw = await self.client.get_market_listings("AUCTION")
-        
-        planet_sales = [
-            item for item in sale_listings_raw 
-            if item['nft_type'] == 'PLANET' and item.get('nft_data')
-        ]
-        planet_auctions = [
-            item for item in auction_listings_raw 
-            if item['nft_type'] == 'PLANET' and item.get('nft_data')
-        ]
+        # (读取本回合共享的市场快照，只取买得起的挂单)
+        planet_sales = await self.get_market_listings("SALE", "PLANET", max_price=balance)
+        planet_auctions = await self.get_market_listings("AUCTION", "PLANET", max_price=balance)
         
         # 1. 卖出 (清算库存，支持一口价或拍卖)
         if my_unlisted_planets and random.random() < 0.5: # 50%概率本回合卖东西
@@ -238,19 +242,18 @@ class PlanetCapitalistBot(BaseBot):
                 desc = f"【资本家精选】{name} [估值 {value:.0f} | 稀有度 {data.get('rarity_score',{}).get('total',0)}]"
                 self.log(f"正在出售 {name} (内在价值 {value:.2f} FC)，挂单价 {sale_price:.2f} FC", "LIST_SALE")
 
-            await self.client.create_listing(
+            await self.create_listing(
                 nft_to_sell['nft_id'], "PLANET", sale_price, desc, 
                 listing_type, auction_hours
             )
 
         # 2. 买入 (抄底)
-        bargains = []
-        for item in planet_sales:
-            price = item.get('price')
-            if price > balance: continue
-            value = self.calculate_planet_value(item.get('nft_data', {}))
-            if price < (value * self.config["BUY_DISCOUNT_THRESHOLD"]):
-                bargains.append(item)
+        # (一次批量估值本回合看到的全部挂单)
+        sale_values = self.calculate_planet_values([item['nft_data'] for item in planet_sales])
+        bargains = [
+            item for item, value in zip(planet_sales, sale_values)
+            if item['price'] <= balance and item['price'] < value * self.config["BUY_DISCOUNT_THRESHOLD"]
+        ]
         
         if bargains:
             item_to_buy = random.choice(bargains)
@@ -258,20 +261,19 @@ class PlanetCapitalistBot(BaseBot):
             value = self.calculate_planet_value(item_to_buy.get('nft_data', {}))
             self.log(f"👉 抄底 (一口价)！发现 {item_to_buy['description']} 售价 {price:.2f} FC "
                      f"(内在价值 {value:.2f})，立即买入！", "MARKET_BUY")
-            success, detail = await self.client.buy_item(item_to_buy['listing_id'])
+            success, detail = await self.buy_listing(item_to_buy)
             if success: return balance - price # 购买成功，余额减少
             # (失败了继续执行，也许可以竞拍)
 
         # 3. 竞拍 (捡漏)
+        auction_values = self.calculate_planet_values([item['nft_data'] for item in planet_auctions])
         auction_bargains = []
-        for item in planet_auctions:
+        for item, value in zip(planet_auctions, auction_values):
             current_bid = item.get('highest_bid') or item.get('price')
             if current_bid > balance: continue # 没钱竞拍
-            
-            value = self.calculate_planet_value(item.get('nft_data', {}))
             # --- 核心修复：如果当前价格低于估值，就参与竞拍 ---
             if current_bid < (value * self.config["BUY_DISCOUNT_THRESHOLD"]):
-                auction_bargains.append((item, value, current_bid))
+                auction_bargains.append((item, float(value), current_bid))
         
         if auction_bargains:
             item_to_bid, value, current_bid = random.choice(auction_bargains)
@@ -284,7 +286,7 @@ class PlanetCapitalistBot(BaseBot):
             elif new_bid_amount > current_bid:
                 self.log(f"👉 竞拍！发现 {item_to_bid['description']} 现价 {current_bid:.2f} FC "
                          f"(内在价值 {value:.2f})，出价 {new_bid_amount:.2f} FC！", "MARKET_BID")
-                success, detail = await self.client.place_bid(item_to_bid['listing_id'], new_bid_amount)
+                success, detail = await self.bid_listing(item_to_bid, new_bid_amount)
                 if success:
                     return balance - new_bid_amount # 出价成功，余额（托管）减少
         
@@ -297,11 +299,10 @@ class PlanetCapitalistBot(BaseBot):
             
         try:
             # 1. 按“内在价值”排序
-            sorted_planets = sorted(
-                my_planets, 
-                key=lambda nft: self.calculate_planet_value(nft.get('data', {})), 
-                reverse=True
-            )
+            values = self.calculate_planet_values([nft.get('data', {}) for nft in my_planets])
+            sorted_planets = [
+                nft for _, nft in sorted(zip(values, my_planets), key=lambda pair: pair[0], reverse=True)
+            ]
             
             # 2. 选出最好的
             top_planet_ids = [
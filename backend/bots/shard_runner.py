@@ -0,0 +1,254 @@
+# backend/bots/shard_runner.py
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+from backend.db import database, queries_bots
+from backend.bots import bot_runner
+from backend.workers import bot_log_writer
+
+"""
+独立的分片机器人运行器 (不在 API 进程内运行机器人，机器人的签名 / 估值 / JSON 不再与请求处理争抢 GIL)。
+
+    BOT_RUNNER_MODE=external    (API 进程中设置，不再启动进程内的机器人线程)
+    python -m backend.bots.shard_runner --shards 4
+
+- 主进程启动 N 个 worker 进程 (分片)，监控并重启意外退出的分片；连续崩溃的分片按指数退避延迟重启
+  (BOT_SHARD_RESTART_BACKOFF_SECONDS 起，最长 BOT_SHARD_RESTART_BACKOFF_MAX_SECONDS)，
+  稳定运行 BOT_SHARD_RESTART_RESET_SECONDS 后退避清零；
+- 每个分片每隔 BOT_SHARD_HEARTBEAT_SECONDS 向 bot_shard_heartbeats 写入心跳和回合指标；
+  心跳超过 BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS 的分片视为下线；
+- 一致性分配: 每个机器人按公钥对所有在线分片做最高随机权重 (rendezvous) 哈希，权重最大的分片运行它。
+  分片上下线时只有该分片的机器人会移动，其余机器人的归属不变；
+- 心跳线程发现在线分片或已激活的机器人 (例如 admin_create_bot 新建) 发生变化时，立即唤醒分片重新分配，
+  不必等到下一个回合。分片正常退出时删除自己的心跳记录，其机器人立即由其它分片接管；
+  分片崩溃时，其机器人在心跳超时后被接管。重新分配的瞬间，一个机器人最多可能在新旧两个分片各执行一个回合。
+多台机器可以各自运行 shard_runner (分片 ID 默认以主机名为前缀)，所有在线分片共同分配全部机器人。
+分片进程不运行拍卖调度器: local 模式下机器人新建 / 取消的拍卖通过 NOTIFY 交给 API 进程的调度器 (见 workers.auction_scheduler)。
+"""
+
+BOT_SHARDS = int(os.getenv("BOT_SHARDS", "2"))
+BOT_SHARD_HEARTBEAT_SECONDS = float(os.getenv("BOT_SHARD_HEARTBEAT_SECONDS", "5"))
+BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS", "20"))
+# 超过该时间没有心跳的分片记录会被删除 (不再出现在管理接口中)
+BOT_SHARD_FORGET_SECONDS = float(os.getenv("BOT_SHARD_FORGET_SECONDS", "3600"))
+# 分片意外退出后的重启退避: 第 n 次连续重启前等待 min(BACKOFF * 2^(n-1), BACKOFF_MAX) 秒
+BOT_SHARD_RESTART_BACKOFF_SECONDS = float(os.getenv("BOT_SHARD_RESTART_BACKOFF_SECONDS", "5"))
+BOT_SHARD_RESTART_BACKOFF_MAX_SECONDS = float(os.getenv("BOT_SHARD_RESTART_BACKOFF_MAX_SECONDS", "300"))
+# 分片连续运行超过该时间后视为已恢复，连续重启次数清零
+BOT_SHARD_RESTART_RESET_SECONDS = float(os.getenv("BOT_SHARD_RESTART_RESET_SECONDS", "120"))
+# 连续重启达到该次数时提示分片可能卡在启动失败 (例如环境变量错误、数据库不可用)
+BOT_SHARD_RESTART_WARN_AFTER = int(os.getenv("BOT_SHARD_RESTART_WARN_AFTER", "5"))
+
+
+def assign_shard(public_key: str, shard_ids: list) -> str:
+    """最高随机权重 (rendezvous) 哈希: 返回 shard_ids 中负责该机器人的分片。"""
+    return max(
+        shard_ids,
+        key=lambda shard_id: hashlib.blake2b(f"{shard_id}:{public_key}".encode("utf-8"), digest_size=8).digest()
+    )
+
+
+class Shard:
+    """一个分片 worker 进程内的状态: 回合循环 (主线程) + 心跳线程。"""
+
+    def __init__(self, shard_id: str):
+        self.shard_id = shard_id
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event() # 心跳线程发现需要重新分配时唤醒回合循环
+        self.live_shards = [shard_id]
+        self.metrics_lock = threading.Lock()
+        self.metrics = {
+            "bots": 0, "ticks": 0, "last_acting": 0, "last_tick_ms": 0.0, "avg_tick_ms": 0.0,
+            "max_tick_ms": 0.0, "last_tick_at": None, "tick_errors": 0, "rebalances": 0,
+        }
+
+    # --- 心跳 ---
+
+    def _heartbeat(self):
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        queries_bots.upsert_bot_shard_heartbeat(self.shard_id, self.host, self.pid, metrics)
+        shards = queries_bots.get_bot_shards(BOT_SHARD_HEARTBEAT_TIMEOUT_SECONDS)
+        return sorted(shard["shard_id"] for shard in shards if shard["alive"])
+
+    def run_heartbeat_loop(self):
+        """(后台线程) 定期写入心跳；在线分片或机器人名单变化时唤醒回合循环重新分配。"""
+        last_roster = None
+        while not self.stop_event.is_set():
+            try:
+                live = self._heartbeat()
+                if self.shard_id not in live:
+                    live = sorted(live + [self.shard_id])
+                roster = queries_bots.get_active_bot_keys()
+                if live != self.live_shards or (last_roster is not None and roster != last_roster):
+                    print(f"--- 分片 {self.shard_id}: 在线分片 {len(live)} 个 / 机器人 {len(roster)} 个，重新分配 ---")
+                    self.live_shards = live
+                    self.wake_event.set()
+                last_roster = roster
+                queries_bots.delete_stale_bot_shards(BOT_SHARD_FORGET_SECONDS)
+            except Exception as e:
+                print(f"❌ 分片 {self.shard_id} 心跳失败: {e}")
+            self.stop_event.wait(BOT_SHARD_HEARTBEAT_SECONDS)
+
+    # --- 回合 ---
+
+    def owns(self, public_key: str) -> bool:
+        return assign_shard(public_key, self.live_shards) == self.shard_id
+
+    def _record_tick(self, acting: int, elapsed_ms: float, error: bool = False):
+        with self.metrics_lock:
+            m = self.metrics
+            m["bots"] = len(bot_runner._active_bots)
+            if error:
+                m["tick_errors"] += 1
+                return
+            m["ticks"] += 1
+            m["last_acting"] = acting
+            m["last_tick_ms"] = elapsed_ms
+            m["avg_tick_ms"] += (elapsed_ms - m["avg_tick_ms"]) / m["ticks"]
+            m["max_tick_ms"] = max(m["max_tick_ms"], elapsed_ms)
+            m["last_tick_at"] = time.time()
+
+    def _rebalance(self, loop):
+        """按当前在线分片重新计算本分片的机器人 (rebalances 只统计机器人集合实际发生变化的次数)。"""
+        before = set(bot_runner._active_bots)
+        loop.run_until_complete(bot_runner.update_active_bots(owns=self.owns))
+        with self.metrics_lock:
+            self.metrics["bots"] = len(bot_runner._active_bots)
+            if set(bot_runner._active_bots) != before:
+                self.metrics["rebalances"] += 1
+
+    def run(self):
+        database.initialize_connection_pool()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        # 先写入一次心跳，让其它分片尽快把属于本分片的机器人让出来
+        try:
+            self.live_shards = sorted(set(self._heartbeat()) | {self.shard_id})
+        except Exception as e:
+            print(f"❌ 分片 {self.shard_id} 首次心跳失败: {e}")
+        threading.Thread(target=self.run_heartbeat_loop, daemon=True, name=f"heartbeat-{self.shard_id}").start()
+        print(f"--- 机器人分片 {self.shard_id} 已启动 (pid {self.pid}, 客户端模式: {bot_runner.BOT_CLIENT_MODE}) ---")
+
+        while not self.stop_event.is_set():
+            check_interval = 30
+            try:
+                bot_system_enabled, check_interval = bot_runner.read_bot_settings()
+                if not bot_system_enabled:
+                    if bot_runner._active_bots:
+                        loop.run_until_complete(bot_runner.stop_all_bots())
+                    self.stop_event.wait(check_interval)
+                    continue
+
+                self.wake_event.clear()
+                self._rebalance(loop)
+                if bot_runner._active_bots:
+                    started = time.perf_counter()
+                    acting = bot_runner.run_bot_turn(loop)
+                    self._record_tick(acting, (time.perf_counter() - started) * 1000)
+            except Exception as e:
+                print(f"❌ 分片 {self.shard_id} 回合出错: {e}")
+                self._record_tick(0, 0.0, error=True)
+
+            # 等到下一个回合；期间分片或机器人名单变化时立即重新分配
+            deadline = time.monotonic() + check_interval
+            while not self.stop_event.is_set() and time.monotonic() < deadline:
+                if self.wake_event.wait(max(0.0, deadline - time.monotonic())):
+                    self.wake_event.clear()
+                    try:
+                        self._rebalance(loop)
+                    except Exception as e:
+                        print(f"❌ 分片 {self.shard_id} 重新分配失败: {e}")
+
+        # 正常退出: 释放机器人、写完日志、删除心跳 (其它分片立即接管)
+        try:
+            loop.run_until_complete(bot_runner.stop_all_bots())
+            bot_log_writer.stop_bot_log_writer()
+            queries_bots.delete_bot_shard(self.shard_id)
+        except Exception as e:
+            print(f"❌ 分片 {self.shard_id} 退出清理失败: {e}")
+        print(f"--- 机器人分片 {self.shard_id} 已退出 ---")
+
+
+def run_shard(shard_id: str):
+    """(worker 进程入口) 运行一个分片，收到 SIGTERM / SIGINT 时正常退出。"""
+    shard = Shard(shard_id)
+    signal.signal(signal.SIGTERM, lambda *_: shard.stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: shard.stop_event.set())
+    shard.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片机器人运行器")
+    parser.add_argument("--shards", type=int, default=BOT_SHARDS, help="本机启动的分片 (worker 进程) 数量")
+    parser.add_argument("--shard-prefix", default=os.getenv("BOT_SHARD_PREFIX", socket.gethostname()),
+                        help="分片 ID 前缀 (多台机器运行时必须互不相同)")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    shard_ids = [f"{args.shard_prefix}-{index}" for index in range(args.shards)]
+    processes = {}
+    restarts = {} # shard_id -> {"count": 连续重启次数, "started_at": 本次启动时间, "next_restart_at": 计划重启时间}
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    def start(shard_id: str):
+        process = ctx.Process(target=run_shard, args=(shard_id,), name=f"bot-shard-{shard_id}", daemon=False)
+        process.start()
+        processes[shard_id] = process
+        state = restarts.setdefault(shard_id, {"count": 0, "started_at": 0.0, "next_restart_at": None})
+        state["started_at"] = time.monotonic()
+        state["next_restart_at"] = None
+
+    def schedule_restart(shard_id: str, exitcode):
+        """分片意外退出: 按连续重启次数计算退避时间。"""
+        state = restarts[shard_id]
+        now = time.monotonic()
+        if now - state["started_at"] >= BOT_SHARD_RESTART_RESET_SECONDS:
+            state["count"] = 0
+        state["count"] += 1
+        delay = min(BOT_SHARD_RESTART_BACKOFF_SECONDS * 2 ** (state["count"] - 1), BOT_SHARD_RESTART_BACKOFF_MAX_SECONDS)
+        state["next_restart_at"] = now + delay
+        print(f"⚠️ 分片 {shard_id} 已退出 (exit code {exitcode})，{delay:g} 秒后重启 (连续第 {state['count']} 次)")
+        if state["count"] == BOT_SHARD_RESTART_WARN_AFTER:
+            print(f"❌ 分片 {shard_id} 已连续崩溃 {state['count']} 次，可能卡在启动失败 (环境变量、数据库连接等)，请检查分片日志")
+
+    print(f"--- 分片机器人运行器启动: {args.shards} 个分片 ({', '.join(shard_ids)}) ---")
+    for shard_id in shard_ids:
+        start(shard_id)
+
+    # 监控分片进程，意外退出的分片在退避时间到达后重启
+    while not stopping.wait(BOT_SHARD_HEARTBEAT_SECONDS):
+        for shard_id, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            state = restarts[shard_id]
+            if state["next_restart_at"] is None:
+                schedule_restart(shard_id, process.exitcode)
+            if time.monotonic() >= state["next_restart_at"]:
+                start(shard_id)
+
+    print("--- 正在停止所有分片... ---")
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate() # SIGTERM: 分片正常退出并删除心跳
+    for process in processes.values():
+        process.join(BOT_SHARD_HEARTBEAT_SECONDS * 2)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
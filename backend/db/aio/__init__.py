@@ -0,0 +1,3 @@
+# backend/db/aio/__init__.py
+# 基于 asyncpg 的异步查询层，与同步的 backend/db/queries_* 并存。
+# 只覆盖读多写少的查询，供 async def 路由直接 await，避免占用线程池。
@@ -0,0 +1,75 @@
+# backend/db/aio/database.py
+
+import os
+import re
+import json
+import asyncpg
+from contextlib import asynccontextmanager
+from backend.db.database import DATABASE_URL
+
+# --- 异步连接池配置 (可通过环境变量调整) ---
+AIO_DB_POOL_MIN_CONN = int(os.getenv("AIO_DB_POOL_MIN_CONN", "2"))
+AIO_DB_POOL_MAX_CONN = int(os.getenv("AIO_DB_POOL_MAX_CONN", "20"))
+AIO_DB_COMMAND_TIMEOUT_SECONDS = float(os.getenv("AIO_DB_COMMAND_TIMEOUT_SECONDS", "30"))
+
+aio_pool: asyncpg.Pool = None
+
+async def _init_connection(conn):
+    """为每个新连接注册 JSONB 编解码器，使其与 psycopg2 一样直接返回 dict。"""
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=lambda value: json.dumps(value, ensure_ascii=False),
+        decoder=json.loads,
+        schema='pg_catalog'
+    )
+
+async def init_async_pool():
+    """在应用启动时 (事件循环内) 创建 asyncpg 连接池。"""
+    global aio_pool
+    if aio_pool is not None:
+        return
+    print(f"正在初始化异步数据库连接池 (min={AIO_DB_POOL_MIN_CONN}, max={AIO_DB_POOL_MAX_CONN})...")
+    aio_pool = await asyncpg.create_pool(
+        dsn=DATABASE_URL,
+        min_size=AIO_DB_POOL_MIN_CONN,
+        max_size=AIO_DB_POOL_MAX_CONN,
+        command_timeout=AIO_DB_COMMAND_TIMEOUT_SECONDS,
+        init=_init_connection
+    )
+    print("异步数据库连接池初始化成功。")
+
+async def close_async_pool():
+    """在应用关闭时释放 asyncpg 连接池。"""
+    global aio_pool
+    if aio_pool is not None:
+        await aio_pool.close()
+        aio_pool = None
+
+@asynccontextmanager
+async def get_async_connection():
+    """获取 asyncpg 连接的异步上下文管理器。"""
+    if aio_pool is None:
+        raise ConnectionError("异步数据库连接池未初始化。")
+    async with aio_pool.acquire() as conn:
+        yield conn
+
+_PSYCOPG2_PLACEHOLDER = re.compile(r"%(.?)", re.DOTALL)
+
+def to_asyncpg_placeholders(query: str) -> str:
+    """
+    将 psycopg2 风格的 %s 占位符依次转换为 asyncpg 的 $1, $2 ...，以便复用同步层构建的查询。
+    与 psycopg2 相同，%% 表示字面的 % (例如 LIKE 'abc%%')；不支持的占位符 (如 %(name)s) 抛出 ValueError。
+    """
+    counter = 0
+
+    def replace(match):
+        nonlocal counter
+        token = match.group(1)
+        if token == '%':
+            return '%'
+        if token == 's':
+            counter += 1
+            return f"${counter}"
+        raise ValueError(f"不支持的占位符: %{token}")
+
+    return _PSYCOPG2_PLACEHOLDER.sub(replace, query)
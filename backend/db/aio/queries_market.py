@@ -0,0 +1,59 @@
+# backend/db/aio/queries_market.py
+
+from backend.db.aio.database import get_async_connection, to_asyncpg_placeholders
+from backend.db.queries_market import (
+    build_market_listings_query, paginate_market_listings, MARKET_LISTINGS_DEFAULT_LIMIT
+)
+
+async def get_market_listings(
+    listing_type: str, exclude_owner: str = None, search_term: str = None,
+    nft_type: str = None, min_price: float = None, max_price: float = None,
+    sort: str = None, cursor: str = None, limit: int = MARKET_LISTINGS_DEFAULT_LIMIT
+) -> dict:
+    """获取市场上的挂单 (分页)。返回 {"listings": [...], "next_cursor": str 或 None}。"""
+    # 与同步查询层共用同一个查询构建器，保证过滤和游标语义一致
+    query, params, sort = build_market_listings_query(
+        listing_type, exclude_owner, search_term, nft_type,
+        min_price, max_price, sort, cursor, limit
+    )
+    async with get_async_connection() as conn:
+        rows = await conn.fetch(to_asyncpg_placeholders(query), *params)
+
+    # nft_data 为 JSONB，由连接上注册的编解码器解析
+    return paginate_market_listings([dict(row) for row in rows], sort, limit)
+
+async def get_offers_for_listing(listing_id: str) -> list:
+    """获取一个求购单收到的所有报价。"""
+    async with get_async_connection() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT o.*, u.username as offerer_username, u.uid as offerer_uid, n.nft_type, n.data as nft_data,
+                   EXTRACT(EPOCH FROM o.created_at) as created_at
+            FROM market_offers o
+            JOIN users u ON o.offerer_key = u.public_key
+            JOIN nfts n ON o.offered_nft_id = n.nft_id
+            WHERE o.listing_id = $1
+            ORDER BY o.created_at DESC
+            """,
+            listing_id
+        )
+    return [dict(row) for row in rows]
+
+async def get_bids_for_listing(listing_id: str) -> list:
+    """获取一个拍卖挂单的所有出价历史。"""
+    async with get_async_connection() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT 
+                b.bid_amount, 
+                EXTRACT(EPOCH FROM b.created_at) as created_at,
+                u.username as bidder_username,
+                u.uid as bidder_uid
+            FROM auction_bids b
+            JOIN users u ON b.bidder_key = u.public_key
+            WHERE b.listing_id = $1
+            ORDER BY b.created_at DESC
+            """,
+            listing_id
+        )
+    return [dict(row) for row in rows]
@@ -0,0 +1,34 @@
+# backend/db/aio/queries_nft.py
+
+from backend.db.aio.database import get_async_connection
+
+async def get_nft_by_id(nft_id: str) -> dict:
+    """根据 ID 获取单个 NFT 的详细信息。"""
+    async with get_async_connection() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT nft_id, owner_key, nft_type, data, status, 
+                   EXTRACT(EPOCH FROM created_at) as created_at
+            FROM nfts 
+            WHERE nft_id = $1
+            """,
+            nft_id
+        )
+    if not row:
+        return None
+    return dict(row)
+
+async def get_nfts_by_owner(owner_key: str) -> list:
+    """获取指定所有者的所有 NFT。"""
+    async with get_async_connection() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT nft_id, owner_key, nft_type, data, status, 
+                   EXTRACT(EPOCH FROM created_at) as created_at
+            FROM nfts 
+            WHERE owner_key = $1 AND status = 'ACTIVE' 
+            ORDER BY created_at DESC
+            """,
+            owner_key
+        )
+    return [dict(row) for row in rows]
@@ -0,0 +1,33 @@
+# backend/db/aio/queries_notifications.py
+
+from backend.db.aio.database import get_async_connection
+
+async def get_notifications_by_user(user_key: str, limit: int = 20) -> dict:
+    """获取用户最新的通知列表和未读计数。"""
+    async with get_async_connection() as conn:
+        # 1. 获取未读计数
+        unread_count = await conn.fetchval(
+            "SELECT COUNT(*) FROM notifications WHERE user_key = $1 AND is_read = FALSE",
+            user_key
+        )
+
+        # 2. 获取通知列表
+        rows = await conn.fetch(
+            """
+            SELECT 
+                notif_id, user_key, message, is_read, timestamp
+            FROM notifications
+            WHERE user_key = $1
+            ORDER BY timestamp DESC
+            LIMIT $2
+            """,
+            user_key, limit
+        )
+
+    notifications = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict['is_read'] = bool(row_dict['is_read'])
+        notifications.append(row_dict)
+
+    return {"notifications": notifications, "unread_count": unread_count}
@@ -0,0 +1,98 @@
+# backend/db/aio/queries_user.py
+
+import time
+from backend.db import password_hashing
+from backend.db.aio.database import get_async_connection
+from backend.db.database import GENESIS_ACCOUNT, BURN_ACCOUNT, ESCROW_ACCOUNT
+
+# --- 登录与注册 ---
+
+async def authenticate_user(username_or_uid: str, password: str) -> (bool, str, dict):
+    """使用用户名/UID和密码进行身份验证。密码校验在哈希线程池中进行，查询期间不占用连接以外的资源。"""
+    async with get_async_connection() as conn:
+        user = await conn.fetchrow(
+            "SELECT public_key, username, uid, password_hash, private_key_pem, is_active FROM users WHERE (username = $1 OR uid = $1) AND is_bot = FALSE",
+            username_or_uid
+        )
+
+    if not user:
+        return False, "用户不存在", {}
+    if not user['is_active']:
+        return False, "该账户已被禁用", {}
+    # (连接已归还，再等待哈希结果)
+    if not await password_hashing.verify_password_async(user['password_hash'], password):
+        return False, "密码错误", {}
+
+    return True, "登录成功", {
+        "public_key": user['public_key'],
+        "private_key": user['private_key_pem'],
+        "username": user['username'],
+        "uid": user['uid']
+    }
+
+async def check_invitation_code(invitation_code: str) -> (bool, str):
+    """注册前的邀请码预检 (在计算密码哈希之前拒绝无效的注册请求)。注册事务中仍会再次校验。"""
+    async with get_async_connection() as conn:
+        created_at_unix = await conn.fetchval(
+            "SELECT EXTRACT(EPOCH FROM created_at) FROM invitation_codes WHERE code = $1 AND is_used = FALSE",
+            invitation_code
+        )
+    if created_at_unix is None:
+        return False, "无效的邀请码或邀请码已被使用"
+    if (time.time() - float(created_at_unix)) > 86400 * 7: # 7 days validity
+        return False, "邀请码已过期"
+    return True, "OK"
+
+async def is_user_active(public_key: str) -> bool:
+    """用户是否存在且未被禁用。"""
+    async with get_async_connection() as conn:
+        return bool(await conn.fetchval("SELECT is_active FROM users WHERE public_key = $1", public_key))
+
+# --- 余额 ---
+
+async def get_balance(public_key: str) -> float:
+    """查询指定公钥的余额。"""
+    async with get_async_connection() as conn:
+        balance = await conn.fetchval("SELECT balance FROM balances WHERE public_key = $1", public_key)
+        return balance if balance is not None else 0.0
+
+# --- 交易历史 ---
+
+async def get_transaction_history(public_key: str) -> list:
+    """获取与某个公钥相关的所有交易记录。"""
+    async with get_async_connection() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT 
+                tx_id, from_key, to_key, amount, timestamp, 'out' as type, note,
+                (SELECT username FROM users WHERE public_key = T.from_key) as from_username,
+                (SELECT uid FROM users WHERE public_key = T.from_key) as from_uid,
+                (SELECT username FROM users WHERE public_key = T.to_key) as to_username,
+                (SELECT uid FROM users WHERE public_key = T.to_key) as to_uid
+            FROM transactions T WHERE from_key = $1
+            UNION ALL
+            SELECT 
+                tx_id, from_key, to_key, amount, timestamp, 'in' as type, note,
+                (SELECT username FROM users WHERE public_key = T.from_key) as from_username,
+                (SELECT uid FROM users WHERE public_key = T.from_key) as from_uid,
+                (SELECT username FROM users WHERE public_key = T.to_key) as to_username,
+                (SELECT uid FROM users WHERE public_key = T.to_key) as to_uid
+            FROM transactions T WHERE to_key = $1
+            ORDER BY timestamp DESC
+            """,
+            public_key
+        )
+
+    def format_username(key, username):
+        if key == GENESIS_ACCOUNT: return "⭐ 系统铸币"
+        if key == BURN_ACCOUNT: return "🔥 系统销毁"
+        if key == ESCROW_ACCOUNT: return "🔒 系统托管"
+        return username or f"{key[:10]}... (已清除)"
+
+    results = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict['from_display'] = format_username(row_dict['from_key'], row_dict['from_username'])
+        row_dict['to_display'] = format_username(row_dict['to_key'], row_dict['to_username'])
+        results.append(row_dict)
+    return results
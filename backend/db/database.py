@@ -3,8 +3,10 @@
 import os
 import psycopg2
 import psycopg2.extras
-import psycopg2.pool
+from backend.db.pool import BlockingConnectionPool
+from backend.db import ledger
 import time
+import threading
 import uuid
 import json
 import random
@@ -17,15 +19,27 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL 环境变量未设置！")
 
-db_pool: psycopg2.pool.SimpleConnectionPool = None
+# --- 连接池配置 (可通过环境变量调整) ---
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "1"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_IDLE_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_IDLE_TIMEOUT_SECONDS", "300"))
+
+def _create_pool() -> BlockingConnectionPool:
+    """按配置创建线程安全的阻塞连接池。"""
+    return BlockingConnectionPool(
+        minconn=DB_POOL_MIN_CONN,
+        maxconn=DB_POOL_MAX_CONN,
+        dsn=DATABASE_URL,
+        timeout=DB_POOL_TIMEOUT_SECONDS,
+        idle_timeout=DB_POOL_IDLE_TIMEOUT_SECONDS
+    )
+
+db_pool: BlockingConnectionPool = None
 # --- PostgreSQL 连接池 ---
 # 在应用启动时创建一次
 try:
-    db_pool = psycopg2.pool.SimpleConnectionPool(
-        minconn=1,
-        maxconn=20,
-        dsn=DATABASE_URL
-    )
+    db_pool = _create_pool()
 except psycopg2.OperationalError as e:
     print(f"!!!!!!!!!!!!!! 数据库连接失败 !!!!!!!!!!!!!!")
     print(f"错误: {e}")
@@ -59,11 +73,7 @@ def initialize_connection_pool():
     
     print("--- 正在初始化数据库连接池... ---")
     try:
-        db_pool = psycopg2.pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=20,
-            dsn=DATABASE_URL
-        )
+        db_pool = _create_pool()
         # 尝试获取一个连接以验证
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
@@ -101,6 +111,37 @@ def get_db_connection():
         if conn:
             db_pool.putconn(conn) # 释放连接回连接池
 
+def transaction_aborted(conn) -> bool:
+    """
+    当前事务是否已中止 (某条 SQL 执行失败，且错误被内部函数捕获后吞掉)。
+    此时业务函数可能仍返回成功，但 RELEASE SAVEPOINT / COMMIT 都会失败，调用方必须回滚到保存点。
+    """
+    return conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR
+
+# --- 可选扩展 ---
+# pg_trgm 是否可用 (None 表示尚未检测)。由 init_db 中的迁移设置，其他进程首次使用时再检测
+_pg_trgm_available = None
+
+def set_pg_trgm_available(available: bool):
+    global _pg_trgm_available
+    _pg_trgm_available = available
+
+def is_pg_trgm_available() -> bool:
+    """检查数据库是否安装了 pg_trgm 扩展 (结果在进程内缓存)。"""
+    global _pg_trgm_available
+    if _pg_trgm_available is None:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _pg_trgm_available = cursor.fetchone() is not None
+    return _pg_trgm_available
+
+def get_pool_stats() -> dict:
+    """获取连接池的实时指标 (供管理员接口使用)。"""
+    if db_pool is None:
+        raise ConnectionError("数据库连接池未初始化。")
+    return db_pool.get_stats()
+
 # --- 数据库初始化 ---
 def init_db():
     """初始化数据库和表结构 (PostgreSQL 语法)。"""
@@ -167,18 +208,9 @@ def init_db():
             )
             ''')
             
-            # --- 通知表 ---
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                notif_id TEXT PRIMARY KEY,
-                user_key TEXT NOT NULL,
-                message TEXT NOT NULL,
-                is_read BOOLEAN DEFAULT FALSE,
-                timestamp FLOAT NOT NULL,
-                FOREIGN KEY (user_key) REFERENCES users (public_key) ON DELETE CASCADE
-            )
-            ''')
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user_key ON notifications (user_key, is_read)")
+            # --- 通知表 (按时间分区，表结构和索引见 log_retention) ---
+            from backend.db import log_retention # 避免循环导入
+            log_retention.create_parent_table(cursor, 'notifications')
 
             # --- 好友关系表 ---
             cursor.execute('''
@@ -200,7 +232,7 @@ def init_db():
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS balances (
                 public_key TEXT PRIMARY KEY,
-                balance FLOAT NOT NULL DEFAULT 0
+                balance NUMERIC(20, 6) NOT NULL DEFAULT 0
             )
             ''')
             
@@ -210,13 +242,15 @@ def init_db():
                 tx_id TEXT PRIMARY KEY,
                 from_key TEXT NOT NULL,
                 to_key TEXT NOT NULL,
-                amount FLOAT NOT NULL,
+                amount NUMERIC(20, 6) NOT NULL,
                 timestamp FLOAT NOT NULL,
                 message_json TEXT NOT NULL,
                 signature TEXT NOT NULL,
                 note TEXT
             )
             ''')
+            # 账本存储过程 (扣款 + 入账 + 流水)
+            ledger.install_ledger_function(cursor)
             
             # --- nfts 表 ---
             cursor.execute('''
@@ -224,7 +258,7 @@ def init_db():
                 nft_id TEXT PRIMARY KEY,
                 owner_key TEXT NOT NULL,
                 nft_type TEXT NOT NULL,
-                data TEXT NOT NULL,
+                data JSONB NOT NULL,
                 created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
                 status TEXT DEFAULT 'ACTIVE',
                 FOREIGN KEY (owner_key) REFERENCES users (public_key) ON DELETE CASCADE
@@ -242,18 +276,34 @@ def init_db():
                 nft_id TEXT,
                 nft_type TEXT NOT NULL,
                 description TEXT NOT NULL,
-                price FLOAT NOT NULL,
+                price NUMERIC(20, 6) NOT NULL,
                 end_time TIMESTAMPTZ,
                 status TEXT NOT NULL,
                 highest_bidder TEXT,
-                highest_bid FLOAT DEFAULT 0,
+                highest_bid NUMERIC(20, 6) DEFAULT 0,
                 created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                search_text TEXT,
                 FOREIGN KEY (lister_key) REFERENCES users(public_key) ON DELETE CASCADE,
                 FOREIGN KEY (nft_id) REFERENCES nfts(nft_id) ON DELETE SET NULL
             )
             ''')
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_listings_type_status ON market_listings (listing_type, status)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_listings_lister ON market_listings (lister_key)")
+            # 拍卖结算 worker 按到期时间认领: WHERE listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time < now
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_listings_auction_end ON market_listings (listing_type, status, end_time)")
+            # 挂单列表键集分页: 按时间 / 按当前价格两种排序各一个部分索引 (仅 ACTIVE)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_listings_active_created
+                ON market_listings (listing_type, created_at DESC, listing_id DESC)
+                WHERE status = 'ACTIVE'
+            """)
+            # 价格排序按当前价格 (拍卖为最高出价)，替换旧的按起拍价的索引
+            cursor.execute("DROP INDEX IF EXISTS idx_listings_active_price")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_listings_active_current_price
+                ON market_listings (listing_type, (COALESCE(NULLIF(highest_bid, 0), price)), listing_id)
+                WHERE status = 'ACTIVE'
+            """)
 
             # --- 市场报价表 (market_offers) ---
             cursor.execute('''
@@ -277,7 +327,7 @@ def init_db():
                 bid_id TEXT PRIMARY KEY,
                 listing_id TEXT NOT NULL,
                 bidder_key TEXT NOT NULL,
-                bid_amount FLOAT NOT NULL,
+                bid_amount NUMERIC(20, 6) NOT NULL,
                 created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (listing_id) REFERENCES market_listings(listing_id) ON DELETE CASCADE,
                 FOREIGN KEY (bidder_key) REFERENCES users(public_key) ON DELETE CASCADE
@@ -295,27 +345,43 @@ def init_db():
                 trade_type TEXT NOT NULL,
                 seller_key TEXT NOT NULL,
                 buyer_key TEXT NOT NULL,
-                price FLOAT NOT NULL,
+                price NUMERIC(20, 6) NOT NULL,
                 timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
             )
             ''')
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_trade_history_timestamp ON market_trade_history (timestamp)")
 
-            # --- 机器人日志表 ---
+            # --- 机器人日志表 (按时间分区，表结构和索引见 log_retention) ---
+            log_retention.create_parent_table(cursor, 'bot_logs')
+
+            # --- 防重放摘要表 (REPLAY_GUARD_BACKEND=database 时由多个 worker 共享，见 replay_guard) ---
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS used_message_digests (
+                digest BYTEA PRIMARY KEY,
+                expires_at TIMESTAMPTZ NOT NULL
+            )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_used_message_digests_expires ON used_message_digests (expires_at)")
+
+            # --- 机器人分片心跳表 (独立的 shard_runner 进程每隔几秒更新一次，心跳超时的分片不再分配机器人) ---
             cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bot_logs (
-                log_id TEXT PRIMARY KEY,
-                timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                bot_key TEXT NOT NULL,
-                bot_username TEXT,
-                action_type TEXT NOT NULL,
-                message TEXT NOT NULL,
-                data_snapshot TEXT,
-                FOREIGN KEY (bot_key) REFERENCES users (public_key) ON DELETE CASCADE
+            CREATE TABLE IF NOT EXISTS bot_shard_heartbeats (
+                shard_id TEXT PRIMARY KEY,
+                host TEXT,
+                pid INTEGER,
+                started_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                last_heartbeat TIMESTAMPTZ NOT NULL,
+                bots INTEGER NOT NULL DEFAULT 0,
+                ticks BIGINT NOT NULL DEFAULT 0,
+                last_acting INTEGER NOT NULL DEFAULT 0,
+                last_tick_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+                avg_tick_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+                max_tick_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+                last_tick_at TIMESTAMPTZ,
+                tick_errors BIGINT NOT NULL DEFAULT 0,
+                rebalances BIGINT NOT NULL DEFAULT 0
             )
             ''')
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_bot_logs_bot_key ON bot_logs (bot_key)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_bot_logs_timestamp ON bot_logs (timestamp)")
 
             # --- 设置表等 ---
             cursor.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
@@ -339,16 +405,55 @@ def init_db():
             cursor.execute("INSERT INTO settings (key, value) VALUES (%s, %s) ON CONFLICT (key) DO NOTHING", ('bot_check_interval_seconds', '30'))
             
         conn.commit()
-        print("数据库初始化完成 (PostgreSQL)。")
+        invalidate_settings_cache()
+
+    # 对已有数据库执行结构迁移 (例如 nfts.data TEXT -> JSONB)
+    from backend.db.migrations import run_migrations # 避免循环导入
+    run_migrations()
+    print("数据库初始化完成 (PostgreSQL)。")
 
 # --- 核心设置函数 ---
-def get_setting(key: str) -> str:
-    """从设置表获取一个值。"""
+# --- 设置缓存 ---
+# 设置几乎只读，却在注册、机器人调度等热路径上被频繁读取。
+# 这里在进程内缓存整张 settings 表的快照：过期 (TTL) 后整体刷新一次，
+# set_setting 成功后立即更新缓存，因此热路径不需要再占用一个数据库连接。
+SETTINGS_CACHE_TTL_SECONDS = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "30"))
+
+_settings_cache: dict = None
+_settings_cache_loaded_at = 0.0
+_settings_cache_lock = threading.Lock()
+
+def _load_settings_snapshot() -> dict:
+    """(内部函数) 从数据库一次性读取全部设置。"""
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-            cursor.execute("SELECT value FROM settings WHERE key = %s", (key,))
-            result = cursor.fetchone()
-            return result['value'] if result else None
+            cursor.execute("SELECT key, value FROM settings")
+            return {row['key']: row['value'] for row in cursor.fetchall()}
+
+def get_settings_snapshot() -> dict:
+    """
+    获取全部设置的快照 (返回副本)。
+    缓存未过期时不访问数据库；请勿在已持有连接的事务中首次调用，
+    应在获取连接之前读取所需设置。
+    """
+    global _settings_cache, _settings_cache_loaded_at
+    with _settings_cache_lock:
+        if _settings_cache is not None and time.monotonic() - _settings_cache_loaded_at < SETTINGS_CACHE_TTL_SECONDS:
+            return dict(_settings_cache)
+        # 持锁刷新，避免缓存过期瞬间多个线程同时查询数据库
+        _settings_cache = _load_settings_snapshot()
+        _settings_cache_loaded_at = time.monotonic()
+        return dict(_settings_cache)
+
+def invalidate_settings_cache():
+    """使设置缓存失效，下次读取时重新从数据库加载。"""
+    global _settings_cache
+    with _settings_cache_lock:
+        _settings_cache = None
+
+def get_setting(key: str) -> str:
+    """获取一个设置值 (优先读取进程内缓存)。"""
+    return get_settings_snapshot().get(key)
 
 def set_setting(key: str, value: str) -> bool:
     """更新或插入一个设置值。"""
@@ -364,56 +469,34 @@ def set_setting(key: str, value: str) -> bool:
                     (key, value)
                 )
             conn.commit()
-            return True
         except Exception as e:
             print(f"更新设置失败: {e}")
             conn.rollback()
             return False
 
+    # 提交成功后再更新缓存，保证缓存不会领先于数据库
+    with _settings_cache_lock:
+        if _settings_cache is not None:
+            _settings_cache[key] = value
+    return True
+
 # --- 核心事务逻辑 ---
 def _execute_system_tx_logic(from_key, to_key, amount, note, conn):
-    """(内部函数) 执行系统交易的核心逻辑。"""
-    # 使用 DictCursor 以便按列名访问
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-        try:
-            if from_key != GENESIS_ACCOUNT:
-                # 使用 %s 占位符
-                # 添加 FOR UPDATE 以锁定行，防止并发冲突
-                cursor.execute("SELECT balance FROM balances WHERE public_key = %s FOR UPDATE", (from_key,))
-                from_balance_row = cursor.fetchone()
-                current_from_balance = from_balance_row['balance'] if from_balance_row else 0.0
-                if current_from_balance < amount:
-                    return False, f"系统账户 {from_key} 余额不足"
-                new_from_balance = current_from_balance - amount
-                cursor.execute("UPDATE balances SET balance = %s WHERE public_key = %s", (new_from_balance, from_key))
-
-            if to_key != BURN_ACCOUNT:
-                # 添加 FOR UPDATE
-                cursor.execute("SELECT balance FROM balances WHERE public_key = %s FOR UPDATE", (to_key,))
-                to_balance_row = cursor.fetchone()
-                current_to_balance = to_balance_row['balance'] if to_balance_row else 0.0
-                new_to_balance = current_to_balance + amount
-                # 使用 ON CONFLICT DO UPDATE 实现插入或更新
-                cursor.execute(
-                    """
-                    INSERT INTO balances (public_key, balance) VALUES (%s, %s)
-                    ON CONFLICT (public_key) DO UPDATE SET balance = EXCLUDED.balance
-                    """,
-                    (to_key, new_to_balance)
-                )
-
-            tx_id = str(uuid.uuid4())
-            timestamp = time.time()
-            message = {"from": from_key, "to": to_key, "amount": amount, "timestamp": timestamp, "note": note}
-            message_json = json.dumps(message, sort_keys=True, ensure_ascii=False)
-            
-            cursor.execute(
-                "INSERT INTO transactions (tx_id, from_key, to_key, amount, timestamp, message_json, signature, note) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (tx_id, from_key, to_key, amount, timestamp, message_json, "ADMIN_SYSTEM", note)
-            )
-            return True, "系统操作成功"
-        except Exception as e:
-            return False, f"系统操作数据库失败: {e}"
+    """(内部函数) 执行系统交易的核心逻辑 (见 backend.db.ledger，单次往返完成扣款、入账和流水)。"""
+    try:
+        timestamp = time.time()
+        # (金额可能是数据库返回的 Decimal，流水消息中仅用于展示)
+        message = {"from": from_key, "to": to_key, "amount": float(amount), "timestamp": timestamp, "note": note}
+        message_json = json.dumps(message, sort_keys=True, ensure_ascii=False)
+        ledger.transfer(
+            conn, from_key, to_key, amount, message_json, "ADMIN_SYSTEM", note, timestamp,
+            skip_debit=(from_key == GENESIS_ACCOUNT), skip_credit=(to_key == BURN_ACCOUNT)
+        )
+        return True, "系统操作成功"
+    except ledger.InsufficientFundsError:
+        return False, f"系统账户 {from_key} 余额不足"
+    except Exception as e:
+        return False, f"系统操作数据库失败: {e}"
 
 # --- 通知函数 ---
 def create_notification(user_key: str, message: str, conn):
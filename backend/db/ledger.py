@@ -0,0 +1,92 @@
+# backend/db/ledger.py
+
+import uuid
+import time
+
+"""
+账本热路径: 一次服务端调用完成 扣款 + 入账 + 写流水。
+- 扣款使用 balance >= amount 条件更新，余额检查与扣减是同一条语句，不需要先 SELECT 再在 Python 里计算；
+- 两个账户的行锁按 public_key 排序获取，A->B 与 B->A 并发转账不会死锁；
+- 系统账户: GENESIS 铸币时跳过扣款，BURN 销毁时跳过入账 (由调用方通过 skip_debit / skip_credit 指定)。
+本模块只依赖传入的事务连接，不负责提交或回滚。
+"""
+
+# 返回值: 'OK' 或 'INSUFFICIENT_FUNDS'
+LEDGER_TRANSFER_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION jcoin_ledger_transfer(
+    p_tx_id TEXT, p_from TEXT, p_to TEXT, p_amount NUMERIC,
+    p_timestamp DOUBLE PRECISION, p_message_json TEXT, p_signature TEXT, p_note TEXT,
+    p_skip_debit BOOLEAN, p_skip_credit BOOLEAN
+) RETURNS TEXT AS $$
+DECLARE
+    v_keys TEXT[] := ARRAY[]::TEXT[];
+BEGIN
+    IF NOT p_skip_debit THEN
+        v_keys := v_keys || p_from;
+    END IF;
+    IF NOT p_skip_credit THEN
+        v_keys := v_keys || p_to;
+    END IF;
+
+    -- 按固定顺序加锁，避免交叉转账死锁
+    PERFORM 1 FROM balances WHERE public_key = ANY(v_keys) ORDER BY public_key FOR UPDATE;
+
+    IF NOT p_skip_debit THEN
+        UPDATE balances SET balance = balance - p_amount
+        WHERE public_key = p_from AND balance >= p_amount;
+        IF NOT FOUND THEN
+            RETURN 'INSUFFICIENT_FUNDS';
+        END IF;
+    END IF;
+
+    IF NOT p_skip_credit THEN
+        INSERT INTO balances (public_key, balance) VALUES (p_to, p_amount)
+        ON CONFLICT (public_key) DO UPDATE SET balance = balances.balance + EXCLUDED.balance;
+    END IF;
+
+    INSERT INTO transactions (tx_id, from_key, to_key, amount, timestamp, message_json, signature, note)
+    VALUES (p_tx_id, p_from, p_to, p_amount, p_timestamp, p_message_json, p_signature, p_note);
+
+    RETURN 'OK';
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+class InsufficientFundsError(Exception):
+    """扣款账户余额不足。"""
+    pass
+
+
+# 金额列改为 NUMERIC 之前的函数签名。参数类型不同会被视为重载而不是替换，需要先删除旧版本
+_LEGACY_FUNCTION_SIGNATURE = (
+    "jcoin_ledger_transfer(TEXT, TEXT, TEXT, DOUBLE PRECISION, DOUBLE PRECISION, TEXT, TEXT, TEXT, BOOLEAN, BOOLEAN)"
+)
+
+
+def install_ledger_function(cursor):
+    """(由 init_db 调用) 创建或更新账本存储过程。"""
+    cursor.execute(f"DROP FUNCTION IF EXISTS {_LEGACY_FUNCTION_SIGNATURE}")
+    cursor.execute(LEDGER_TRANSFER_FUNCTION_SQL)
+
+
+def transfer(
+    conn, from_key: str, to_key: str, amount: float,
+    message_json: str, signature: str, note: str = None, timestamp: float = None,
+    skip_debit: bool = False, skip_credit: bool = False, tx_id: str = None
+) -> str:
+    """
+    在现有事务中执行一笔转账 (单次数据库往返)，返回 tx_id。
+    余额不足时抛出 InsufficientFundsError，此时没有任何写入发生；其他数据库错误原样抛出。
+    """
+    tx_id = tx_id or str(uuid.uuid4())
+    timestamp = timestamp if timestamp is not None else time.time()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT jcoin_ledger_transfer(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (tx_id, from_key, to_key, amount, timestamp, message_json, signature, note, skip_debit, skip_credit)
+        )
+        status = cursor.fetchone()[0]
+    if status == 'INSUFFICIENT_FUNDS':
+        raise InsufficientFundsError(from_key)
+    return tx_id
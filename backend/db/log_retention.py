@@ -0,0 +1,322 @@
+# backend/db/log_retention.py
+
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import DictCursor
+from backend.db.database import get_db_connection
+
+"""
+bot_logs / notifications 的时间分区、保留期和小时汇总。
+- 两张表按时间范围分区 (LOG_PARTITION_INTERVAL: day / week，UTC 对齐)，另有一个 DEFAULT 分区兜底，
+  写入永远不会因为缺少分区而失败；
+- 维护任务 (workers.log_maintenance) 提前创建后续 LOG_PARTITIONS_AHEAD 个分区，
+  如果 DEFAULT 分区中已有落在新分区范围内的行，会先把它们移入新分区再挂载；
+- bot_logs 每小时汇总到 bot_log_hourly_rollups (每个机器人、每种动作的条数)，原始日志删除后仍可做长期统计；
+- 超过保留期的分区整个 DROP (不逐行 DELETE)。bot_logs 的分区只有在完全汇总之后才会被删除。
+notifications.timestamp 是 Unix 时间戳 (FLOAT)，bot_logs.timestamp 是 TIMESTAMPTZ，分区边界分别使用对应类型。
+"""
+
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "week").lower() # day / week
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "2"))
+BOT_LOG_RETENTION_DAYS = float(os.getenv("BOT_LOG_RETENTION_DAYS", "30"))
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+# 只汇总在此之前已结束的小时 (留出缓冲日志写入的时间)
+BOT_LOG_ROLLUP_LAG_SECONDS = float(os.getenv("BOT_LOG_ROLLUP_LAG_SECONDS", "600"))
+
+# 表名 -> 分区配置。epoch=True 表示分区键是 Unix 时间戳 (FLOAT)
+PARTITIONED_TABLES = {
+    "bot_logs": {
+        "epoch": False,
+        "retention_days": BOT_LOG_RETENTION_DAYS,
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS {name} (
+                log_id TEXT NOT NULL,
+                timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                bot_key TEXT NOT NULL,
+                bot_username TEXT,
+                action_type TEXT NOT NULL,
+                message TEXT NOT NULL,
+                data_snapshot TEXT,
+                PRIMARY KEY (log_id, timestamp),
+                FOREIGN KEY (bot_key) REFERENCES users (public_key) ON DELETE CASCADE
+            ) PARTITION BY RANGE (timestamp)
+        """,
+        "columns": "log_id, timestamp, bot_key, bot_username, action_type, message, data_snapshot",
+        "indexes": [
+            "CREATE INDEX IF NOT EXISTS idx_bot_logs_bot_key_ts ON bot_logs (bot_key, timestamp DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_bot_logs_ts ON bot_logs (timestamp DESC)",
+        ],
+    },
+    "notifications": {
+        "epoch": True,
+        "retention_days": NOTIFICATION_RETENTION_DAYS,
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS {name} (
+                notif_id TEXT NOT NULL,
+                user_key TEXT NOT NULL,
+                message TEXT NOT NULL,
+                is_read BOOLEAN DEFAULT FALSE,
+                timestamp FLOAT NOT NULL,
+                PRIMARY KEY (notif_id, timestamp),
+                FOREIGN KEY (user_key) REFERENCES users (public_key) ON DELETE CASCADE
+            ) PARTITION BY RANGE (timestamp)
+        """,
+        "columns": "notif_id, user_key, message, is_read, timestamp",
+        "indexes": [
+            "CREATE INDEX IF NOT EXISTS idx_notifications_user_ts ON notifications (user_key, timestamp DESC)",
+            # 未读计数只扫描未读行
+            "CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_key) WHERE is_read = FALSE",
+        ],
+    },
+}
+
+ROLLUP_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS bot_log_hourly_rollups (
+        bucket TIMESTAMPTZ NOT NULL,
+        bot_key TEXT NOT NULL,
+        action_type TEXT NOT NULL,
+        bot_username TEXT,
+        log_count INTEGER NOT NULL,
+        PRIMARY KEY (bucket, bot_key, action_type)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bot_log_rollups_bot_bucket ON bot_log_hourly_rollups (bot_key, bucket)",
+    """
+    CREATE TABLE IF NOT EXISTS log_rollup_state (
+        name TEXT PRIMARY KEY,
+        rolled_up_to TIMESTAMPTZ NOT NULL
+    )
+    """,
+]
+
+_BOUND_PATTERN = re.compile(r"FROM \('?(.+?)'?\) TO \('?(.+?)'?\)")
+
+
+# --- 分区区间 ---
+
+def period_start(moment: datetime) -> datetime:
+    """moment 所在分区区间的起点 (UTC 零点；按周分区时为周一)。"""
+    start = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if LOG_PARTITION_INTERVAL == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+def period_length() -> timedelta:
+    return timedelta(weeks=1) if LOG_PARTITION_INTERVAL == "week" else timedelta(days=1)
+
+def partition_name(table: str, lower: datetime) -> str:
+    return f"{table}_p{lower:%Y%m%d}"
+
+def _bound_value(table: str, moment: datetime):
+    return moment.timestamp() if PARTITIONED_TABLES[table]["epoch"] else moment
+
+
+def create_parent_table(cursor, table: str, name: str = None):
+    """创建分区父表和 DEFAULT 分区 (幂等)。name 用于迁移时先以临时名称创建。"""
+    name = name or table
+    cursor.execute(PARTITIONED_TABLES[table]["ddl"].format(name=name))
+    # 已存在的旧版普通表由 migrations.migrate_logs_to_partitioned 转换
+    if is_partitioned(cursor, name):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {name} DEFAULT")
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+        (table,)
+    )
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+def list_partitions(cursor, table: str) -> list:
+    """返回 [{"name", "lower", "upper"}] (边界为 Unix 时间戳，按起点排序)，不含 DEFAULT 分区。"""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        (table,)
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND_PATTERN.search(bound or "")
+        if not match:
+            continue # DEFAULT
+        lower, upper = match.groups()
+        if not PARTITIONED_TABLES[table]["epoch"]:
+            cursor.execute("SELECT EXTRACT(EPOCH FROM %s::timestamptz), EXTRACT(EPOCH FROM %s::timestamptz)", (lower, upper))
+            lower, upper = cursor.fetchone()
+        partitions.append({"name": name, "lower": float(lower), "upper": float(upper)})
+    return sorted(partitions, key=lambda p: p["lower"])
+
+
+def _create_partition(cursor, table: str, lower: datetime, upper: datetime) -> str:
+    """创建 [lower, upper) 分区。DEFAULT 分区中已有该范围的行时，先移入新表再挂载。"""
+    name = partition_name(table, lower)
+    bounds = (_bound_value(table, lower), _bound_value(table, upper))
+    cursor.execute(f"SELECT 1 FROM {table}_default WHERE timestamp >= %s AND timestamp < %s LIMIT 1", bounds)
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", bounds)
+    else:
+        columns = PARTITIONED_TABLES[table]["columns"]
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE timestamp >= %s AND timestamp < %s
+                RETURNING {columns}
+            )
+            INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+            """,
+            bounds
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return name
+
+def ensure_partitions(cursor, table: str, since: datetime = None, ahead: int = None) -> list:
+    """确保从 since (默认当前区间) 到之后 ahead 个区间都有分区，返回新建的分区名。已有重叠分区的区间跳过。"""
+    ahead = LOG_PARTITIONS_AHEAD if ahead is None else ahead
+    now = datetime.now(timezone.utc)
+    lower = period_start(since or now)
+    end = period_start(now) + period_length() * (ahead + 1)
+    existing = list_partitions(cursor, table)
+
+    created = []
+    while lower < end:
+        upper = lower + period_length()
+        lo, hi = lower.timestamp(), upper.timestamp()
+        if not any(p["lower"] < hi and lo < p["upper"] for p in existing):
+            created.append(_create_partition(cursor, table, lower, upper))
+        lower = upper
+    return created
+
+def ensure_indexes(cursor, table: str):
+    for statement in PARTITIONED_TABLES[table]["indexes"]:
+        cursor.execute(statement)
+
+
+# --- 汇总 ---
+
+def rollup_bot_logs() -> dict:
+    """
+    把水位线之后、已结束的整小时日志汇总到 bot_log_hourly_rollups (按小时 / 机器人 / 动作类型计数)。
+    同一小时重复汇总会覆盖为最新计数 (幂等)。返回 {"rows", "rolled_up_to"}。
+    """
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT rolled_up_to FROM log_rollup_state WHERE name = 'bot_logs' FOR UPDATE")
+                row = cursor.fetchone()
+                if row:
+                    start = row[0]
+                else:
+                    cursor.execute("SELECT date_trunc('hour', MIN(timestamp)) FROM bot_logs")
+                    start = cursor.fetchone()[0]
+                cursor.execute(
+                    "SELECT date_trunc('hour', now() - make_interval(secs => %s))",
+                    (BOT_LOG_ROLLUP_LAG_SECONDS,)
+                )
+                until = cursor.fetchone()[0]
+                if start is not None and start >= until:
+                    conn.rollback()
+                    return {"rows": 0, "rolled_up_to": start.timestamp()}
+                start = start or until # 还没有任何日志: 直接推进水位线
+
+                cursor.execute(
+                    """
+                    INSERT INTO bot_log_hourly_rollups (bucket, bot_key, action_type, bot_username, log_count)
+                    SELECT date_trunc('hour', timestamp), bot_key, action_type, MAX(bot_username), COUNT(*)
+                    FROM bot_logs
+                    WHERE timestamp >= %s AND timestamp < %s
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (bucket, bot_key, action_type)
+                    DO UPDATE SET log_count = EXCLUDED.log_count, bot_username = EXCLUDED.bot_username
+                    """,
+                    (start, until)
+                )
+                rows = cursor.rowcount
+                cursor.execute(
+                    """
+                    INSERT INTO log_rollup_state (name, rolled_up_to) VALUES ('bot_logs', %s)
+                    ON CONFLICT (name) DO UPDATE SET rolled_up_to = EXCLUDED.rolled_up_to
+                    """,
+                    (until,)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return {"rows": rows, "rolled_up_to": until.timestamp()}
+
+def get_bot_log_rollups(bot_key: str = None, hours: int = 24) -> list:
+    """最近 hours 小时的小时汇总 (按时间倒序)。"""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            query = """
+                SELECT EXTRACT(EPOCH FROM bucket) AS bucket, bot_key, bot_username, action_type, log_count
+                FROM bot_log_hourly_rollups
+                WHERE bucket >= now() - make_interval(hours => %s)
+            """
+            params = [hours]
+            if bot_key:
+                query += " AND bot_key = %s"
+                params.append(bot_key)
+            query += " ORDER BY bucket DESC, bot_key, action_type"
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+
+# --- 保留期 ---
+
+def drop_expired_partitions(table: str) -> list:
+    """删除上界早于保留期的分区，返回删除的分区名。bot_logs 只删除已完全汇总的分区。"""
+    cutoff = time.time() - PARTITIONED_TABLES[table]["retention_days"] * 86400
+    dropped = []
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                if table == "bot_logs":
+                    cursor.execute("SELECT EXTRACT(EPOCH FROM rolled_up_to) FROM log_rollup_state WHERE name = 'bot_logs'")
+                    row = cursor.fetchone()
+                    cutoff = min(cutoff, float(row[0]) if row else 0.0)
+                for partition in list_partitions(cursor, table):
+                    if partition["upper"] <= cutoff:
+                        cursor.execute(f"DROP TABLE {partition['name']}")
+                        dropped.append(partition["name"])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return dropped
+
+def maintain_partitions() -> dict:
+    """创建后续分区 (每张表单独提交)，返回 {表名: 新建的分区名列表}。"""
+    created = {}
+    for table in PARTITIONED_TABLES:
+        with get_db_connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    created[table] = ensure_partitions(cursor, table)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    return created
+
+def get_partition_overview() -> dict:
+    """每张表的分区列表和 DEFAULT 分区中的行数 (正常情况下应为 0)。"""
+    overview = {}
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(cursor, table):
+                    overview[table] = {"partitions": [], "default_rows": 0}
+                    continue
+                partitions = list_partitions(cursor, table)
+                cursor.execute(f"SELECT COUNT(*) FROM {table}_default")
+                overview[table] = {"partitions": partitions, "default_rows": cursor.fetchone()[0]}
+        conn.rollback()
+    return overview
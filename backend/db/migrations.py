@@ -0,0 +1,332 @@
+# backend/db/migrations.py
+
+import os
+from datetime import datetime, timezone
+from psycopg2.extras import DictCursor
+from backend.db.database import get_db_connection, set_pg_trgm_available
+
+"""
+数据库结构迁移。
+- 由 init_db 在建表之后调用 (幂等，可重复执行)。
+- 也可以单独运行以便在低峰期执行回填: python -m backend.db.migrations
+"""
+
+# 每批回填的行数，避免一次性长事务锁住整张表
+NFT_DATA_BACKFILL_BATCH_SIZE = int(os.getenv("NFT_DATA_BACKFILL_BATCH_SIZE", "1000"))
+
+# 安全的 TEXT -> JSONB 转换: 无法解析的旧数据保存在 _legacy_raw 键中，而不是让迁移失败
+_SAFE_JSONB_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION jcoin_safe_jsonb(raw TEXT) RETURNS JSONB AS $$
+BEGIN
+    RETURN raw::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN jsonb_build_object('_legacy_raw', raw);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# 迁移期间的同步触发器: 回填过程中业务仍在写 data (TEXT)，由触发器同步到 data_jsonb
+_SYNC_TRIGGER_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION jcoin_nfts_sync_data_jsonb() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.data_jsonb := jcoin_safe_jsonb(NEW.data);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _get_column_type(cursor, table: str, column: str) -> str:
+    cursor.execute(
+        """
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+        """,
+        (table, column)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def migrate_nfts_data_to_jsonb(batch_size: int = None) -> int:
+    """
+    将 nfts.data 从 TEXT 迁移为 JSONB。返回回填的行数 (已是 JSONB 时返回 0)。
+    步骤:
+      1. 新增 data_jsonb 列，并用触发器同步新的写入；
+      2. 分批回填已有数据 (每批单独提交)；
+      3. 短暂锁表，补齐剩余行后删除旧列并重命名。
+    """
+    batch_size = batch_size or NFT_DATA_BACKFILL_BATCH_SIZE
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if _get_column_type(cursor, 'nfts', 'data') != 'text':
+                return 0
+
+            print("--- 迁移: nfts.data TEXT -> JSONB 开始 ---")
+            cursor.execute("ALTER TABLE nfts ADD COLUMN IF NOT EXISTS data_jsonb JSONB")
+            cursor.execute(_SAFE_JSONB_FUNCTION_SQL)
+            cursor.execute(_SYNC_TRIGGER_FUNCTION_SQL)
+            cursor.execute("DROP TRIGGER IF EXISTS trg_nfts_sync_data_jsonb ON nfts")
+            cursor.execute(
+                """
+                CREATE TRIGGER trg_nfts_sync_data_jsonb
+                BEFORE INSERT OR UPDATE OF data ON nfts
+                FOR EACH ROW EXECUTE FUNCTION jcoin_nfts_sync_data_jsonb()
+                """
+            )
+        conn.commit()
+
+        # --- 分批回填 ---
+        total = 0
+        while True:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE nfts SET data_jsonb = jcoin_safe_jsonb(data)
+                    WHERE nft_id IN (
+                        SELECT nft_id FROM nfts WHERE data_jsonb IS NULL
+                        LIMIT %s FOR UPDATE SKIP LOCKED
+                    )
+                    """,
+                    (batch_size,)
+                )
+                updated = cursor.rowcount
+            conn.commit()
+            total += updated
+            if updated:
+                print(f"--- 迁移: 已回填 {total} 行 nfts.data ---")
+            if updated < batch_size:
+                break
+
+        # --- 切换列 (短暂持有排他锁) ---
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("LOCK TABLE nfts IN ACCESS EXCLUSIVE MODE")
+                cursor.execute("UPDATE nfts SET data_jsonb = jcoin_safe_jsonb(data) WHERE data_jsonb IS NULL")
+                total += cursor.rowcount
+                cursor.execute("DROP TRIGGER IF EXISTS trg_nfts_sync_data_jsonb ON nfts")
+                cursor.execute("ALTER TABLE nfts DROP COLUMN data")
+                cursor.execute("ALTER TABLE nfts RENAME COLUMN data_jsonb TO data")
+                cursor.execute("ALTER TABLE nfts ALTER COLUMN data SET NOT NULL")
+                cursor.execute("DROP FUNCTION IF EXISTS jcoin_nfts_sync_data_jsonb()")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    print(f"--- 迁移: nfts.data 已切换为 JSONB (共回填 {total} 行) ---")
+    return total
+
+
+# 金额列: 表 -> 列 (FLOAT 累加大量 6 位小数的收获金额会产生漂移，统一改为定点数)
+MONEY_COLUMNS = {
+    "balances": ["balance"],
+    "transactions": ["amount"],
+    "market_listings": ["price", "highest_bid"],
+    "auction_bids": ["bid_amount"],
+    "market_trade_history": ["price"],
+}
+MONEY_COLUMN_TYPE = "NUMERIC(20, 6)"
+
+
+def migrate_money_columns_to_numeric() -> list:
+    """
+    将金额列从 FLOAT 改为 NUMERIC(20, 6)，旧值四舍五入到 6 位小数。返回已迁移的 "表.列" 列表。
+    每张表的所有金额列在一条 ALTER TABLE 中修改，只重写一次表 (期间持有排他锁)。
+    """
+    migrated = []
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                for table, columns in MONEY_COLUMNS.items():
+                    pending = [c for c in columns if _get_column_type(cursor, table, c) == 'double precision']
+                    if not pending:
+                        continue
+                    alters = ", ".join(
+                        f"ALTER COLUMN {c} TYPE {MONEY_COLUMN_TYPE} USING round({c}::numeric, 6)" for c in pending
+                    )
+                    cursor.execute(f"ALTER TABLE {table} {alters}")
+                    migrated.extend(f"{table}.{c}" for c in pending)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if migrated:
+        print(f"--- 迁移: 金额列已改为 {MONEY_COLUMN_TYPE}: {', '.join(migrated)} ---")
+    return migrated
+
+
+def ensure_nft_data_indexes():
+    """
+    为 nfts.data 创建 GIN 索引和常用字段的表达式索引。
+    数值字段的表达式索引带有 jsonb_typeof 条件，查询时需带上相同条件才能命中
+    (见 queries_nft.search_nfts)。
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if _get_column_type(cursor, 'nfts', 'data') != 'jsonb':
+                return
+            # 支持 data @> '{...}' 包含查询
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_nfts_data_gin ON nfts USING GIN (data jsonb_path_ops)")
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_nfts_species_rarity
+                ON nfts ((data->>'species_rarity'))
+                WHERE nft_type = 'BIO_DNA'
+                """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_nfts_rarity_total
+                ON nfts (((data#>>'{rarity_score,total}')::numeric))
+                WHERE jsonb_typeof(data#>'{rarity_score,total}') = 'number'
+                """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_nfts_total_jph
+                ON nfts (((data#>>'{economic_stats,total_jph}')::numeric))
+                WHERE jsonb_typeof(data#>'{economic_stats,total_jph}') = 'number'
+                """
+            )
+        conn.commit()
+
+
+def backfill_listing_search_text(batch_size: int = None) -> int:
+    """
+    为旧挂单补齐 market_listings.search_text。返回回填的行数。
+    非 ACTIVE 挂单不会再被搜索，直接用描述填充；ACTIVE 挂单需要 NFT 处理器生成关键词，分批在 Python 中计算。
+    """
+    from backend.db.queries_market import build_listing_search_text # 避免循环导入
+    batch_size = batch_size or NFT_DATA_BACKFILL_BATCH_SIZE
+
+    total = 0
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE market_listings ADD COLUMN IF NOT EXISTS search_text TEXT")
+            cursor.execute(
+                "UPDATE market_listings SET search_text = description WHERE search_text IS NULL AND status != 'ACTIVE'"
+            )
+        conn.commit()
+
+        while True:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT l.listing_id, l.description, l.nft_type, n.nft_id, n.data
+                    FROM market_listings l
+                    LEFT JOIN nfts n ON l.nft_id = n.nft_id
+                    WHERE l.search_text IS NULL AND l.status = 'ACTIVE'
+                    LIMIT %s
+                    """,
+                    (batch_size,)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for row in rows:
+                    nft = {"nft_id": row['nft_id'], "nft_type": row['nft_type'], "data": row['data']} if row['nft_id'] else None
+                    updates.append((build_listing_search_text(row['description'], row['nft_type'], nft), row['listing_id']))
+                cursor.executemany("UPDATE market_listings SET search_text = %s WHERE listing_id = %s", updates)
+            conn.commit()
+            total += len(rows)
+            print(f"--- 迁移: 已回填 {total} 条挂单搜索文本 ---")
+    return total
+
+
+def ensure_listing_search_index():
+    """
+    创建挂单搜索索引: 优先使用 pg_trgm 的 GIN 三元组索引 (只索引 ACTIVE 挂单，
+    取消/成交后自动移出索引)。扩展不可用时退化为普通 ILIKE 扫描。
+    """
+    available = False
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            conn.commit()
+            available = True
+        except Exception as e:
+            conn.rollback()
+            print(f"--- 警告: 无法启用 pg_trgm 扩展 ({e})，挂单搜索将退化为顺序扫描 ---")
+
+        if available:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS idx_listings_search_trgm
+                    ON market_listings USING GIN (search_text gin_trgm_ops)
+                    WHERE status = 'ACTIVE'
+                    """
+                )
+            conn.commit()
+    set_pg_trgm_available(available)
+
+
+def migrate_logs_to_partitioned() -> list:
+    """
+    将 bot_logs / notifications 从普通表转换为按时间分区的表 (见 log_retention)，返回转换的表名。
+    每张表在一个事务中完成: 以临时名称创建分区父表 -> 按已有数据的时间范围建分区 -> 复制数据 -> 删除旧表并改名。
+    复制期间旧表被锁定 (两张表都是追加写入的日志类数据，转换只发生一次)。
+    已是分区表时只补建索引、汇总表和后续分区。
+    """
+    from backend.db import log_retention # 避免循环导入
+
+    converted = []
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                for statement in log_retention.ROLLUP_TABLES_SQL:
+                    cursor.execute(statement)
+
+                for table, config in log_retention.PARTITIONED_TABLES.items():
+                    if not log_retention.is_partitioned(cursor, table):
+                        print(f"--- 迁移: {table} 转换为分区表 ---")
+                        cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+                        cursor.execute(f"SELECT MIN(timestamp) FROM {table}")
+                        oldest = cursor.fetchone()[0]
+                        if oldest is not None and config["epoch"]:
+                            oldest = datetime.fromtimestamp(oldest, timezone.utc)
+
+                        temp_name = f"{table}_partitioned"
+                        log_retention.create_parent_table(cursor, table, name=temp_name)
+                        columns = config["columns"]
+                        cursor.execute(f"INSERT INTO {temp_name} ({columns}) SELECT {columns} FROM {table}")
+                        copied = cursor.rowcount
+                        cursor.execute(f"DROP TABLE {table}")
+                        cursor.execute(f"ALTER TABLE {temp_name} RENAME TO {table}")
+                        # 约束名 (主键 / 外键) 随临时表名生成，改回原表名前缀
+                        cursor.execute(
+                            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND conname LIKE %s",
+                            (table, f"{temp_name}\\_%")
+                        )
+                        for (conname,) in cursor.fetchall():
+                            cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {conname} TO {table}{conname[len(temp_name):]}")
+                        # 旧数据先进入 DEFAULT 分区，再按区间移入各自的分区
+                        log_retention.ensure_partitions(cursor, table, since=oldest)
+                        converted.append(table)
+                        print(f"--- 迁移: {table} 已转换为分区表 (复制 {copied} 行) ---")
+                    else:
+                        log_retention.ensure_partitions(cursor, table)
+                    log_retention.ensure_indexes(cursor, table)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return converted
+
+
+def run_migrations():
+    """按顺序执行所有迁移 (幂等)。"""
+    migrate_nfts_data_to_jsonb()
+    migrate_money_columns_to_numeric()
+    ensure_nft_data_indexes()
+    backfill_listing_search_text()
+    ensure_listing_search_index()
+    migrate_logs_to_partitioned()
+
+
+if __name__ == "__main__":
+    run_migrations()
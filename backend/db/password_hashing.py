@@ -0,0 +1,107 @@
+# backend/db/password_hashing.py
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+"""
+密码哈希服务。
+- 哈希计算 (默认 pbkdf2:sha256:600000，单次约 0.25 秒) 在独立的有界线程池中执行，
+  hashlib 计算期间会释放 GIL，因此不会拖慢其他请求；
+- 排队中的任务超过 PASSWORD_HASH_MAX_PENDING 时立即拒绝 (PasswordHashBusyError)，
+  登录风暴只会让登录本身返回"繁忙"，不会占满 Web 线程池；
+- 工作因子通过 PASSWORD_HASH_METHOD 配置 (werkzeug 方法字符串)，已有的哈希仍按其自身参数校验；
+- 机器人和系统账户不会登录，使用不可用的占位哈希 UNUSABLE_PASSWORD_HASH，完全跳过哈希计算。
+"""
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# 与 init_db 中系统账户使用的占位值一致: 任何密码都无法通过校验
+UNUSABLE_PASSWORD_HASH = "!"
+
+_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+_lock = threading.Lock()
+_stats = {"hashed": 0, "verified": 0, "rejected_busy": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+class PasswordHashBusyError(Exception):
+    """哈希任务队列已满。"""
+
+
+def is_usable(password_hash: str) -> bool:
+    return bool(password_hash) and not password_hash.startswith(UNUSABLE_PASSWORD_HASH)
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            _stats["hashed" if func is _hash else "verified"] += 1
+            _stats["total_ms"] += elapsed_ms
+            _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+
+def _hash(password: str) -> str:
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+def _check(password_hash: str, password: str) -> bool:
+    return check_password_hash(password_hash, password)
+
+def _submit(func, *args):
+    if not _slots.acquire(blocking=False):
+        with _lock:
+            _stats["rejected_busy"] += 1
+        raise PasswordHashBusyError("服务器繁忙，请稍后重试")
+    try:
+        future = _pool.submit(_timed, func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+# --- 同步接口 (在普通线程中调用，阻塞等待结果) ---
+
+def hash_password(password: str) -> str:
+    return _submit(_hash, password).result()
+
+def verify_password(password_hash: str, password: str) -> bool:
+    if not is_usable(password_hash):
+        return False
+    return _submit(_check, password_hash, password).result()
+
+
+# --- 异步接口 (在 async 路由中 await，不占用 Web 线程池) ---
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+async def verify_password_async(password_hash: str, password: str) -> bool:
+    if not is_usable(password_hash):
+        return False
+    return await asyncio.wrap_future(_submit(_check, password_hash, password))
+
+
+def get_password_hash_stats() -> dict:
+    with _lock:
+        count = _stats["hashed"] + _stats["verified"]
+        return {
+            "method": PASSWORD_HASH_METHOD,
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_pending": PASSWORD_HASH_MAX_PENDING,
+            "hashed": _stats["hashed"],
+            "verified": _stats["verified"],
+            "rejected_busy": _stats["rejected_busy"],
+            "avg_ms": _stats["total_ms"] / count if count else 0.0,
+            "max_ms": _stats["max_ms"],
+        }
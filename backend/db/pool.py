@@ -0,0 +1,247 @@
+# backend/db/pool.py
+
+import time
+import threading
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+"""
+线程安全的 PostgreSQL 阻塞连接池。
+- Uvicorn 线程池中的请求线程和后台机器人线程共享同一个连接池。
+- 连接耗尽时不再直接报错，而是排队等待，直到超时。
+- 空闲超过 idle_timeout 的连接会被关闭 (但始终保留 minconn 个)。
+- 记录借出次数、等待时间分布、使用中连接数、耗尽(超时)次数等指标，供管理员接口查看。
+"""
+
+# 等待时间直方图的桶上界 (毫秒)，最后一个桶收集所有更长的等待
+WAIT_HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolTimeoutError(psycopg2.pool.PoolError):
+    """在超时时间内未能借到连接。"""
+    pass
+
+
+class BlockingConnectionPool:
+    """
+    一个线程安全、连接耗尽时阻塞等待的连接池。
+    接口与 psycopg2 的连接池保持一致 (getconn / putconn / closeall)。
+    """
+
+    def __init__(self, minconn: int, maxconn: int, dsn: str, timeout: float = 30.0, idle_timeout: float = 300.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"无效的连接池大小: minconn={minconn}, maxconn={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._dsn = dsn
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []        # [(conn, 归还时间)]，末尾是最近归还的连接
+        self._in_use = {}      # id(conn) -> conn
+        self._opened = 0       # 已打开 (含正在建立) 的连接总数
+        self._waiting = 0
+        self._closed = False
+
+        # --- 指标 ---
+        self._checkouts = 0
+        self._waited_checkouts = 0
+        self._exhausted_events = 0
+        self._connections_created = 0
+        self._connections_closed = 0
+        self._peak_in_use = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._wait_histogram = [0] * (len(WAIT_HISTOGRAM_BUCKETS_MS) + 1)
+
+        # 预先建立 minconn 个连接 (失败时直接抛出 OperationalError)
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._opened += 1
+                self._connections_created += 1
+                self._idle.append((conn, time.monotonic()))
+
+    # --- 内部辅助 ---
+
+    def _connect(self):
+        return psycopg2.connect(self._dsn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _reap_idle_locked(self) -> list:
+        """(需持有锁) 取出空闲过久的连接，返回待关闭列表。"""
+        if self.idle_timeout <= 0:
+            return []
+        now = time.monotonic()
+        expired = []
+        # _idle 按归还时间递增排列，最旧的在最前面
+        while self._idle and self._opened - len(expired) > self.minconn:
+            conn, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            expired.append(conn)
+        self._opened -= len(expired)
+        self._connections_closed += len(expired)
+        return expired
+
+    def _record_checkout_locked(self, conn, wait_ms: float):
+        self._in_use[id(conn)] = conn
+        self._checkouts += 1
+        self._peak_in_use = max(self._peak_in_use, len(self._in_use))
+        self._total_wait_ms += wait_ms
+        self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+        for i, upper in enumerate(WAIT_HISTOGRAM_BUCKETS_MS):
+            if wait_ms <= upper:
+                self._wait_histogram[i] += 1
+                break
+        else:
+            self._wait_histogram[-1] += 1
+
+    # --- 公共接口 ---
+
+    def getconn(self, timeout: float = None):
+        """借出一个连接。连接池耗尽时阻塞等待，超时后抛出 PoolTimeoutError。"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        to_close = []
+
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.pool.PoolError("连接池已关闭")
+
+                    to_close.extend(self._reap_idle_locked())
+
+                    if self._idle:
+                        conn, _ = self._idle.pop()
+                        if conn.closed:
+                            # 连接已被服务端断开，丢弃后重试
+                            self._opened -= 1
+                            self._connections_closed += 1
+                            to_close.append(conn)
+                            continue
+                        self._record_checkout_locked(conn, (time.monotonic() - start) * 1000)
+                        if waited:
+                            self._waited_checkouts += 1
+                        return conn
+
+                    if self._opened < self.maxconn:
+                        # 预占一个名额，在锁外建立连接
+                        self._opened += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._exhausted_events += 1
+                        raise PoolTimeoutError(
+                            f"数据库连接池已耗尽 (max={self.maxconn})，等待 {timeout:.1f} 秒后超时"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+        finally:
+            # 在锁外关闭过期连接，避免网络操作阻塞其他线程
+            for stale in to_close:
+                self._close_quietly(stale)
+
+        # --- 锁外建立新连接 ---
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._connections_created += 1
+            self._record_checkout_locked(conn, (time.monotonic() - start) * 1000)
+            if waited:
+                self._waited_checkouts += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """归还一个连接。未结束的事务会被回滚，损坏的连接会被关闭。"""
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+
+        with self._cond:
+            if self._closed:
+                discard = True
+            elif self._in_use.pop(id(conn), None) is None:
+                raise psycopg2.pool.PoolError("尝试归还一个不属于该连接池的连接")
+            elif close or conn.closed:
+                self._opened -= 1
+                self._connections_closed += 1
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                discard = False
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(conn)
+
+    def closeall(self):
+        """关闭所有连接 (包括正在使用的连接)。"""
+        with self._cond:
+            self._closed = True
+            conns = [c for c, _ in self._idle] + list(self._in_use.values())
+            self._idle.clear()
+            self._in_use.clear()
+            self._opened = 0
+            self._connections_closed += len(conns)
+            self._cond.notify_all()
+        for conn in conns:
+            self._close_quietly(conn)
+
+    def get_stats(self) -> dict:
+        """返回连接池的实时指标快照。"""
+        with self._cond:
+            histogram = {}
+            for i, upper in enumerate(WAIT_HISTOGRAM_BUCKETS_MS):
+                histogram[f"le_{upper}ms"] = self._wait_histogram[i]
+            histogram[f"gt_{WAIT_HISTOGRAM_BUCKETS_MS[-1]}ms"] = self._wait_histogram[-1]
+
+            return {
+                "min_connections": self.minconn,
+                "max_connections": self.maxconn,
+                "timeout_seconds": self.timeout,
+                "idle_timeout_seconds": self.idle_timeout,
+                "opened": self._opened,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waited_checkouts": self._waited_checkouts,
+                "exhausted_events": self._exhausted_events,
+                "connections_created": self._connections_created,
+                "connections_closed": self._connections_closed,
+                "avg_wait_ms": round(self._total_wait_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 3),
+                "wait_histogram": histogram,
+            }
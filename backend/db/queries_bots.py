@@ -2,65 +2,85 @@
 
 import json
 import uuid
+from datetime import datetime, timezone
 import psycopg2.errors
 from typing import Optional, List, Dict
-from shared.crypto_utils import generate_key_pair
-from werkzeug.security import generate_password_hash
+from backend.db.password_hashing import UNUSABLE_PASSWORD_HASH
 
 from backend.db.database import (
     get_db_connection, _create_system_transaction,
-    _generate_uid, _generate_secure_password, GENESIS_ACCOUNT
+    _generate_uid, GENESIS_ACCOUNT
 )
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
 
 
 def log_bot_action(bot_key: str, bot_username: str, action_type: str, message: str, data_snapshot: dict = None):
-    """记录机器人的行动日志。"""
+    """记录一条机器人行动日志 (同步写入；机器人回合中请使用 workers.bot_log_writer 的缓冲写入)。"""
+    try:
+        insert_bot_logs([(str(uuid.uuid4()), datetime.now(timezone.utc), bot_key, bot_username, action_type, message,
+                          json.dumps(data_snapshot, ensure_ascii=False) if data_snapshot else None)])
+    except Exception as e:
+        print(f"!!!!!!!!!!!!!! 严重错误：无法将机器人日志写入数据库 !!!!!!!!!!!!!!")
+        print(f"错误: {e}")
+
+def insert_bot_logs(rows: list) -> int:
+    """
+    批量写入机器人日志 (一条多行 INSERT，一次提交)。
+    rows: [(log_id, timestamp, bot_key, bot_username, action_type, message, data_snapshot_json), ...]
+    返回写入的行数；失败时回滚并抛出异常，由调用方决定是否丢弃。
+    """
+    if not rows:
+        return 0
     with get_db_connection() as conn:
         try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                log_id = str(uuid.uuid4())
-                data_json = json.dumps(data_snapshot, ensure_ascii=False) if data_snapshot else None
-                
-                cursor.execute(
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
                     """
-                    INSERT INTO bot_logs (log_id, bot_key, bot_username, action_type, message, data_snapshot)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO bot_logs (log_id, timestamp, bot_key, bot_username, action_type, message, data_snapshot)
+                    VALUES %s
                     """,
-                    (log_id, bot_key, bot_username, action_type, message, data_json)
+                    rows,
+                    page_size=len(rows)
                 )
             conn.commit()
-        except Exception as e:
-            print(f"!!!!!!!!!!!!!! 严重错误：无法将机器人日志写入数据库 !!!!!!!!!!!!!!")
-            print(f"错误: {e}")
+        except Exception:
             conn.rollback()
+            raise
+    return len(rows)
 
 def admin_get_bot_logs(bot_key: Optional[str] = None, limit: int = 100) -> List[dict]:
-    """获取机器人日志。"""
+    """获取机器人日志。先按时间取最新的 limit 条 (走 timestamp 索引，各分区归并)，再关联用户表。"""
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=DictCursor) as cursor:
-            query = """
-                SELECT 
-                    l.log_id, EXTRACT(EPOCH FROM l.timestamp) as timestamp, 
-                    l.bot_key, l.bot_username, l.action_type, l.message, l.data_snapshot,
-                    u.uid as bot_uid
-                FROM bot_logs l
-                LEFT JOIN users u ON l.bot_key = u.public_key
-            """
+            inner = "SELECT * FROM bot_logs"
             params = []
             
             if bot_key:
-                query += " WHERE bot_key = %s"
+                inner += " WHERE bot_key = %s"
                 params.append(bot_key)
                 
-            query += " ORDER BY timestamp DESC LIMIT %s"
+            inner += " ORDER BY timestamp DESC LIMIT %s"
             params.append(limit)
+
+            query = f"""
+                SELECT 
+                    l.log_id, EXTRACT(EPOCH FROM l.timestamp) as timestamp, 
+                    l.bot_key, l.bot_username, l.action_type, l.message, l.data_snapshot,
+                    u.uid as bot_uid
+                FROM ({inner}) l
+                LEFT JOIN users u ON l.bot_key = u.public_key
+                ORDER BY l.timestamp DESC
+            """
             
             cursor.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
 
-def admin_create_bot(username: Optional[str], bot_type: str, initial_funds: Optional[float], action_probability: Optional[float]) -> (bool, str, dict):
-    """管理员创建并供给一个机器人用户 (支持自动命名和默认配置)。"""
+def admin_create_bot(username: Optional[str], bot_type: str, initial_funds: Optional[float], action_probability: Optional[float], key_pair: tuple) -> (bool, str, dict):
+    """
+    管理员创建并供给一个机器人用户 (支持自动命名和默认配置)。
+    key_pair 为调用方预先取好的 (private_key_pem, public_key_pem)。
+    """
     
     # 延迟导入以解决循环依赖
     from backend.bots import BOT_LOGIC_MAP
@@ -101,9 +121,9 @@ def admin_create_bot(username: Optional[str], bot_type: str, initial_funds: Opti
                     if cursor.fetchone():
                         return False, "用户名已存在", None
                 
-                private_key, public_key = generate_key_pair()
-                bot_password = _generate_secure_password(20)
-                password_hash = generate_password_hash(bot_password)
+                private_key, public_key = key_pair
+                # 机器人从不通过密码登录，直接使用不可用的占位哈希，省去一次哈希计算
+                password_hash = UNUSABLE_PASSWORD_HASH
                 
                 while True:
                     uid = f"BOT_{_generate_uid(4)}"
@@ -169,6 +189,85 @@ def get_all_bots(include_inactive=False) -> list:
             cursor.execute(query)
             return [dict(row) for row in cursor.fetchall()]
 
+def get_active_bot_keys() -> set:
+    """所有已激活机器人的公钥 (不读取私钥，供分片心跳检测机器人增减)。"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT public_key FROM users WHERE is_bot = TRUE AND bot_type IS NOT NULL AND is_active = TRUE")
+            return {row[0] for row in cursor.fetchall()}
+
+# --- 机器人分片心跳 (backend.bots.shard_runner) ---
+
+def upsert_bot_shard_heartbeat(shard_id: str, host: str, pid: int, metrics: dict):
+    """写入一个分片的心跳和回合指标 (metrics 的键与 bot_shard_heartbeats 的指标列相同)。"""
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO bot_shard_heartbeats (
+                        shard_id, host, pid, last_heartbeat, bots, ticks, last_acting,
+                        last_tick_ms, avg_tick_ms, max_tick_ms, last_tick_at, tick_errors, rebalances
+                    ) VALUES (%s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s, to_timestamp(%s), %s, %s)
+                    ON CONFLICT (shard_id) DO UPDATE SET
+                        host = EXCLUDED.host, pid = EXCLUDED.pid, last_heartbeat = EXCLUDED.last_heartbeat,
+                        bots = EXCLUDED.bots, ticks = EXCLUDED.ticks, last_acting = EXCLUDED.last_acting,
+                        last_tick_ms = EXCLUDED.last_tick_ms, avg_tick_ms = EXCLUDED.avg_tick_ms,
+                        max_tick_ms = EXCLUDED.max_tick_ms, last_tick_at = EXCLUDED.last_tick_at,
+                        tick_errors = EXCLUDED.tick_errors, rebalances = EXCLUDED.rebalances,
+                        -- 进程重启 (pid 变化) 时重新记录启动时间
+                        started_at = CASE WHEN bot_shard_heartbeats.pid IS DISTINCT FROM EXCLUDED.pid
+                                          THEN NOW() ELSE bot_shard_heartbeats.started_at END
+                    """,
+                    (
+                        shard_id, host, pid, metrics["bots"], metrics["ticks"], metrics["last_acting"],
+                        metrics["last_tick_ms"], metrics["avg_tick_ms"], metrics["max_tick_ms"],
+                        metrics["last_tick_at"], metrics["tick_errors"], metrics["rebalances"]
+                    )
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def get_bot_shards(heartbeat_timeout_seconds: float) -> List[dict]:
+    """所有分片的心跳记录 (时间为 Unix 时间戳)，alive 表示心跳未超时。"""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute(
+                """
+                SELECT shard_id, host, pid, bots, ticks, last_acting, last_tick_ms, avg_tick_ms, max_tick_ms,
+                       tick_errors, rebalances,
+                       EXTRACT(EPOCH FROM started_at) as started_at,
+                       EXTRACT(EPOCH FROM last_heartbeat) as last_heartbeat,
+                       EXTRACT(EPOCH FROM last_tick_at) as last_tick_at,
+                       last_heartbeat > NOW() - make_interval(secs => %s) as alive
+                FROM bot_shard_heartbeats
+                ORDER BY shard_id
+                """,
+                (heartbeat_timeout_seconds,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+def delete_bot_shard(shard_id: str):
+    """分片正常退出时删除心跳记录，其机器人立即由其它分片接管。"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM bot_shard_heartbeats WHERE shard_id = %s", (shard_id,))
+        conn.commit()
+
+def delete_stale_bot_shards(older_than_seconds: float) -> int:
+    """删除长时间没有心跳的分片记录 (已下线的分片)，返回删除的数量。"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM bot_shard_heartbeats WHERE last_heartbeat < NOW() - make_interval(secs => %s)",
+                (older_than_seconds,)
+            )
+            deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+
 def admin_set_bot_config(public_key: str, action_probability: float) -> (bool, str):
     """更新指定机器人的行动概率。"""
     with get_db_connection() as conn:
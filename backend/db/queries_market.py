@@ -3,14 +3,16 @@
 import time
 import json
 import uuid
+import base64
+from datetime import datetime
+from decimal import Decimal
 from typing import List
 from psycopg2.extras import DictCursor
 
 from backend.db.database import (
     get_db_connection, _create_system_transaction, 
-    ESCROW_ACCOUNT, create_notification
+    ESCROW_ACCOUNT, create_notification, is_pg_trgm_available, transaction_aborted
 )
-from backend.db.queries_user import get_balance
 
 
 def _change_nft_owner(nft_id: str, new_owner_key: str, conn) -> (bool, str):
@@ -36,8 +38,7 @@ def _validate_nft_for_trade(cursor, nft_id: str, expected_owner: str) -> (bool,
         return False, "NFT不存在", None
     
     # nft_row 已经是字典 (或类字典对象)，因为传入的是 DictCursor
-    nft = dict(nft_row) 
-    nft['data'] = json.loads(nft['data']) # 提前解析data
+    nft = dict(nft_row) # data 为 JSONB，psycopg2 已自动解析为 dict
 
     if nft['status'] != 'ACTIVE':
         return False, "NFT不是活跃状态", nft
@@ -71,60 +72,126 @@ def _log_market_trade(conn, listing_id: str, nft_id: str, nft_type: str, trade_t
         print(f"!!!!!!!!!!!!!! 严重错误：无法将市场交易 {listing_id} 写入 market_trade_history !!!!!!!!!!!!!!")
         print(f"错误: {e}")
 
-def create_market_listing(lister_key: str, listing_type: str, nft_id: str, nft_type: str, description: str, price: float, auction_hours: float = None) -> (bool, str):
-    """在市场上创建一个新的挂单（销售、拍卖或求购）。"""
-    with get_db_connection() as conn:
-        try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                listing_id = str(uuid.uuid4())
-                
-                if listing_type in ['SALE', 'AUCTION']:
-                    if not nft_id: return False, "挂卖或拍卖必须提供nft_id"
-                    
-                    is_tradable, reason, _ = _validate_nft_for_trade(cursor, nft_id, lister_key)
-                    if not is_tradable:
-                        return False, reason
-                    
-                    success, detail = _change_nft_owner(nft_id, ESCROW_ACCOUNT, conn)
-                    if not success:
-                        conn.rollback()
-                        return False, detail
+def build_listing_search_text(description: str, nft_type: str, nft: dict = None) -> str:
+    """
+    生成挂单的搜索文本: 挂单描述 + NFT 类型名 + 交易描述 + 处理器提供的关键词。
+    在挂单创建时写入 market_listings.search_text (托管期间 NFT 数据不会变化)。
+    """
+    from backend.nft_logic import get_handler # 延迟导入以避免循环
 
-                    end_time_val = time.time() + auction_hours * 3600 if listing_type == 'AUCTION' and auction_hours else None
-                    
-                    # PostgreSQL 需要显式转换时间戳
-                    end_time_sql = "to_timestamp(%s)" if end_time_val else "%s"
-                    
-                    cursor.execute(
-                        f"""
-                        INSERT INTO market_listings (listing_id, lister_key, listing_type, nft_id, nft_type, description, price, end_time, status)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, {end_time_sql}, 'ACTIVE')
-                        """,
-                        (listing_id, lister_key, listing_type, nft_id, nft_type, description, price, end_time_val)
-                    )
+    parts = [description]
+    handler = get_handler(nft_type)
+    if handler:
+        parts.append(handler.get_display_name())
+        if nft:
+            try:
+                parts.append(handler.get_trade_description(nft))
+                parts.extend(handler.get_search_keywords(nft))
+            except Exception as e:
+                # 搜索文本只是辅助信息，不能因此阻止挂单
+                print(f"生成挂单搜索文本失败 ({nft_type}): {e}")
+    return " ".join(p for p in parts if p)
+
+def create_market_listing_in_tx(conn, lister_key: str, listing_type: str, nft_id: str, nft_type: str, description: str, price: float, auction_hours: float = None) -> (bool, str, dict):
+    """
+    (内部函数) 创建挂单的核心逻辑，在事务中运行 (不提交、不回滚)。
+    成功时第三个返回值为 {"listing_id", "listing_type", "end_time"}，提交后需交给 after_listing_created。
+    """
+    try:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            listing_id = str(uuid.uuid4())
+            end_time_val = None
 
-                elif listing_type == 'SEEK':
-                    if price <= 0: return False, "求购预算必须大于0"
-                    success, detail = _create_system_transaction(lister_key, ESCROW_ACCOUNT, price, f"托管求购资金: {description[:20]}", conn)
-                    if not success:
-                        conn.rollback()
-                        return False, f"托管求购资金失败: {detail}"
-                    
-                    cursor.execute(
-                        """
-                        INSERT INTO market_listings (listing_id, lister_key, listing_type, nft_type, description, price, status)
-                        VALUES (%s, %s, %s, %s, %s, %s, 'ACTIVE')
-                        """,
-                        (listing_id, lister_key, listing_type, nft_type, description, price)
-                    )
-                else:
-                    return False, "无效的挂单类型"
+            if listing_type in ['SALE', 'AUCTION']:
+                if not nft_id: return False, "挂卖或拍卖必须提供nft_id", None
+
+                is_tradable, reason, nft = _validate_nft_for_trade(cursor, nft_id, lister_key)
+                if not is_tradable:
+                    return False, reason, None
+
+                success, detail = _change_nft_owner(nft_id, ESCROW_ACCOUNT, conn)
+                if not success:
+                    return False, detail, None
 
+                end_time_val = time.time() + auction_hours * 3600 if listing_type == 'AUCTION' and auction_hours else None
+
+                # PostgreSQL 需要显式转换时间戳
+                end_time_sql = "to_timestamp(%s)" if end_time_val else "%s"
+
+                cursor.execute(
+                    f"""
+                    INSERT INTO market_listings (listing_id, lister_key, listing_type, nft_id, nft_type, description, price, end_time, status, search_text)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, {end_time_sql}, 'ACTIVE', %s)
+                    """,
+                    (listing_id, lister_key, listing_type, nft_id, nft_type, description, price, end_time_val,
+                     build_listing_search_text(description, nft_type, nft))
+                )
+
+            elif listing_type == 'SEEK':
+                if price <= 0: return False, "求购预算必须大于0", None
+                success, detail = _create_system_transaction(lister_key, ESCROW_ACCOUNT, price, f"托管求购资金: {description[:20]}", conn)
+                if not success:
+                    return False, f"托管求购资金失败: {detail}", None
+
+                cursor.execute(
+                    """
+                    INSERT INTO market_listings (listing_id, lister_key, listing_type, nft_type, description, price, status, search_text)
+                    VALUES (%s, %s, %s, %s, %s, %s, 'ACTIVE', %s)
+                    """,
+                    (listing_id, lister_key, listing_type, nft_type, description, price,
+                     build_listing_search_text(description, nft_type))
+                )
+            else:
+                return False, "无效的挂单类型", None
+
+        return True, "挂单成功！", {"listing_id": listing_id, "listing_type": listing_type, "end_time": end_time_val}
+    except Exception as e:
+        return False, f"创建挂单失败: {e}", None
+
+# 拍卖调度通知频道: 本进程没有运行调度线程时 (例如 local 模式的机器人分片)，
+# 新建 / 取消的拍卖通过 NOTIFY 告诉 API 进程的调度器
+AUCTION_SCHEDULE_CHANNEL = "auction_schedule"
+
+def notify_auction_schedule(listing_id: str, end_time: float = None):
+    """通知其他进程的拍卖调度器 (end_time 为 None 表示取消)。失败时只打印警告，由定时兜底扫描结算。"""
+    payload = json.dumps({"listing_id": listing_id, "end_time": end_time})
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (AUCTION_SCHEDULE_CHANNEL, payload))
             conn.commit()
-            return True, "挂单成功！"
-        except Exception as e:
+    except Exception as e:
+        print(f"⚠️ 警告: 拍卖调度通知发送失败 {listing_id[:8]}...: {e}")
+
+def after_listing_created(listing: dict):
+    """(提交后调用) 拍卖挂单登记到到期调度器 (本进程没有调度器时通知 API 进程的调度器)。"""
+    if listing and listing['listing_type'] == 'AUCTION' and listing['end_time']:
+        from backend.workers import auction_scheduler # 避免循环导入
+        if auction_scheduler.is_running():
+            auction_scheduler.schedule_auction(listing['listing_id'], listing['end_time'])
+        else:
+            notify_auction_schedule(listing['listing_id'], listing['end_time'])
+
+def after_listing_cancelled(listing_id: str):
+    """(提交后调用) 从到期调度器中移除已取消的挂单。"""
+    from backend.workers import auction_scheduler # 避免循环导入
+    if auction_scheduler.is_running():
+        auction_scheduler.unschedule_auction(listing_id)
+    else:
+        notify_auction_schedule(listing_id)
+
+def create_market_listing(lister_key: str, listing_type: str, nft_id: str, nft_type: str, description: str, price: float, auction_hours: float = None) -> (bool, str):
+    """在市场上创建一个新的挂单（销售、拍卖或求购）。"""
+    with get_db_connection() as conn:
+        success, detail, listing = create_market_listing_in_tx(
+            conn, lister_key, listing_type, nft_id, nft_type, description, price, auction_hours
+        )
+        if success:
+            conn.commit()
+            after_listing_created(listing)
+        else:
             conn.rollback()
-            return False, f"创建挂单失败: {e}"
+        return success, detail
 
 def cancel_market_listing_in_tx(conn, lister_key: str, listing_id: str) -> (bool, str):
     """(内部函数) 取消挂单的核心逻辑，在事务中运行。"""
@@ -159,181 +226,319 @@ def cancel_market_listing(lister_key: str, listing_id: str) -> (bool, str):
         success, detail = cancel_market_listing_in_tx(conn, lister_key, listing_id)
         if success:
             conn.commit()
+            after_listing_cancelled(listing_id)
         else:
             conn.rollback()
         return success, detail
 
+def execute_sale_in_tx(conn, buyer_key: str, listing_id: str) -> (bool, str):
+    """(内部函数) 直接购买的核心逻辑，在事务中运行 (不提交、不回滚)。"""
+    try:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute("SELECT * FROM market_listings WHERE listing_id = %s AND listing_type = 'SALE' AND status = 'ACTIVE' FOR UPDATE", (listing_id,))
+            listing = cursor.fetchone()
+            if not listing: return False, "未找到该出售商品"
+            if listing['lister_key'] == buyer_key: return False, "不能购买自己的商品"
+
+            price = listing['price']
+            seller_key = listing['lister_key']
+            nft_id = listing['nft_id']
+
+            success, detail = _create_system_transaction(buyer_key, seller_key, price, f"购买NFT: {nft_id[:8]}", conn)
+            if not success:
+                return False, f"支付失败: {detail}"
+
+            success, detail = _change_nft_owner(nft_id, buyer_key, conn)
+            if not success:
+                return False, f"交付NFT失败: {detail}"
+
+            cursor.execute("UPDATE market_listings SET status = 'SOLD' WHERE listing_id = %s", (listing_id,))
+            _log_market_trade(
+                conn=conn, listing_id=listing_id, nft_id=nft_id, nft_type=listing['nft_type'],
+                trade_type='SALE', seller_key=seller_key, buyer_key=buyer_key, price=price
+            )
+
+            create_notification(
+                user_key=seller_key,
+                message=f"🎉 你的 NFT (ID: {nft_id[:8]}...) 已被购买，你收到了 {price:.2f} FC！",
+                conn=conn
+            )
+            create_notification(
+                user_key=buyer_key,
+                message=f"🎉 你成功购买了 NFT (ID: {nft_id[:8]}...)！",
+                conn=conn
+            )
+        return True, "购买成功！"
+    except Exception as e:
+        return False, f"购买失败: {e}"
+
 def execute_sale(buyer_key: str, listing_id: str) -> (bool, str):
     """执行一个直接购买操作。"""
     with get_db_connection() as conn:
-        try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute("SELECT * FROM market_listings WHERE listing_id = %s AND listing_type = 'SALE' AND status = 'ACTIVE' FOR UPDATE", (listing_id,))
-                listing = cursor.fetchone()
-                if not listing: return False, "未找到该出售商品"
-                if listing['lister_key'] == buyer_key: return False, "不能购买自己的商品"
+        success, detail = execute_sale_in_tx(conn, buyer_key, listing_id)
+        if success:
+            conn.commit()
+        else:
+            conn.rollback()
+        return success, detail
 
-                price = listing['price']
-                seller_key = listing['lister_key']
-                nft_id = listing['nft_id']
+def place_auction_bid_in_tx(conn, bidder_key: str, listing_id: str, bid_amount: float) -> (bool, str):
+    """(内部函数) 拍卖出价的核心逻辑，在事务中运行 (不提交、不回滚)。"""
+    try:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute("SELECT * FROM market_listings WHERE listing_id = %s AND listing_type = 'AUCTION' AND status = 'ACTIVE' FOR UPDATE", (listing_id,))
+            listing = cursor.fetchone()
+            if not listing: return False, "未找到该拍卖品"
+            if listing['lister_key'] == bidder_key: return False, "不能对自己的商品出价"
 
-                success, detail = _create_system_transaction(buyer_key, seller_key, price, f"购买NFT: {nft_id[:8]}", conn)
-                if not success:
-                    conn.rollback()
-                    return False, f"支付失败: {detail}"
+            # 检查时间戳
+            cursor.execute("SELECT 1 FROM market_listings WHERE listing_id = %s AND end_time < CURRENT_TIMESTAMP", (listing_id,))
+            if cursor.fetchone():
+                return False, "拍卖已结束"
+
+            price = listing['price']
+            highest_bid = listing['highest_bid']
+
+            if bid_amount <= highest_bid: return False, f"出价必须高于当前最高价 {highest_bid}"
+            if bid_amount < price and highest_bid == 0: return False, f"首次出价必须不低于起拍价 {price}"
 
-                success, detail = _change_nft_owner(nft_id, buyer_key, conn)
+            # (在同一事务中读取余额，批量请求中前面的操作已扣款也能看到)
+            cursor.execute("SELECT balance FROM balances WHERE public_key = %s", (bidder_key,))
+            balance_row = cursor.fetchone()
+            if not balance_row or balance_row['balance'] < bid_amount: return False, "你的余额不足以支撑此出价"
+
+            if listing['highest_bidder']:
+                success, detail = _create_system_transaction(ESCROW_ACCOUNT, listing['highest_bidder'], listing['highest_bid'], f"拍卖出价被超过，退款", conn)
                 if not success:
-                    conn.rollback()
-                    return False, f"交付NFT失败: {detail}"
+                    return False, f"退还上一位出价者资金失败: {detail}"
 
-                cursor.execute("UPDATE market_listings SET status = 'SOLD' WHERE listing_id = %s", (listing_id,))
-                _log_market_trade(
-                    conn=conn, listing_id=listing_id, nft_id=nft_id, nft_type=listing['nft_type'],
-                    trade_type='SALE', seller_key=seller_key, buyer_key=buyer_key, price=price
-                )
-                
                 create_notification(
-                    user_key=seller_key,
-                    message=f"🎉 你的 NFT (ID: {nft_id[:8]}...) 已被购买，你收到了 {price:.2f} FC！",
+                    user_key=listing['highest_bidder'],
+                    message=f"出价被超过！你在拍卖品 {listing_id[:8]}... 上的出价 ({listing['highest_bid']:.2f} FC) 已被 {bid_amount:.2f} FC 超越，资金已退还。",
                     conn=conn
                 )
-                create_notification(
-                    user_key=buyer_key,
-                    message=f"🎉 你成功购买了 NFT (ID: {nft_id[:8]}...)！",
-                    conn=conn
+
+            create_notification(
+                user_key=listing['lister_key'],
+                message=f"你的拍卖品 {listing_id[:8]}... 收到新出价 {bid_amount:.2f} FC！",
+                conn=conn
+            )
+
+            success, detail = _create_system_transaction(bidder_key, ESCROW_ACCOUNT, bid_amount, f"托管拍卖出价", conn)
+            if not success:
+                return False, f"托管您的出价资金失败: {detail}"
+
+            try:
+                bid_id = str(uuid.uuid4())
+                cursor.execute(
+                    "INSERT INTO auction_bids (bid_id, listing_id, bidder_key, bid_amount) VALUES (%s, %s, %s, %s)",
+                    (bid_id, listing_id, bidder_key, bid_amount)
                 )
-            conn.commit()
-            return True, "购买成功！"
-        except Exception as e:
-            conn.rollback()
-            return False, f"购买失败: {e}"
+            except Exception as e:
+                print(f"⚠️ 警告: 记录拍卖出价失败: {e}")
+
+            cursor.execute(
+                "UPDATE market_listings SET highest_bid = %s, highest_bidder = %s WHERE listing_id = %s",
+                (bid_amount, bidder_key, listing_id)
+            )
+        return True, f"出价成功！您当前是最高出价者。"
+    except Exception as e:
+        return False, f"出价失败: {e}"
 
 def place_auction_bid(bidder_key: str, listing_id: str, bid_amount: float) -> (bool, str):
     """对一个拍卖品出价。"""
     with get_db_connection() as conn:
+        success, detail = place_auction_bid_in_tx(conn, bidder_key, listing_id, bid_amount)
+        if success:
+            conn.commit()
+        else:
+            conn.rollback()
+        return success, detail
+
+def _settle_auction_in_tx(conn, auction) -> (bool, str):
+    """
+    (内部函数) 在现有事务中结算一场已锁定的拍卖。
+    调用方负责 SAVEPOINT / 回滚，本函数失败时直接返回 False，不做回滚。
+    """
+    listing_id = auction['listing_id']
+    nft_id = auction['nft_id']
+
+    with conn.cursor(cursor_factory=DictCursor) as cursor:
+        if auction['highest_bidder']:
+            seller_key = auction['lister_key']
+            winner_key = auction['highest_bidder']
+            final_price = auction['highest_bid']
+
+            success, detail = _create_system_transaction(ESCROW_ACCOUNT, seller_key, final_price, f"拍卖成功收款", conn)
+            if not success:
+                return False, detail
+
+            success, detail = _change_nft_owner(nft_id, winner_key, conn)
+            if not success:
+                return False, detail
+
+            cursor.execute("UPDATE market_listings SET status = 'SOLD' WHERE listing_id = %s", (listing_id,))
+
+            _log_market_trade(
+                conn=conn, listing_id=listing_id, nft_id=nft_id, nft_type=auction['nft_type'],
+                trade_type='AUCTION', seller_key=seller_key, buyer_key=winner_key, price=final_price
+            )
+            create_notification(
+                user_key=seller_key,
+                message=f"💰 你的拍卖品 {nft_id[:8]}... 已成交，你收到了 {final_price:.2f} FC！",
+                conn=conn
+            )
+            create_notification(
+                user_key=winner_key,
+                message=f"🎉 恭喜！你以 {final_price:.2f} FC 成功拍下 NFT {nft_id[:8]}...！",
+                conn=conn
+            )
+            return True, "拍卖已成交"
+        else:
+            # 流拍
+            success, detail = _change_nft_owner(nft_id, auction['lister_key'], conn)
+            if not success:
+                return False, detail
+            cursor.execute("UPDATE market_listings SET status = 'EXPIRED' WHERE listing_id = %s", (listing_id,))
+            create_notification(
+                user_key=auction['lister_key'],
+                message=f"💔 你的拍卖品 {nft_id[:8]}... 流拍，NFT已退回。",
+                conn=conn
+            )
+            return True, "拍卖已流拍"
+
+def _settle_claimed_auctions(conn, cursor, auctions, result: dict):
+    """(内部函数) 逐场结算已锁定的拍卖，每场一个 SAVEPOINT，结果累加到 result。"""
+    for auction in auctions:
+        cursor.execute("SAVEPOINT settle_auction")
         try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute("SELECT * FROM market_listings WHERE listing_id = %s AND listing_type = 'AUCTION' AND status = 'ACTIVE' FOR UPDATE", (listing_id,))
-                listing = cursor.fetchone()
-                if not listing: return False, "未找到该拍卖品"
-                if listing['lister_key'] == bidder_key: return False, "不能对自己的商品出价"
-                
-                # 检查时间戳
-                cursor.execute("SELECT 1 FROM market_listings WHERE listing_id = %s AND end_time < CURRENT_TIMESTAMP", (listing_id,))
-                if cursor.fetchone():
-                    return False, "拍卖已结束"
-                
-                price = listing['price']
-                highest_bid = listing['highest_bid']
-                
-                if bid_amount <= highest_bid: return False, f"出价必须高于当前最高价 {highest_bid}"
-                if bid_amount < price and highest_bid == 0: return False, f"首次出价必须不低于起拍价 {price}"
+            success, detail = _settle_auction_in_tx(conn, auction)
+        except Exception as e:
+            success, detail = False, str(e)
+        if success and transaction_aborted(conn):
+            # 例如成交记录或通知写入失败被内部函数吞掉: 只回滚这一场，不能让 RELEASE 失败拖垮整批
+            success, detail = False, "结算过程中有 SQL 语句失败，事务已中止"
 
-                if get_balance(bidder_key) < bid_amount: return False, "你的余额不足以支撑此出价"
+        if success:
+            cursor.execute("RELEASE SAVEPOINT settle_auction")
+            result["settled"] += 1
+            result["lags"].append(float(auction['lag_seconds']))
+        else:
+            cursor.execute("ROLLBACK TO SAVEPOINT settle_auction")
+            result["failed"].append(auction['listing_id'])
+            print(f"--- 拍卖结算失败 {auction['listing_id'][:8]}...: {detail} ---")
 
-                if listing['highest_bidder']:
-                    success, detail = _create_system_transaction(ESCROW_ACCOUNT, listing['highest_bidder'], listing['highest_bid'], f"拍卖出价被超过，退款", conn)
-                    
-                    create_notification(
-                        user_key=listing['highest_bidder'],
-                        message=f"出价被超过！你在拍卖品 {listing_id[:8]}... 上的出价 ({listing['highest_bid']:.2f} FC) 已被 {bid_amount:.2f} FC 超越，资金已退还。",
-                        conn=conn
-                    )
-                    if not success:
-                        conn.rollback()
-                        return False, f"退还上一位出价者资金失败: {detail}"
-                
-                create_notification(
-                    user_key=listing['lister_key'],
-                    message=f"你的拍卖品 {listing_id[:8]}... 收到新出价 {bid_amount:.2f} FC！",
-                    conn=conn
-                )
-                
-                success, detail = _create_system_transaction(bidder_key, ESCROW_ACCOUNT, bid_amount, f"托管拍卖出价", conn)
-                if not success:
-                    conn.rollback()
-                    return False, f"托管您的出价资金失败: {detail}"
-                
-                try:
-                    bid_id = str(uuid.uuid4())
-                    cursor.execute(
-                        "INSERT INTO auction_bids (bid_id, listing_id, bidder_key, bid_amount) VALUES (%s, %s, %s, %s)",
-                        (bid_id, listing_id, bidder_key, bid_amount)
-                    )
-                except Exception as e:
-                    print(f"⚠️ 警告: 记录拍卖出价失败: {e}")
-                
+def settle_expired_auctions_batch(batch_size: int, exclude_ids: list = None) -> dict:
+    """
+    (系统调用) 认领并结算一批已结束的拍卖。
+    - 使用 FOR UPDATE SKIP LOCKED 认领，多个结算进程可以并行而不互相阻塞；
+    - 每场拍卖在独立的 SAVEPOINT 中结算，单场失败只回滚自己，不影响同批其他拍卖；
+    - exclude_ids 用于跳过近期失败的拍卖，避免反复重试同一场坏数据。
+    返回 {"claimed", "settled", "failed": [listing_id...], "lags": [结算延迟秒数...]}。
+    """
+    result = {"claimed": 0, "settled": 0, "failed": [], "lags": []}
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                # 命中 idx_listings_auction_end (listing_type, status, end_time)
                 cursor.execute(
-                    "UPDATE market_listings SET highest_bid = %s, highest_bidder = %s WHERE listing_id = %s",
-                    (bid_amount, bidder_key, listing_id)
+                    """
+                    SELECT *, EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - end_time)) AS lag_seconds
+                    FROM market_listings
+                    WHERE listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time < CURRENT_TIMESTAMP
+                      AND NOT (listing_id = ANY(%s))
+                    ORDER BY end_time
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (list(exclude_ids or []), batch_size)
                 )
+                auctions = cursor.fetchall()
+                result["claimed"] = len(auctions)
+                _settle_claimed_auctions(conn, cursor, auctions, result)
             conn.commit()
-            return True, f"出价成功！您当前是最高出价者。"
         except Exception as e:
+            print(f"!!!!!!!!!!!!!! 严重错误：结算拍卖失败 !!!!!!!!!!!!!!")
+            print(f"错误: {e}")
             conn.rollback()
-            return False, f"出价失败: {e}"
+            result["settled"] = 0
+            result["lags"] = []
+    return result
 
-def resolve_finished_auctions():
-    """(系统调用) 结算所有已结束的拍卖。"""
+def settle_auctions_by_ids(listing_ids: list) -> dict:
+    """
+    (系统调用) 按 ID 结算指定的拍卖 (供 workers.auction_scheduler 在到期时调用，不扫描整表)。
+    只认领仍为 ACTIVE 且已到期的拍卖；被其他进程锁定、已取消或尚未到期的不会出现在结果中。
+    返回值同 settle_expired_auctions_batch，额外包含 "claimed_ids"。
+    """
+    result = {"claimed": 0, "settled": 0, "failed": [], "lags": [], "claimed_ids": []}
+    if not listing_ids:
+        return result
     with get_db_connection() as conn:
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                # 使用 CURRENT_TIMESTAMP 替换 time.time()
-                cursor.execute("SELECT * FROM market_listings WHERE listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time < CURRENT_TIMESTAMP FOR UPDATE")
-                auctions_to_resolve = cursor.fetchall()
-                
-                resolved_count = 0
-                for auction in auctions_to_resolve:
-                    listing_id = auction['listing_id']
-                    nft_id = auction['nft_id'] 
-                    
-                    if auction['highest_bidder']:
-                        seller_key = auction['lister_key']
-                        winner_key = auction['highest_bidder']
-                        final_price = auction['highest_bid']
-
-                        success, detail = _create_system_transaction(ESCROW_ACCOUNT, seller_key, final_price, f"拍卖成功收款", conn)
-                        if not success: continue
-                        
-                        success, detail = _change_nft_owner(nft_id, winner_key, conn)
-                        if not success: continue
-                        
-                        cursor.execute("UPDATE market_listings SET status = 'SOLD' WHERE listing_id = %s", (listing_id,))
-                        
-                        _log_market_trade(
-                            conn=conn, listing_id=listing_id, nft_id=nft_id, nft_type=auction['nft_type'],
-                            trade_type='AUCTION', seller_key=seller_key, buyer_key=winner_key, price=final_price
-                        )
-                        create_notification(
-                            user_key=seller_key,
-                            message=f"💰 你的拍卖品 {nft_id[:8]}... 已成交，你收到了 {final_price:.2f} FC！",
-                            conn=conn
-                        )
-                        create_notification(
-                            user_key=winner_key,
-                            message=f"🎉 恭喜！你以 {final_price:.2f} FC 成功拍下 NFT {nft_id[:8]}...！",
-                            conn=conn
-                        )
-                    else:
-                        # 流拍
-                        success, detail = _change_nft_owner(nft_id, auction['lister_key'], conn)
-                        if not success: continue
-                        cursor.execute("UPDATE market_listings SET status = 'EXPIRED' WHERE listing_id = %s", (listing_id,))
-                        create_notification(
-                            user_key=auction['lister_key'],
-                            message=f"💔 你的拍卖品 {nft_id[:8]}... 流拍，NFT已退回。",
-                            conn=conn
-                        )
-                    
-                    resolved_count += 1
+                # clock_timestamp(): 调度器按 end_time 精确触发，不能用事务开始时间判断是否到期
+                cursor.execute(
+                    """
+                    SELECT *, EXTRACT(EPOCH FROM (clock_timestamp() - end_time)) AS lag_seconds
+                    FROM market_listings
+                    WHERE listing_id = ANY(%s)
+                      AND listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time <= clock_timestamp()
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (list(listing_ids),)
+                )
+                auctions = cursor.fetchall()
+                result["claimed"] = len(auctions)
+                result["claimed_ids"] = [a['listing_id'] for a in auctions]
+                _settle_claimed_auctions(conn, cursor, auctions, result)
             conn.commit()
-            return resolved_count
         except Exception as e:
             print(f"!!!!!!!!!!!!!! 严重错误：结算拍卖失败 !!!!!!!!!!!!!!")
             print(f"错误: {e}")
             conn.rollback()
-            return 0
+            result["settled"] = 0
+            result["lags"] = []
+    return result
+
+def get_active_auction_end_times() -> list:
+    """返回所有进行中拍卖的 (listing_id, end_time 时间戳)，用于调度器启动时加载。"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT listing_id, EXTRACT(EPOCH FROM end_time)
+                FROM market_listings
+                WHERE listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time IS NOT NULL
+                """
+            )
+            return [(row[0], float(row[1])) for row in cursor.fetchall()]
+
+def get_auction_settlement_backlog() -> dict:
+    """统计已到期但尚未结算的拍卖数量和最久的逾期秒数。"""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute(
+                """
+                SELECT COUNT(*) AS pending,
+                       COALESCE(EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - MIN(end_time))), 0) AS oldest_lag_seconds
+                FROM market_listings
+                WHERE listing_type = 'AUCTION' AND status = 'ACTIVE' AND end_time < CURRENT_TIMESTAMP
+                """
+            )
+            row = cursor.fetchone()
+            return {"pending": row['pending'], "oldest_lag_seconds": float(row['oldest_lag_seconds'])}
+
+def resolve_finished_auctions(batch_size: int = 100) -> int:
+    """(系统调用) 分批结算所有已结束的拍卖，返回成功结算的数量。常规结算由 workers.auction_settlement 负责。"""
+    resolved_count = 0
+    failed_ids = []
+    while True:
+        result = settle_expired_auctions_batch(batch_size, exclude_ids=failed_ids)
+        resolved_count += result["settled"]
+        failed_ids.extend(result["failed"])
+        if result["claimed"] < batch_size:
+            return resolved_count
 
 
 def make_seek_offer(offerer_key: str, listing_id: str, offered_nft_id: str) -> (bool, str):
@@ -438,49 +643,169 @@ def respond_to_seek_offer(seeker_key: str, offer_id: str, accept: bool) -> (bool
             conn.rollback()
             return False, f"处理报价失败: {e}"
 
-def get_market_listings(listing_type: str, exclude_owner: str = None, search_term: str = None) -> list:
-    """获取市场上的所有挂单。"""
+# --- 挂单列表 (键集分页) ---
+
+MARKET_LISTINGS_DEFAULT_LIMIT = 50
+MARKET_LISTINGS_MAX_LIMIT = 200
+
+# 挂单的当前价格: 拍卖为最高出价 (无出价时为起拍价)，一口价为售价 (highest_bid 为 0)
+LISTING_CURRENT_PRICE_SQL = "COALESCE(NULLIF(l.highest_bid, 0), l.price)"
+
+# 排序方式 -> (排序表达式, 方向, 游标取值的列名)。每种排序都以 listing_id 作为并列时的次序，保证游标唯一
+# relevance 的排序表达式依赖搜索词，由 build_market_listings_query 单独处理；
+# word_similarity 返回 real (float4)，取整为 6 位小数的 numeric，使游标中的文本值与排序、比较用的值完全一致
+# (否则 real 与游标参数按 float8 比较，并列的行会在翻页时重复或被跳过)
+MARKET_LISTING_SORTS = {
+    "newest": ("l.created_at", "DESC", "_cursor_created_at"),
+    "price_asc": (LISTING_CURRENT_PRICE_SQL, "ASC", "_current_price"),
+    "price_desc": (LISTING_CURRENT_PRICE_SQL, "DESC", "_current_price"),
+    "relevance": ("round(word_similarity(%s, l.search_text)::numeric, 6)", "DESC", "_search_rank"),
+}
+
+def resolve_listing_sort(sort: str, search_term: str = None) -> str:
+    """
+    确定实际使用的排序方式。
+    未指定时: 有搜索词且 pg_trgm 可用则按相关度排序，否则按最新排序。
+    """
+    if not sort:
+        return "relevance" if search_term and is_pg_trgm_available() else "newest"
+    if sort not in MARKET_LISTING_SORTS:
+        raise ValueError(f"不支持的排序方式: {sort}")
+    if sort == "relevance":
+        if not search_term:
+            raise ValueError("按相关度排序必须提供搜索词")
+        if not is_pg_trgm_available():
+            return "newest" # 没有 pg_trgm 时无法计算相关度，退化为按最新排序
+    return sort
+
+def _escape_like(term: str) -> str:
+    """转义 LIKE/ILIKE 中的通配符，使搜索词按字面匹配。"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def encode_listing_cursor(sort: str, row: dict) -> str:
+    """根据一页中最后一行生成下一页游标 (不透明的 base64 字符串)。"""
+    value = row[MARKET_LISTING_SORTS[sort][2]]
+    value = value.isoformat() if sort == "newest" else str(value)
+    payload = json.dumps({"s": sort, "v": value, "id": row['listing_id']}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_listing_cursor(cursor: str, sort: str) -> tuple:
+    """解析游标，返回 (排序值, listing_id)。游标无效或与排序方式不匹配时抛出 ValueError。"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        cursor_sort = payload['s']
+        if sort == "newest":
+            value = datetime.fromisoformat(payload['v'])
+        else:
+            value = Decimal(payload['v'])
+        listing_id = str(payload['id'])
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if cursor_sort != sort:
+        raise ValueError("游标与排序方式不匹配")
+    return value, listing_id
+
+def build_market_listings_query(
+    listing_type: str, exclude_owner: str = None, search_term: str = None,
+    nft_type: str = None, min_price: float = None, max_price: float = None,
+    sort: str = None, cursor: str = None, limit: int = MARKET_LISTINGS_DEFAULT_LIMIT
+) -> (str, list, str):
+    """
+    构建挂单列表查询 (psycopg2 的 %s 占位符)，同步与异步查询层共用。
+    多取一行用于判断是否还有下一页。返回 (查询, 参数, 实际排序方式)。参数无效时抛出 ValueError。
+    """
+    sort = resolve_listing_sort(sort, search_term)
+    sort_expr, direction, _ = MARKET_LISTING_SORTS[sort]
+    # relevance 的排序表达式包含搜索词占位符，每次出现都要追加一次参数
+    sort_params = [search_term] if sort == "relevance" else []
+
+    select_params = []
+    rank_column = ""
+    if sort == "relevance":
+        rank_column = f",\n            {sort_expr} as _search_rank"
+        select_params = list(sort_params)
+
+    query = f"""
+        SELECT 
+            l.listing_id, l.lister_key, l.listing_type, l.nft_id, l.nft_type,
+            l.description, l.price, 
+            EXTRACT(EPOCH FROM l.end_time) as end_time, 
+            l.status, l.highest_bidder,
+            l.highest_bid,
+            u.username as lister_username, 
+            u.uid as lister_uid, 
+            n.data as nft_data,
+            EXTRACT(EPOCH FROM l.created_at) as created_at,
+            {LISTING_CURRENT_PRICE_SQL} as _current_price,
+            l.created_at as _cursor_created_at{rank_column}
+        FROM market_listings l
+        JOIN users u ON l.lister_key = u.public_key
+        LEFT JOIN nfts n ON l.nft_id = n.nft_id
+        WHERE l.listing_type = %s AND l.status = 'ACTIVE'
+    """
+    params = select_params + [listing_type]
+    if exclude_owner:
+        query += " AND l.lister_key != %s"
+        params.append(exclude_owner)
+
+    if search_term:
+        # search_text 包含挂单描述、交易描述和 NFT 属性；
+        # 安装了 pg_trgm 时由部分 GIN 三元组索引加速 (ILIKE 不区分大小写)
+        query += " AND l.search_text ILIKE %s"
+        params.append(f"%{_escape_like(search_term)}%")
+
+    if nft_type:
+        query += " AND l.nft_type = %s"
+        params.append(nft_type)
+
+    if min_price is not None:
+        query += f" AND {LISTING_CURRENT_PRICE_SQL} >= %s"
+        params.append(min_price)
+
+    if max_price is not None:
+        query += f" AND {LISTING_CURRENT_PRICE_SQL} <= %s"
+        params.append(max_price)
+
+    if cursor:
+        cursor_value, cursor_id = decode_listing_cursor(cursor, sort)
+        # 行比较 (row comparison) 可以直接利用 (排序列, listing_id) 的复合索引
+        op = "<" if direction == "DESC" else ">"
+        query += f" AND ({sort_expr}, l.listing_id) {op} (%s, %s)"
+        params.extend(sort_params + [cursor_value, cursor_id])
+
+    limit = max(1, min(int(limit), MARKET_LISTINGS_MAX_LIMIT))
+    query += f" ORDER BY {sort_expr} {direction}, l.listing_id {direction} LIMIT %s"
+    params.extend(sort_params + [limit + 1])
+    return query, params, sort
+
+def paginate_market_listings(rows: list, sort: str, limit: int) -> dict:
+    """将多取一行的查询结果切分为当前页和下一页游标。"""
+    limit = max(1, min(int(limit), MARKET_LISTINGS_MAX_LIMIT))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_listing_cursor(sort, rows[-1]) if has_more else None
+    for row in rows:
+        row.pop('_cursor_created_at', None)
+        row.pop('_current_price', None)
+        row.pop('_search_rank', None)
+    return {"listings": rows, "next_cursor": next_cursor}
+
+def get_market_listings(
+    listing_type: str, exclude_owner: str = None, search_term: str = None,
+    nft_type: str = None, min_price: float = None, max_price: float = None,
+    sort: str = None, cursor: str = None, limit: int = MARKET_LISTINGS_DEFAULT_LIMIT
+) -> dict:
+    """获取市场上的挂单 (分页)。返回 {"listings": [...], "next_cursor": str 或 None}。"""
+    query, params, sort = build_market_listings_query(
+        listing_type, exclude_owner, search_term, nft_type,
+        min_price, max_price, sort, cursor, limit
+    )
     with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=DictCursor) as cursor:
-            query = """
-                SELECT 
-                    l.listing_id, l.lister_key, l.listing_type, l.nft_id, l.nft_type,
-                    l.description, l.price, 
-                    EXTRACT(EPOCH FROM l.end_time) as end_time, 
-                    l.status, l.highest_bidder,
-                    l.highest_bid,
-                    u.username as lister_username, 
-                    u.uid as lister_uid, 
-                    n.data as nft_data,
-                    EXTRACT(EPOCH FROM l.created_at) as created_at
-                FROM market_listings l
-                JOIN users u ON l.lister_key = u.public_key
-                LEFT JOIN nfts n ON l.nft_id = n.nft_id
-                WHERE l.listing_type = %s AND l.status = 'ACTIVE'
-            """
-            params = [listing_type]
-            if exclude_owner:
-                query += " AND l.lister_key != %s"
-                params.append(exclude_owner)
-                
-            if search_term:
-                query += " AND l.description LIKE %s"
-                params.append(f"%{search_term}%")
-            
-            query += " ORDER BY l.created_at DESC"
-            cursor.execute(query, params)
-            
-            results = []
-            for row in cursor.fetchall():
-                row_dict = dict(row)
-                if row_dict.get('nft_data'):
-                    try:
-                        row_dict['nft_data'] = json.loads(row_dict['nft_data'])
-                    except json.JSONDecodeError:
-                        row_dict['nft_data'] = None # 处理脏数据
-                
-                results.append(row_dict)
-            return results
+        with conn.cursor(cursor_factory=DictCursor) as db_cursor:
+            db_cursor.execute(query, params)
+            # nft_data 为 JSONB，无需在 Python 中解析
+            rows = [dict(row) for row in db_cursor.fetchall()]
+    return paginate_market_listings(rows, sort, limit)
 
 def get_listing_details(listing_id: str) -> dict:
     """获取单个挂单的详细信息。"""
@@ -504,15 +829,7 @@ def get_offers_for_listing(listing_id: str) -> list:
                 ORDER BY o.created_at DESC
             """
             cursor.execute(query, (listing_id,))
-            results = []
-            for row in cursor.fetchall():
-                row_dict = dict(row)
-                try:
-                    row_dict['nft_data'] = json.loads(row_dict['nft_data'])
-                except json.JSONDecodeError:
-                    row_dict['nft_data'] = None
-                results.append(row_dict)
-            return results
+            return [dict(row) for row in cursor.fetchall()]
 
 def get_bids_for_listing(listing_id: str) -> list:
     """获取一个拍卖挂单的所有出价历史。"""
@@ -42,23 +42,28 @@ def mint_nft(owner_key: str, nft_type: str, data: dict, conn=None) -> (bool, str
                 new_conn.rollback()
             return success, detail, nft_id
 
-def get_nft_by_id(nft_id: str) -> dict:
-    """根据 ID 获取单个 NFT 的详细信息。"""
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=DictCursor) as cursor:
+def get_nft_by_id(nft_id: str, conn=None, for_update: bool = False) -> dict:
+    """根据 ID 获取单个 NFT 的详细信息。传入 conn 时在该事务中读取，for_update 会锁定该行。"""
+    def run_logic(connection):
+        with connection.cursor(cursor_factory=DictCursor) as cursor:
             query = """
                 SELECT nft_id, owner_key, nft_type, data, status, 
                        EXTRACT(EPOCH FROM created_at) as created_at
                 FROM nfts 
                 WHERE nft_id = %s
             """
+            if for_update:
+                query += " FOR UPDATE"
             cursor.execute(query, (nft_id,))
             nft = cursor.fetchone()
             if not nft:
                 return None
-            nft_dict = dict(nft)
-            nft_dict['data'] = json.loads(nft_dict['data'])
-            return nft_dict
+            return dict(nft)
+
+    if conn:
+        return run_logic(conn)
+    with get_db_connection() as new_conn:
+        return run_logic(new_conn)
 
 def get_nfts_by_owner(owner_key: str) -> list:
     """获取指定所有者的所有 NFT。"""
@@ -72,12 +77,78 @@ def get_nfts_by_owner(owner_key: str) -> list:
                 ORDER BY created_at DESC
             """
             cursor.execute(query, (owner_key,))
-            nfts = []
-            for row in cursor.fetchall():
-                nft_dict = dict(row)
-                nft_dict['data'] = json.loads(nft_dict['data'])
-                nfts.append(nft_dict)
-            return nfts
+            return [dict(row) for row in cursor.fetchall()]
+
+# 可排序字段白名单: 名称 -> (排序表达式, 该表达式需要的过滤条件)
+# 过滤条件与 migrations.ensure_nft_data_indexes 中部分索引的 WHERE 保持一致，保证能命中表达式索引
+NFT_SEARCH_SORTS = {
+    "created_at": ("created_at", None),
+    "rarity_total": (
+        "(data#>>'{rarity_score,total}')::numeric",
+        "jsonb_typeof(data#>'{rarity_score,total}') = 'number'"
+    ),
+    "total_jph": (
+        "(data#>>'{economic_stats,total_jph}')::numeric",
+        "jsonb_typeof(data#>'{economic_stats,total_jph}') = 'number'"
+    ),
+}
+
+def search_nfts(
+    nft_type: str = None, owner_key: str = None, status: str = 'ACTIVE',
+    species_rarity: str = None, min_rarity_total: float = None, min_total_jph: float = None,
+    contains: dict = None, sort_by: str = "created_at", descending: bool = True,
+    limit: int = 50, offset: int = 0
+) -> list:
+    """
+    在数据库中按 NFT data 字段过滤和排序 (JSONB)。
+    contains 使用 data @> 包含查询 (命中 GIN 索引)，例如 {"species_name": "火龙"}。
+    sort_by 必须是 NFT_SEARCH_SORTS 中的键，否则抛出 ValueError。
+    """
+    if sort_by not in NFT_SEARCH_SORTS:
+        raise ValueError(f"不支持的排序字段: {sort_by}")
+    sort_expr, sort_guard = NFT_SEARCH_SORTS[sort_by]
+
+    conditions, params = [], []
+    if status:
+        conditions.append("status = %s")
+        params.append(status)
+    if nft_type:
+        conditions.append("nft_type = %s")
+        params.append(nft_type)
+    if owner_key:
+        conditions.append("owner_key = %s")
+        params.append(owner_key)
+    if species_rarity:
+        conditions.append("nft_type = 'BIO_DNA' AND data->>'species_rarity' = %s")
+        params.append(species_rarity)
+    if min_rarity_total is not None:
+        expr, guard = NFT_SEARCH_SORTS["rarity_total"]
+        conditions.append(f"{guard} AND {expr} >= %s")
+        params.append(min_rarity_total)
+    if min_total_jph is not None:
+        expr, guard = NFT_SEARCH_SORTS["total_jph"]
+        conditions.append(f"{guard} AND {expr} >= %s")
+        params.append(min_total_jph)
+    if contains:
+        conditions.append("data @> %s::jsonb")
+        params.append(json.dumps(contains, ensure_ascii=False))
+    if sort_guard:
+        conditions.append(sort_guard)
+
+    query = """
+        SELECT nft_id, owner_key, nft_type, data, status,
+               EXTRACT(EPOCH FROM created_at) as created_at
+        FROM nfts
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {sort_expr} {'DESC' if descending else 'ASC'}, nft_id LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
 
 def update_nft(nft_id: str, new_data: dict, new_status: str = None) -> (bool, str):
     """更新 NFT 的 data 或 status 字段。"""
@@ -2,7 +2,6 @@
 
 import psycopg2.errors
 from psycopg2.extras import DictCursor
-from werkzeug.security import generate_password_hash
 from backend.db.database import (
     get_db_connection, _create_system_transaction,
     GENESIS_ACCOUNT, BURN_ACCOUNT, init_db
@@ -18,8 +17,11 @@ def count_users() -> int:
             result = cursor.fetchone()
             return result[0] if result else 0
 
-def create_genesis_user(username: str, password: str) -> (bool, str, dict):
-    """创建第一个（创世）管理员用户。"""
+def create_genesis_user(username: str, password_hash: str, key_pair: tuple) -> (bool, str, dict):
+    """
+    创建第一个（创世）管理员用户。
+    password_hash 和 key_pair 由调用方在获取数据库连接之前准备好，事务中不做哈希和密钥运算。
+    """
     if count_users() > 0:
         return False, "系统已经初始化，无法创建创世用户。", {}
 
@@ -27,10 +29,7 @@ def create_genesis_user(username: str, password: str) -> (bool, str, dict):
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
                 
-                # Note: crypto_utils is not in db layer, so we import it here
-                from shared.crypto_utils import generate_key_pair
-                private_key, public_key = generate_key_pair()
-                password_hash = generate_password_hash(password)
+                private_key, public_key = key_pair
                 uid = "000"
                 inv_quota = 999999
 
@@ -120,6 +119,63 @@ def admin_burn_coins(from_key: str, amount: float, note: str = None) -> (bool, s
     if amount <= 0: return False, "销毁金额必须大于0"
     return _create_system_transaction(from_key, BURN_ACCOUNT, amount, note or "管理员减持")
 
+def reconcile_balances(limit: int = 100) -> dict:
+    """
+    (管理员功能) 对账: 一次扫描校验每个账户的 余额 == 流水净额 (转入合计 - 转出合计)。
+    GENESIS (铸币来源) 与 BURN (销毁去向) 不持有余额，不参与对账。
+    金额为 NUMERIC，比较是精确的，不需要容差。最多返回 limit 条不一致的账户。
+    """
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cursor:
+            cursor.execute(
+                """
+                WITH flows AS (
+                    SELECT to_key AS public_key, amount FROM transactions
+                    UNION ALL
+                    SELECT from_key AS public_key, -amount FROM transactions
+                ),
+                expected AS (
+                    SELECT public_key, SUM(amount) AS expected_balance FROM flows GROUP BY public_key
+                ),
+                joined AS (
+                    SELECT COALESCE(b.public_key, e.public_key) AS public_key,
+                           COALESCE(b.balance, 0) AS balance,
+                           COALESCE(e.expected_balance, 0) AS expected_balance
+                    FROM balances b
+                    FULL OUTER JOIN expected e ON b.public_key = e.public_key
+                    WHERE COALESCE(b.public_key, e.public_key) NOT IN (%s, %s)
+                )
+                SELECT public_key, balance, expected_balance,
+                       balance - expected_balance AS difference,
+                       COUNT(*) OVER () AS accounts_checked,
+                       COUNT(*) FILTER (WHERE balance <> expected_balance) OVER () AS mismatched_accounts,
+                       SUM(balance) OVER () AS total_balance,
+                       SUM(expected_balance) OVER () AS total_expected
+                FROM joined
+                ORDER BY (balance <> expected_balance) DESC, ABS(balance - expected_balance) DESC
+                LIMIT %s
+                """,
+                (GENESIS_ACCOUNT, BURN_ACCOUNT, limit)
+            )
+            rows = cursor.fetchall()
+
+    if not rows:
+        return {"accounts_checked": 0, "mismatched_accounts": 0, "total_balance": 0, "total_expected": 0, "mismatches": []}
+    first = rows[0]
+    return {
+        "accounts_checked": first['accounts_checked'],
+        "mismatched_accounts": first['mismatched_accounts'],
+        "total_balance": first['total_balance'],
+        "total_expected": first['total_expected'],
+        "mismatches": [
+            {
+                "public_key": row['public_key'], "balance": row['balance'],
+                "expected_balance": row['expected_balance'], "difference": row['difference']
+            }
+            for row in rows if row['difference'] != 0
+        ],
+    }
+
 def admin_set_user_active_status(public_key: str, is_active: bool) -> (bool, str):
     """(管理员功能) 启用或禁用一个用户。"""
     with get_db_connection() as conn:
@@ -194,12 +250,11 @@ def admin_adjust_user_quota(public_key: str, new_quota: int) -> (bool, str):
             conn.rollback()
             return False, f"更新额度失败: {e}"
 
-def admin_reset_user_password(public_key: str, new_password: str) -> (bool, str):
-    """(管理员功能) 重置用户的密码。"""
+def admin_reset_user_password(public_key: str, new_password_hash: str) -> (bool, str):
+    """(管理员功能) 重置用户的密码。new_password_hash 由调用方在获取数据库连接之前计算好。"""
     with get_db_connection() as conn:
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                new_password_hash = generate_password_hash(new_password)
                 cursor.execute(
                     "UPDATE users SET password_hash = %s WHERE public_key = %s",
                     (new_password_hash, public_key)
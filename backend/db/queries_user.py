@@ -4,11 +4,11 @@ import time
 import json
 import psycopg2.errors
 from typing import Optional, List
-from werkzeug.security import generate_password_hash, check_password_hash
-from shared.crypto_utils import verify_signature, generate_key_pair
+from shared.crypto_utils import verify_signature
+from backend.db import ledger, replay_guard, password_hashing
 from backend.db.database import (
     get_db_connection, _create_system_transaction,
-    _generate_uid, _generate_secure_password, get_setting,
+    _generate_uid, _generate_secure_password, get_settings_snapshot,
     create_notification,
     GENESIS_ACCOUNT, BURN_ACCOUNT, ESCROW_ACCOUNT, DEFAULT_INVITATION_QUOTA
 )
@@ -27,8 +27,13 @@ def get_balance(public_key: str) -> float:
 
 # --- 用户注册与认证 ---
 
-def register_user(username: str, password: str, invitation_code: str) -> (bool, str, dict):
-    """注册一个新用户，需要一次性邀请码。"""
+def register_user(username: str, password_hash: str, invitation_code: str, key_pair: tuple) -> (bool, str, dict):
+    """
+    注册一个新用户，需要一次性邀请码。
+    password_hash 和 key_pair 由调用方在获取数据库连接之前准备好 (见 routes_user)，事务中不做哈希和密钥运算。
+    """
+    # 在获取连接之前读取设置快照，避免在事务中再占用第二个连接
+    settings = get_settings_snapshot()
     with get_db_connection() as conn:
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
@@ -46,13 +51,12 @@ def register_user(username: str, password: str, invitation_code: str) -> (bool,
                 if not code_data:
                     return False, "无效的邀请码或邀请码已被使用", {}
                 
-                if (time.time() - code_data['created_at_unix']) > 86400 * 7: # 7 days validity
+                if (time.time() - float(code_data['created_at_unix'])) > 86400 * 7: # 7 days validity
                     return False, "邀请码已过期", {}
                     
                 inviter_key = code_data['generated_by']
                 
-                private_key, public_key = generate_key_pair()
-                password_hash = generate_password_hash(password)
+                private_key, public_key = key_pair
                 
                 while True:
                     uid = _generate_uid()
@@ -60,7 +64,7 @@ def register_user(username: str, password: str, invitation_code: str) -> (bool,
                     if not cursor.fetchone():
                         break
                 
-                default_quota_str = get_setting('default_invitation_quota')
+                default_quota_str = settings.get('default_invitation_quota')
                 default_quota = int(default_quota_str) if default_quota_str and default_quota_str.isdigit() else DEFAULT_INVITATION_QUOTA
                 
                 cursor.execute(
@@ -72,7 +76,7 @@ def register_user(username: str, password: str, invitation_code: str) -> (bool,
                 cursor.execute("INSERT INTO balances (public_key, balance) VALUES (%s, 0)", (public_key,))
                 
                 # 发放新用户奖励
-                welcome_bonus_str = get_setting('welcome_bonus_amount')
+                welcome_bonus_str = settings.get('welcome_bonus_amount')
                 if welcome_bonus_str:
                     try:
                         bonus_amount = float(welcome_bonus_str)
@@ -84,7 +88,7 @@ def register_user(username: str, password: str, invitation_code: str) -> (bool,
                     except (ValueError, TypeError): pass 
                 
                 # 发放邀请人奖励
-                inviter_bonus_str = get_setting('inviter_bonus_amount')
+                inviter_bonus_str = settings.get('inviter_bonus_amount')
                 if inviter_bonus_str:
                     try:
                         inviter_bonus_amount = float(inviter_bonus_str)
@@ -128,23 +132,24 @@ def authenticate_user(username_or_uid: str, password: str) -> (bool, str, dict):
             )
             user = cursor.fetchone()
 
-            if not user:
-                return False, "用户不存在", {}
-            
-            user_dict = dict(user)
+    if not user:
+        return False, "用户不存在", {}
 
-            if not user_dict['is_active']:
-                return False, "该账户已被禁用", {}
+    user_dict = dict(user)
 
-            if not check_password_hash(user_dict['password_hash'], password):
-                return False, "密码错误", {}
-                
-            return True, "登录成功", {
-                "public_key": user_dict['public_key'],
-                "private_key": user_dict['private_key_pem'],
-                "username": user_dict['username'],
-                "uid": user_dict['uid']
-            }
+    if not user_dict['is_active']:
+        return False, "该账户已被禁用", {}
+
+    # (连接已归还，再等待哈希结果)
+    if not password_hashing.verify_password(user_dict['password_hash'], password):
+        return False, "密码错误", {}
+
+    return True, "登录成功", {
+        "public_key": user_dict['public_key'],
+        "private_key": user_dict['private_key_pem'],
+        "username": user_dict['username'],
+        "uid": user_dict['uid']
+    }
 
 # --- 用户信息与资料 ---
 
@@ -191,6 +196,14 @@ def get_user_details(public_key: str, conn=None) -> dict:
         with get_db_connection() as new_conn:
             return run_logic(new_conn)
 
+def is_user_active(public_key: str) -> bool:
+    """用户是否存在且未被禁用。"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT is_active FROM users WHERE public_key = %s", (public_key,))
+            row = cursor.fetchone()
+            return bool(row and row[0])
+
 def get_all_active_users() -> list:
     """获取所有活跃的人类用户列表。"""
     with get_db_connection() as conn:
@@ -227,10 +240,7 @@ def get_user_profile(uid_or_username: str) -> dict:
                     FROM nfts WHERE nft_id IN ({placeholders}) AND owner_key = %s AND status = 'ACTIVE'
                 """
                 cursor.execute(query, displayed_nfts_ids + [profile_dict['public_key']])
-                for row in cursor.fetchall():
-                    nft_dict = dict(row)
-                    nft_dict['data'] = json.loads(nft_dict['data'])
-                    nfts_details.append(nft_dict)
+                nfts_details = [dict(row) for row in cursor.fetchall()]
             
             profile_dict['displayed_nfts_details'] = nfts_details
             return profile_dict
@@ -329,49 +339,37 @@ def process_transaction(
 
     if not verify_signature(from_key, message_json, signature): return False, "签名无效"
 
-    if (time.time() - message.get('timestamp', 0)) > 300: return False, "交易已过期"
+    accepted, reason = replay_guard.check_and_record(message_json, message.get('timestamp', 0))
+    if not accepted: return False, reason
 
     with get_db_connection() as conn:
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-            
-                cursor.execute("SELECT 1 FROM users WHERE public_key = %s AND is_active = TRUE", (to_key,))
-                if not cursor.fetchone(): return False, "收款方用户不存在或已被禁用"
-                    
-                # 锁定行以防止并发问题
-                cursor.execute("SELECT balance FROM balances WHERE public_key = %s FOR UPDATE", (from_key,))
-                from_balance = cursor.fetchone()
-                if not from_balance or from_balance['balance'] < amount: return False, "余额不足"
-                
-                new_from_balance = from_balance['balance'] - amount
-                cursor.execute("UPDATE balances SET balance = %s WHERE public_key = %s", (new_from_balance, from_key))
-                
-                cursor.execute("UPDATE balances SET balance = balance + %s WHERE public_key = %s", (amount, to_key))
-                
-                tx_id = str(uuid.uuid4())
-                cursor.execute(
-                    "INSERT INTO transactions (tx_id, from_key, to_key, amount, timestamp, message_json, signature, note) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                    (tx_id, from_key, to_key, amount, message['timestamp'], message_json, signature, note)
+                # 一次查询取回双方信息 (收款方校验 + 通知用的用户名)
+                cursor.execute("SELECT public_key, username, is_active FROM users WHERE public_key IN (%s, %s)", (from_key, to_key))
+                users = {row['public_key']: row for row in cursor.fetchall()}
+                if to_key not in users or not users[to_key]['is_active']: return False, "收款方用户不存在或已被禁用"
+
+            # 扣款 + 入账 + 流水 在一次服务端调用中完成
+            ledger.transfer(conn, from_key, to_key, amount, message_json, signature, note, message['timestamp'])
+
+            # 确保在通知创建失败时事务也能继续
+            if from_key in users:
+                create_notification(
+                    user_key=to_key,
+                    message=f"💰 你收到了来自 {users[from_key]['username']} 的 {amount:.2f} FC 转账。",
+                    conn=conn
                 )
-                
-                # 获取用户名以创建通知
-                cursor.execute("SELECT username FROM users WHERE public_key = %s", (to_key,))
-                to_username_row = cursor.fetchone()
-                cursor.execute("SELECT username FROM users WHERE public_key = %s", (from_key,))
-                from_username_row = cursor.fetchone()
-                
-                # 确保在通知创建失败时事务也能继续
-                if to_username_row and from_username_row:
-                    create_notification(
-                        user_key=to_key,
-                        message=f"💰 你收到了来自 {from_username_row['username']} 的 {amount:.2f} FC 转账。",
-                        conn=conn
-                    )
-            
+
             conn.commit()
             return True, "交易成功"
+        except ledger.InsufficientFundsError:
+            conn.rollback()
+            replay_guard.release(message_json, message['timestamp'])
+            return False, "余额不足"
         except Exception as e:
             conn.rollback()
+            replay_guard.release(message_json, message['timestamp'])
             return False, f"交易失败: {e}"
 
 # --- 邀请 ---
@@ -559,8 +557,7 @@ def _validate_nft_for_trade(cursor, nft_id: str, expected_owner: str) -> (bool,
         return False, "NFT不存在", None
     
     # nft_row 已经是字典 (或类字典对象)，因为传入的是 DictCursor
-    nft = dict(nft_row) 
-    nft['data'] = json.loads(nft['data']) # 提前解析data
+    nft = dict(nft_row) # data 为 JSONB，psycopg2 已自动解析为 dict
 
     if nft['status'] != 'ACTIVE':
         return False, "NFT不是活跃状态", nft
@@ -0,0 +1,180 @@
+# backend/db/replay_guard.py
+
+import os
+import time
+import hashlib
+import threading
+
+"""
+签名消息的防重放保护。
+- 已签名的消息在有效期内只能使用一次: 记录 message_json 的摘要，重复出现即视为重放；
+- 摘要按消息时间戳分桶 (REPLAY_BUCKET_SECONDS)，整桶过期后直接丢弃，检查与记录都是 O(1)；
+- 内存占用上限为 REPLAY_MAX_ENTRIES 条 (每条 16 字节摘要)，超出时拒绝新请求 (宁可拒绝也不放过重放)；
+- REPLAY_GUARD_BACKEND=database 时额外写入 used_message_digests 表，供多个 worker 进程共享
+  (内存中已有的摘要仍在本地直接拒绝，不访问数据库)；
+- 摘要在执行操作之前记录 (并发的重放在执行前就被拒绝)。操作随后失败或被回滚时 (例如单条接口返回失败、批量中失败的一项、整批回滚的原子批次)，
+  调用方用 release 撤销记录，客户端可以重新提交同一条签名消息。
+"""
+
+# 签名消息的有效期 (秒)，超过即视为过期
+REPLAY_WINDOW_SECONDS = int(os.getenv("REPLAY_WINDOW_SECONDS", "300"))
+# 允许客户端时钟超前的秒数；超前太多的时间戳会让消息的有效期超出摘要的保留时间
+REPLAY_MAX_CLOCK_SKEW_SECONDS = int(os.getenv("REPLAY_MAX_CLOCK_SKEW_SECONDS", "60"))
+REPLAY_BUCKET_SECONDS = int(os.getenv("REPLAY_BUCKET_SECONDS", "10"))
+REPLAY_MAX_ENTRIES = int(os.getenv("REPLAY_MAX_ENTRIES", "2000000"))
+REPLAY_GUARD_BACKEND = os.getenv("REPLAY_GUARD_BACKEND", "memory").lower() # memory / database
+
+_lock = threading.Lock()
+_buckets = {} # 桶序号 (timestamp // REPLAY_BUCKET_SECONDS) -> set(摘要)
+_entries = 0
+_last_sweep_bucket = None
+_stats = {"accepted": 0, "replayed": 0, "expired": 0, "rejected_full": 0, "released": 0, "database_errors": 0}
+
+
+def message_digest(message_json: str) -> bytes:
+    """消息摘要。重放必须提交完全相同的 message_json 才能通过验签，因此对原始字符串取摘要即可。"""
+    return hashlib.blake2b(message_json.encode('utf-8'), digest_size=16).digest()
+
+
+def _sweep_expired(now: float) -> bool:
+    """(需持有 _lock) 丢弃所有已过期的桶。返回本次是否进入了新的时间桶 (用于触发数据库清理)。"""
+    global _entries, _last_sweep_bucket
+    min_live_bucket = int((now - REPLAY_WINDOW_SECONDS) // REPLAY_BUCKET_SECONDS)
+    if min_live_bucket == _last_sweep_bucket:
+        return False
+    _last_sweep_bucket = min_live_bucket
+    # 桶的数量不超过 (有效期 + 时钟偏差) / 桶宽，遍历代价是常数
+    for bucket in [b for b in _buckets if b < min_live_bucket]:
+        _entries -= len(_buckets.pop(bucket))
+    return True
+
+
+def _record_in_database(digest: bytes, timestamp: float, cleanup: bool) -> bool:
+    """写入共享表。返回 False 表示其他进程已记录过该摘要。"""
+    from backend.db.database import get_db_connection # 避免循环导入
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                if cleanup:
+                    cursor.execute("DELETE FROM used_message_digests WHERE expires_at < CURRENT_TIMESTAMP")
+                cursor.execute(
+                    """
+                    INSERT INTO used_message_digests (digest, expires_at)
+                    VALUES (%s, to_timestamp(%s))
+                    ON CONFLICT (digest) DO NOTHING
+                    """,
+                    (digest, timestamp + REPLAY_WINDOW_SECONDS)
+                )
+                inserted = cursor.rowcount == 1
+            conn.commit()
+            return inserted
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def check_and_record(message_json: str, timestamp: float) -> (bool, str):
+    """
+    检查签名消息是否过期或已被使用过，未使用过则记录下来。
+    应在验签通过之后调用 (否则伪造的消息也会占用内存)。
+    """
+    global _entries
+    now = time.time()
+    if now - timestamp > REPLAY_WINDOW_SECONDS:
+        with _lock:
+            _stats["expired"] += 1
+        return False, "请求已过期"
+    if timestamp - now > REPLAY_MAX_CLOCK_SKEW_SECONDS:
+        with _lock:
+            _stats["expired"] += 1
+        return False, "请求时间戳无效 (超前于服务器时间)"
+
+    digest = message_digest(message_json)
+    bucket = int(timestamp // REPLAY_BUCKET_SECONDS)
+
+    with _lock:
+        new_bucket = _sweep_expired(now)
+        seen = _buckets.get(bucket)
+        if seen is not None and digest in seen:
+            _stats["replayed"] += 1
+            return False, "重复的请求 (该签名消息已被使用)"
+        if _entries >= REPLAY_MAX_ENTRIES:
+            _stats["rejected_full"] += 1
+            return False, "服务器繁忙，请稍后重试"
+        if seen is None:
+            seen = _buckets[bucket] = set()
+        seen.add(digest)
+        _entries += 1
+
+    if REPLAY_GUARD_BACKEND == "database":
+        try:
+            inserted = _record_in_database(digest, timestamp, cleanup=new_bucket)
+        except Exception as e:
+            with _lock:
+                _stats["database_errors"] += 1
+                # 未成功记录，撤销本地记录以便客户端重试同一消息
+                if bucket in _buckets and digest in _buckets[bucket]:
+                    _buckets[bucket].discard(digest)
+                    _entries -= 1
+            print(f"⚠️ 警告: 防重放记录写入数据库失败: {e}")
+            return False, "服务器繁忙，请稍后重试"
+        if not inserted:
+            with _lock:
+                _stats["replayed"] += 1
+            return False, "重复的请求 (该签名消息已被使用)"
+
+    with _lock:
+        _stats["accepted"] += 1
+    return True, "OK"
+
+
+def release(message_json: str, timestamp: float):
+    """
+    撤销 check_and_record 的记录 (该消息对应的操作已回滚，没有产生任何效果)。
+    只能用于本次请求自己记录的消息；因重放而被拒绝的消息不能撤销 (其摘要属于之前成功的那次使用)。
+    """
+    global _entries
+    digest = message_digest(message_json)
+    bucket = int(timestamp // REPLAY_BUCKET_SECONDS)
+    with _lock:
+        seen = _buckets.get(bucket)
+        if seen is not None and digest in seen:
+            seen.discard(digest)
+            _entries -= 1
+        _stats["released"] += 1
+
+    if REPLAY_GUARD_BACKEND == "database":
+        from backend.db.database import get_db_connection # 避免循环导入
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM used_message_digests WHERE digest = %s", (digest,))
+                conn.commit()
+        except Exception as e:
+            # 记录仍在: 客户端需要重新签名，不影响安全性
+            with _lock:
+                _stats["database_errors"] += 1
+            print(f"⚠️ 警告: 撤销防重放记录失败: {e}")
+
+
+def get_replay_guard_stats() -> dict:
+    with _lock:
+        return {
+            "backend": REPLAY_GUARD_BACKEND,
+            "window_seconds": REPLAY_WINDOW_SECONDS,
+            "entries": _entries,
+            "max_entries": REPLAY_MAX_ENTRIES,
+            "buckets": len(_buckets),
+            **_stats,
+        }
+
+
+def reset():
+    """清空内存中的记录 (用于压测或测试)。"""
+    global _entries, _last_sweep_bucket
+    with _lock:
+        _buckets.clear()
+        _entries = 0
+        _last_sweep_bucket = None
+        for key in _stats:
+            _stats[key] = 0
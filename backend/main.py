@@ -4,6 +4,7 @@ from fastapi import FastAPI
 import asyncio
 import uvicorn
 from backend.db import database
+from backend.db.aio import database as aio_database
 # 导入所有 API 路由模块 (让它们先被加载和注册)
 from backend.api import routes_system
 from backend.api import routes_user
@@ -12,8 +13,10 @@ from backend.api import routes_nft
 from backend.api import routes_market
 from backend.api import routes_admin
 from backend.api import routes_notifications
+from backend.api import routes_batch
 
 from backend.bots import bot_runner
+from backend.workers import auction_settlement, auction_scheduler, key_pool, bot_log_writer, log_maintenance
 import threading
 
 
@@ -39,18 +42,47 @@ async def on_startup():
         # 2. 然后，使用该连接池初始化表
         print("正在启动 API ... 初始化数据库表...")
         database.init_db() # (原为 init_db())
-        print("--- 正在启动后台机器人调度器... ---")
-        # 将 bot_runner.run_bot_loop 放入一个单独的线程
-        # daemon=True 确保当主程序(FastAPI)退出时，该线程也会自动退出
-        bot_thread = threading.Thread(target=bot_runner.run_bot_loop, daemon=True)
-        bot_thread.start()
-        print("--- 机器人调度器已在后台线程启动。 ---")
+
+        # 3. 初始化异步连接池 (供 async def 的只读路由使用)
+        await aio_database.init_async_pool()
+
+        # 4. 拍卖到期调度器 + 兜底结算 worker (独立于机器人系统开关，始终运行)
+        auction_scheduler.start_auction_scheduler()
+        auction_settlement.start_settlement_worker()
+
+        # 5. 预生成密钥对 (注册和创建机器人时直接取用)
+        key_pool.start_key_pool_worker()
+
+        # 6. 机器人日志批量写入线程
+        bot_log_writer.start_bot_log_writer()
+
+        # 7. 日志表维护 (新建分区 / 小时汇总 / 删除过期分区)
+        log_maintenance.start_log_maintenance_worker()
+
+        if bot_runner.BOT_RUNNER_MODE == "external":
+            # 机器人由独立的分片运行器 (python -m backend.bots.shard_runner) 运行
+            print("--- 机器人运行模式为 external，API 进程不启动机器人调度器。 ---")
+        else:
+            print("--- 正在启动后台机器人调度器... ---")
+            # 将 bot_runner.run_bot_loop 放入一个单独的线程
+            # daemon=True 确保当主程序(FastAPI)退出时，该线程也会自动退出
+            bot_thread = threading.Thread(target=bot_runner.run_bot_loop, daemon=True)
+            bot_thread.start()
+            print("--- 机器人调度器已在后台线程启动。 ---")
     except Exception as e:
         print(f"!!!!!!!!!!!!!! 严重错误：数据库启动失败 !!!!!!!!!!!!!!")
         print(f"错误: {e}")
         # 重新引发错误，以防止 Uvicorn 错误地报告 "Application startup complete"
         raise
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    应用关闭时写完缓冲的机器人日志，并释放异步连接池。
+    """
+    bot_log_writer.stop_bot_log_writer()
+    await aio_database.close_async_pool()
+
 # --- 包含所有解耦的路由 ---
 
 # 1. 系统路由 (/, /status, /genesis_register)
@@ -74,6 +106,9 @@ app.include_router(routes_admin.router, prefix="/admin", tags=["Admin"])
 # 7. 通知路由 (/notifications/...)
 app.include_router(routes_notifications.router, tags=["Notifications"])
 
+# 8. 批量签名操作路由 (/batch)
+app.include_router(routes_batch.router, tags=["Batch"])
+
 # --- 启动 (用于本地调试) ---
 if __name__ == "__main__":
     print("--- 警告：正在以调试模式启动 (非 Docker) ---")
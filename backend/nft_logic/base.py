@@ -2,6 +2,31 @@
 
 from abc import ABC, abstractmethod
 import time
+import numpy as np
+
+
+# --- 批量估值的字段转换 ---
+# 逐个估值时只有 int / float / bool 能参与算术运算，None、数字字符串等会让估值失败并返回回退值；
+# 批量估值必须按同样的规则把这些 NFT 标记为无效，不能让 np.array(..., dtype=float) 把它们转换成 nan 或数字。
+
+def numeric_array(values: list) -> np.ndarray:
+    """把一列字段值转换为 float 数组；存在非数值类型时抛出 TypeError (调用方回退到逐个提取)。"""
+    array = np.array(values)
+    if array.dtype.kind not in 'biuf':
+        raise TypeError(f"字段包含非数值类型 ({array.dtype})")
+    return array.astype(float)
+
+def as_number(value) -> float:
+    """逐个提取时转换单个字段值，规则与 numeric_array 相同。"""
+    if not isinstance(value, (int, float)):
+        raise TypeError(f"非数值字段: {value!r}")
+    return float(value)
+
+def at_least(floor: float, values: np.ndarray) -> np.ndarray:
+    """与逐个估值的 max(floor, value) 相同: nan 不大于 floor，结果为 floor (np.maximum 会保留 nan)。"""
+    return np.where(values > floor, values, floor)
+
+
 class NFTLogicHandler(ABC):
     """
     所有 NFT 逻辑插件的抽象基类。
@@ -130,4 +155,16 @@ class NFTLogicHandler(ABC):
             ret_str+= "名称："+str(data['name'])+';'
         if 'description' in data:
             ret_str+= '描述：'+str(data['description'])+';'
-        return ret_str
\ No newline at end of file
+        return ret_str
+
+    # <<< 市场搜索关键词接口 >>>
+    def get_search_keywords(self, nft: dict) -> list:
+        """
+        (可选实现) 返回该NFT可被市场搜索命中的关键词 (例如名称、物种、特质)。
+        挂单创建时，这些关键词会与挂单描述、交易描述一起写入 market_listings.search_text。
+        注意：不要返回任何私密字段。
+        :param nft: 从数据库中获取的完整 NFT 对象。
+        :return: 字符串列表。
+        """
+        data = nft.get('data', {})
+        return [str(data[key]) for key in ('name', 'description') if data.get(key)]
\ No newline at end of file
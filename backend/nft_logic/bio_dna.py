@@ -5,9 +5,10 @@ import time
 import uuid
 import math
 import json  # <<<  Bug 2 修复：导入 json 模块
+import numpy as np
 
 from backend.db import queries_nft # 用于繁育时铸造新NFT和更新伴侣
-from .base import NFTLogicHandler
+from .base import NFTLogicHandler, numeric_array, as_number, at_least
 # --- 灵宠世界观与经济设定 ---
 
 # 1. 物种
@@ -227,10 +228,66 @@ class BioDnaHandler(NFTLogicHandler):
                 return max(1.0, round(value, 2))
             except Exception:
                 return 1.0 # 估值失败
+
+        def extract_fields(nft_datas: list) -> dict:
+            """
+            把估值用到的字段提取为 NumPy 数组:
+            {"rarity_mult", "level", "jph", "breeds_left", "has_aura", "invalid"}。
+            invalid 为数据不完整或字段不是数值 (逐个估值会失败，例如未知稀有度) 的灵宠下标。
+            """
+            rarity_mults = PET_ECONOMICS['VALUE_RARITY_MULT']
+            try:
+                return {
+                    "rarity_mult": np.array([rarity_mults[d.get('species_rarity', 'COMMON')] for d in nft_datas], dtype=float),
+                    "level": numeric_array([d.get('level', 1) for d in nft_datas]),
+                    "jph": numeric_array([d.get('economic_stats', {}).get('total_jph', 0) for d in nft_datas]),
+                    "breeds_left": numeric_array([d.get('breeding_limit', 0) - d.get('breeding_count', 0) for d in nft_datas]),
+                    "has_aura": np.array([d.get('visible_traits', {}).get('aura', 'None') != 'None' for d in nft_datas], dtype=bool),
+                    "invalid": [],
+                }
+            except Exception:
+                pass
+            # 存在数据不完整的灵宠: 逐个提取并记录下标
+            rows, invalid = [], []
+            for i, d in enumerate(nft_datas):
+                try:
+                    rows.append((
+                        rarity_mults[d.get('species_rarity', 'COMMON')],
+                        as_number(d.get('level', 1)),
+                        as_number(d.get('economic_stats', {}).get('total_jph', 0)),
+                        as_number(d.get('breeding_limit', 0) - d.get('breeding_count', 0)),
+                        d.get('visible_traits', {}).get('aura', 'None') != 'None'
+                    ))
+                except Exception:
+                    rows.append((0.0, 0.0, 0.0, 0.0, False))
+                    invalid.append(i)
+            rarity_mult, level, jph, breeds_left, has_aura = np.array(rows, dtype=float).reshape(-1, 5).T
+            return {
+                "rarity_mult": rarity_mult, "level": level, "jph": jph,
+                "breeds_left": breeds_left, "has_aura": has_aura.astype(bool), "invalid": invalid,
+            }
+
+        def calculate_values_from_fields(fields: dict) -> np.ndarray:
+            """对 extract_fields 的结果一次向量化计算全部估值 (公式与 calculate_value 相同)。"""
+            values = (PET_ECONOMICS['VALUE_BASE']
+                      + fields["rarity_mult"] * PET_ECONOMICS['VALUE_PER_LEVEL'] * fields["level"]
+                      + fields["jph"] * PET_ECONOMICS['VALUE_PER_JPH_FACTOR']
+                      + np.maximum(0, fields["breeds_left"]) * PET_ECONOMICS['VALUE_PER_BREED_REMAINING']
+                      + np.where(fields["has_aura"], PET_ECONOMICS['VALUE_GENE_AURA_BONUS'], 0.0))
+            values = at_least(1.0, np.round(values, 2))
+            values[fields["invalid"]] = 1.0
+            return values
+
+        def calculate_values(nft_datas: list) -> np.ndarray:
+            """批量估值，结果与逐个调用 calculate_value 相同 (数据不完整的灵宠同样为 1.0)。"""
+            return calculate_values_from_fields(extract_fields(nft_datas))
         
         return {
             "config": PET_ECONOMICS,
-            "calculate_value_func": calculate_value
+            "calculate_value_func": calculate_value,
+            "calculate_values_func": calculate_values,
+            "extract_fields_func": extract_fields,
+            "calculate_values_from_fields_func": calculate_values_from_fields
         }
 
     # --- 核心框架实现 ---
@@ -404,7 +461,7 @@ class BioDnaHandler(NFTLogicHandler):
             if not partner_row: return False, "选择的伴侣NFT不存在或不属于你", {}
             if partner_row['status'] != 'ACTIVE': return False, "伴侣NFT不是活跃状态", {}
             
-            partner_data = json.loads(partner_row['data'])
+            partner_data = partner_row['data'] # JSONB 已由 psycopg2 解析为 dict
             
             if partner_data.get('species_name') != updated_data.get('species_name'):
                 return False, "繁育失败：必须是相同物种的灵宠", {}
@@ -524,6 +581,16 @@ class BioDnaHandler(NFTLogicHandler):
         
         jph_str = f" | {jph:.2f} JPH" if jph > 0 else ""
         return f"等级 {level} {name} ({species}) [稀有度: {rarity}]{jph_str}"
+
+    def get_search_keywords(self, nft: dict) -> list:
+        """市场搜索关键词: 昵称、物种、稀有度、产出资源、性格和显性性状"""
+        data = nft.get('data', {})
+        keywords = [
+            data.get('nickname'), data.get('species_name'), data.get('species_rarity'),
+            data.get('afk_resource'), data.get('personality')
+        ]
+        keywords.extend(v for v in data.get('visible_traits', {}).values() if v != "None")
+        return [str(k) for k in keywords if k]
         
     @classmethod
     def get_admin_mint_config(cls) -> dict:
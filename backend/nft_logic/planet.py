@@ -4,7 +4,8 @@ import random
 import time
 import uuid
 import math
-from .base import NFTLogicHandler
+import numpy as np
+from .base import NFTLogicHandler, numeric_array, as_number, at_least
 
 
 # --- V3 经济与平衡性配置 ---
@@ -357,10 +358,51 @@ class PlanetHandler(NFTLogicHandler):
                 return max(0.01, round(value, 2))
             except Exception:
                 return 0.01 # 估值失败
+
+        def extract_fields(nft_datas: list) -> dict:
+            """
+            把估值用到的字段提取为 NumPy 数组: {"rarity", "jph", "invalid"}。
+            invalid 为数据不完整或字段不是数值 (逐个估值会失败) 的星球下标。
+            """
+            try:
+                return {
+                    "rarity": numeric_array([d.get('rarity_score', {}).get('total', 0) for d in nft_datas]),
+                    "jph": numeric_array([d.get('economic_stats', {}).get('total_jph', 0) for d in nft_datas]),
+                    "invalid": [],
+                }
+            except Exception:
+                pass
+            # 存在数据不完整的星球: 逐个提取并记录下标
+            rarity, jph, invalid = [], [], []
+            for i, d in enumerate(nft_datas):
+                try:
+                    fields = (as_number(d.get('rarity_score', {}).get('total', 0)), as_number(d.get('economic_stats', {}).get('total_jph', 0)))
+                except Exception:
+                    fields = (0.0, 0.0)
+                    invalid.append(i)
+                rarity.append(fields[0])
+                jph.append(fields[1])
+            return {"rarity": np.array(rarity), "jph": np.array(jph), "invalid": invalid}
+
+        def calculate_values_from_fields(fields: dict) -> np.ndarray:
+            """对 extract_fields 的结果一次向量化计算全部估值 (公式与 calculate_value 相同)。"""
+            values = (PLANET_ECONOMICS['VALUE_BASE_FLAT']
+                      + fields["rarity"] * PLANET_ECONOMICS['VALUE_RARITY_FACTOR']
+                      + fields["jph"] * PLANET_ECONOMICS['VALUE_JPH_FACTOR'])
+            values = at_least(0.01, np.round(values, 2))
+            values[fields["invalid"]] = 0.01
+            return values
+
+        def calculate_values(nft_datas: list) -> np.ndarray:
+            """批量估值，结果与逐个调用 calculate_value 相同 (数据不完整的星球同样为 0.01)。"""
+            return calculate_values_from_fields(extract_fields(nft_datas))
         
         return {
             "config": PLANET_ECONOMICS,
-            "calculate_value_func": calculate_value
+            "calculate_value_func": calculate_value,
+            "calculate_values_func": calculate_values,
+            "extract_fields_func": extract_fields,
+            "calculate_values_from_fields_func": calculate_values_from_fields
         }
 
     # --- 框架核心实现 ---
@@ -544,6 +586,19 @@ class PlanetHandler(NFTLogicHandler):
         
         jph_str = f" | 💰 {jph:.2f} JPH" if jph > 0 else ""
         return f"行星: {name} [稀有度: {rarity}]{jph_str}"
+
+    def get_search_keywords(self, nft: dict) -> list:
+        """市场搜索关键词: 名称、星球类型、恒星类型、轨道区域和已揭示的特质"""
+        data = nft.get('data', {})
+        keywords = [
+            data.get('custom_name'), data.get('planet_type'),
+            data.get('stellar_class'), data.get('orbital_zone')
+        ]
+        for trait_id in data.get('unlocked_traits', []):
+            trait = TRAIT_DEFINITIONS.get(trait_id)
+            if trait:
+                keywords.append(trait[0])
+        return [str(k) for k in keywords if k]
         
     @classmethod
     def get_admin_mint_config(cls) -> dict:
@@ -155,6 +155,11 @@ class SecretWishHandler(NFTLogicHandler):
         except Exception as e:
             # 如果出现任何错误，返回一个安全的默认值
             return f"{data.get('description', '一个神秘的愿望')} (来自 {data.get('creator_username', '未知')})"
+
+    def get_search_keywords(self, nft: dict) -> list:
+        """市场搜索关键词: 只包含公开描述和创建者，绝不包含秘密内容"""
+        data = nft.get('data', {})
+        return [str(data[key]) for key in ('description', 'creator_username') if data.get(key)]
     @classmethod
     def get_admin_mint_config(cls) -> dict:
         """为管理员铸造表单提供帮助信息和默认数据。"""
@@ -0,0 +1,2 @@
+# backend/workers/__init__.py
+# 独立于机器人系统的后台任务 (例如拍卖结算)，由 main.py 在启动时以守护线程运行。
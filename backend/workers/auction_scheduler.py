@@ -0,0 +1,222 @@
+# backend/workers/auction_scheduler.py
+
+import os
+import json
+import time
+import heapq
+import select
+import threading
+
+import psycopg2
+
+from backend.db import queries_market
+from backend.db.database import DATABASE_URL
+
+"""
+拍卖到期调度器。
+- 进程内按 end_time 排序的最小堆，启动时从 market_listings 加载，创建/取消拍卖时更新；
+- 调度线程睡到最近一场拍卖到期再醒来，只结算到期的那几场 (按 ID 认领，不扫描整表)；
+- 取消采用惰性删除: 只从索引字典中移除，堆顶弹出时再丢弃；
+- 只有启动了调度线程的进程 (API 进程) 维护堆；其他进程 (例如 BOT_CLIENT_MODE=local 的机器人分片) 中
+  schedule_auction / unschedule_auction 不做任何事，新建 / 取消的拍卖通过 NOTIFY 发给 API 进程，
+  由监听线程登记 (见 queries_market.after_listing_created)；监听连接断开后重新加载全部进行中的拍卖；
+- 调度失败或通知丢失的拍卖由 workers.auction_settlement 的定时兜底扫描处理。
+"""
+
+# DB 认为尚未到期 (时钟偏差) 或被其他进程锁定时的重试间隔 (秒) 与次数
+AUCTION_SCHEDULER_RETRY_DELAY_SECONDS = float(os.getenv("AUCTION_SCHEDULER_RETRY_DELAY_SECONDS", "0.5"))
+AUCTION_SCHEDULER_MAX_RETRIES = int(os.getenv("AUCTION_SCHEDULER_MAX_RETRIES", "5"))
+# 监听连接断开后的重连间隔 (秒)
+AUCTION_SCHEDULER_LISTEN_RETRY_SECONDS = float(os.getenv("AUCTION_SCHEDULER_LISTEN_RETRY_SECONDS", "5"))
+
+_cv = threading.Condition()
+_heap = []       # [(触发时间戳, listing_id)]
+_scheduled = {}  # listing_id -> 当前有效的触发时间戳 (与堆中记录不一致的条目视为已失效)
+_retries = {}    # listing_id -> 已重试次数
+
+_stats = {
+    "fired": 0,
+    "settled": 0,
+    "failed": 0,
+    "dropped": 0,
+    "last_fire_delay_seconds": 0.0,
+    "max_fire_delay_seconds": 0.0,
+    "notified": 0,
+}
+
+_running = False
+_scheduler_thread = None
+_listener_thread = None
+
+
+def is_running() -> bool:
+    """本进程是否运行着调度器 (start_auction_scheduler 已调用)。"""
+    return _running
+
+
+def schedule_auction(listing_id: str, end_time: float):
+    """登记 (或更新) 一场拍卖的到期时间。本进程没有运行调度器时不做任何事。"""
+    if not _running:
+        return
+    with _cv:
+        _scheduled[listing_id] = end_time
+        heapq.heappush(_heap, (end_time, listing_id))
+        # 新条目成为堆顶时唤醒调度线程，重新计算睡眠时间
+        if _heap[0][1] == listing_id:
+            _cv.notify()
+
+
+def unschedule_auction(listing_id: str):
+    """取消一场拍卖的调度 (惰性删除)。本进程没有运行调度器时不做任何事。"""
+    if not _running:
+        return
+    with _cv:
+        _scheduled.pop(listing_id, None)
+        _retries.pop(listing_id, None)
+
+
+def load_active_auctions() -> int:
+    """从数据库加载所有进行中的拍卖，返回加载数量。"""
+    auctions = queries_market.get_active_auction_end_times()
+    with _cv:
+        for listing_id, end_time in auctions:
+            _scheduled[listing_id] = end_time
+            _heap.append((end_time, listing_id))
+        heapq.heapify(_heap)
+        _cv.notify()
+    return len(auctions)
+
+
+def _pop_due_locked(now: float) -> list:
+    """(需持有 _cv) 弹出所有已到期且仍有效的拍卖 ID。"""
+    due = []
+    while _heap and _heap[0][0] <= now:
+        end_time, listing_id = heapq.heappop(_heap)
+        if _scheduled.get(listing_id) != end_time:
+            continue # 已取消或已重新调度
+        del _scheduled[listing_id]
+        due.append((listing_id, end_time))
+    return due
+
+
+def _wait_for_due() -> list:
+    with _cv:
+        while True:
+            # 丢弃堆顶的失效条目，避免按已取消的拍卖计算睡眠时间
+            while _heap and _scheduled.get(_heap[0][1]) != _heap[0][0]:
+                heapq.heappop(_heap)
+            if not _heap:
+                _cv.wait()
+                continue
+            delay = _heap[0][0] - time.time()
+            if delay > 0:
+                _cv.wait(timeout=delay)
+                continue
+            return _pop_due_locked(time.time())
+
+
+def _fire(due: list):
+    fired_at = time.time()
+    result = queries_market.settle_auctions_by_ids([listing_id for listing_id, _ in due])
+    claimed = set(result["claimed_ids"])
+
+    with _cv:
+        _stats["fired"] += len(due)
+        _stats["settled"] += result["settled"]
+        _stats["failed"] += len(result["failed"])
+        if due:
+            delay = fired_at - min(end_time for _, end_time in due)
+            _stats["last_fire_delay_seconds"] = delay
+            _stats["max_fire_delay_seconds"] = max(_stats["max_fire_delay_seconds"], delay)
+
+        for listing_id, end_time in due:
+            if listing_id in claimed:
+                _retries.pop(listing_id, None)
+                continue
+            # 未认领: 已被取消/成交，或 DB 时钟尚未到期，或被其他进程锁定。短暂延迟后重试，超过次数交给兜底扫描
+            attempts = _retries.get(listing_id, 0) + 1
+            if attempts > AUCTION_SCHEDULER_MAX_RETRIES:
+                _retries.pop(listing_id, None)
+                _stats["dropped"] += 1
+                continue
+            _retries[listing_id] = attempts
+            retry_at = time.time() + AUCTION_SCHEDULER_RETRY_DELAY_SECONDS
+            _scheduled[listing_id] = retry_at
+            heapq.heappush(_heap, (retry_at, listing_id))
+
+    if result["settled"] or result["failed"]:
+        print(f"--- 拍卖调度器：到期结算成功 {result['settled']} 场，失败 {len(result['failed'])} 场。 ---")
+
+
+def run_scheduler_loop():
+    """(后台线程) 在拍卖到期时触发结算。"""
+    print("--- 拍卖调度器已启动 ---")
+    while True:
+        try:
+            due = _wait_for_due()
+            if due:
+                _fire(due)
+        except Exception as e:
+            print(f"❌ 拍卖调度器出错: {e}")
+            time.sleep(1)
+
+
+def _handle_notification(payload: str):
+    data = json.loads(payload)
+    if data.get("end_time") is None:
+        unschedule_auction(data["listing_id"])
+    else:
+        schedule_auction(data["listing_id"], float(data["end_time"]))
+    with _cv:
+        _stats["notified"] += 1
+
+
+def run_listener_loop():
+    """(后台线程) 监听其他进程发来的拍卖调度通知。每次 (重新) 开始监听后加载全部进行中的拍卖，补上断线期间丢失的通知。"""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {queries_market.AUCTION_SCHEDULE_CHANNEL}")
+            loaded = load_active_auctions()
+            print(f"--- 拍卖调度器：已加载 {loaded} 场进行中的拍卖，开始监听调度通知。 ---")
+            while True:
+                select.select([conn], [], [])
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        _handle_notification(notify.payload)
+                    except Exception as e:
+                        print(f"❌ 拍卖调度通知无效: {notify.payload}: {e}")
+        except Exception as e:
+            print(f"❌ 拍卖调度器监听出错: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(AUCTION_SCHEDULER_LISTEN_RETRY_SECONDS)
+
+
+def start_auction_scheduler() -> threading.Thread:
+    """启动调度线程和通知监听线程 (监听线程负责加载进行中的拍卖；重复调用不会启动多个线程)。"""
+    global _running, _scheduler_thread, _listener_thread
+    if _scheduler_thread and _scheduler_thread.is_alive():
+        return _scheduler_thread
+    _running = True
+    _scheduler_thread = threading.Thread(target=run_scheduler_loop, daemon=True, name="auction-scheduler")
+    _scheduler_thread.start()
+    _listener_thread = threading.Thread(target=run_listener_loop, daemon=True, name="auction-scheduler-listener")
+    _listener_thread.start()
+    return _scheduler_thread
+
+
+def get_scheduler_stats() -> dict:
+    with _cv:
+        stats = dict(_stats)
+        stats["pending"] = len(_scheduled)
+        stats["next_due_in_seconds"] = (min(_scheduled.values()) - time.time()) if _scheduled else None
+    stats["alive"] = bool(_scheduler_thread and _scheduler_thread.is_alive())
+    stats["listener_alive"] = bool(_listener_thread and _listener_thread.is_alive())
+    return stats
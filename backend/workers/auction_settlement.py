@@ -0,0 +1,139 @@
+# backend/workers/auction_settlement.py
+
+import os
+import time
+import threading
+from collections import deque
+
+from backend.db import queries_market
+from backend.workers import auction_scheduler
+
+"""
+拍卖结算 worker (兜底扫描)。
+- 到期拍卖通常由 workers.auction_scheduler 在 end_time 准时结算，本 worker 负责
+  调度器漏掉的部分 (其他进程创建的拍卖、调度结算失败的拍卖等)，因此默认间隔较长；
+- 独立于 bot_system_enabled 运行，机器人系统关闭时拍卖也会按时结算；
+- 每轮认领最多 AUCTION_SETTLEMENT_BATCH_SIZE 场已到期拍卖 (FOR UPDATE SKIP LOCKED)，
+  一批认领满时立即继续下一批，直到积压清空后再休眠；
+- 结算失败的拍卖在 AUCTION_SETTLEMENT_RETRY_SECONDS 内不再认领，避免坏数据堵住队头。
+"""
+
+AUCTION_SETTLEMENT_INTERVAL_SECONDS = float(os.getenv("AUCTION_SETTLEMENT_INTERVAL_SECONDS", "60"))
+AUCTION_SETTLEMENT_BATCH_SIZE = int(os.getenv("AUCTION_SETTLEMENT_BATCH_SIZE", "50"))
+AUCTION_SETTLEMENT_RETRY_SECONDS = float(os.getenv("AUCTION_SETTLEMENT_RETRY_SECONDS", "300"))
+
+# 吞吐量统计窗口 (秒)
+_THROUGHPUT_WINDOW_SECONDS = 300
+
+_stats_lock = threading.Lock()
+_stats = {
+    "batches": 0,
+    "total_settled": 0,
+    "total_failed": 0,
+    "last_batch_at": None,
+    "last_batch_claimed": 0,
+    "last_batch_duration_ms": 0.0,
+    "last_lag_seconds": 0.0,
+    "max_lag_seconds": 0.0,
+}
+_lag_sum = 0.0
+_recent_batches = deque() # (完成时间, 成功结算数)
+_failed_until = {} # listing_id -> 下次允许重试的时间
+
+_worker_thread = None
+
+
+def _record_batch(result: dict, duration: float):
+    global _lag_sum
+    now = time.time()
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["total_settled"] += result["settled"]
+        _stats["total_failed"] += len(result["failed"])
+        _stats["last_batch_at"] = now
+        _stats["last_batch_claimed"] = result["claimed"]
+        _stats["last_batch_duration_ms"] = duration * 1000
+        if result["lags"]:
+            _stats["last_lag_seconds"] = max(result["lags"])
+            _stats["max_lag_seconds"] = max(_stats["max_lag_seconds"], _stats["last_lag_seconds"])
+            _lag_sum += sum(result["lags"])
+
+        _recent_batches.append((now, result["settled"]))
+        while _recent_batches and _recent_batches[0][0] < now - _THROUGHPUT_WINDOW_SECONDS:
+            _recent_batches.popleft()
+
+        for listing_id in result["failed"]:
+            _failed_until[listing_id] = now + AUCTION_SETTLEMENT_RETRY_SECONDS
+
+
+def _get_excluded_ids() -> list:
+    now = time.time()
+    with _stats_lock:
+        for listing_id in [k for k, until in _failed_until.items() if until <= now]:
+            del _failed_until[listing_id]
+        return list(_failed_until.keys())
+
+
+def run_settlement_once(batch_size: int = None) -> dict:
+    """认领并结算一批已到期的拍卖，同时记录指标。"""
+    batch_size = batch_size or AUCTION_SETTLEMENT_BATCH_SIZE
+    started = time.perf_counter()
+    result = queries_market.settle_expired_auctions_batch(batch_size, exclude_ids=_get_excluded_ids())
+    _record_batch(result, time.perf_counter() - started)
+    if result["settled"] or result["failed"]:
+        print(f"--- 拍卖结算：成功 {result['settled']} 场，失败 {len(result['failed'])} 场。 ---")
+    return result
+
+
+def run_settlement_loop():
+    """(后台线程) 持续结算到期拍卖。"""
+    print(f"--- 拍卖结算 worker 已启动 (间隔 {AUCTION_SETTLEMENT_INTERVAL_SECONDS}s, 批大小 {AUCTION_SETTLEMENT_BATCH_SIZE}) ---")
+    while True:
+        try:
+            result = run_settlement_once()
+            # 本批认领满了说明还有积压，不休眠直接处理下一批
+            if result["claimed"] >= AUCTION_SETTLEMENT_BATCH_SIZE:
+                continue
+        except Exception as e:
+            print(f"❌ 拍卖结算 worker 出错: {e}")
+        time.sleep(AUCTION_SETTLEMENT_INTERVAL_SECONDS)
+
+
+def start_settlement_worker() -> threading.Thread:
+    """启动结算守护线程 (重复调用不会启动多个线程)。"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return _worker_thread
+    _worker_thread = threading.Thread(target=run_settlement_loop, daemon=True, name="auction-settlement")
+    _worker_thread.start()
+    return _worker_thread
+
+
+def get_settlement_stats() -> dict:
+    """返回结算吞吐量和延迟指标，以及当前的积压情况。"""
+    now = time.time()
+    with _stats_lock:
+        stats = dict(_stats)
+        window_settled = sum(count for ts, count in _recent_batches if ts >= now - _THROUGHPUT_WINDOW_SECONDS)
+        stats["avg_lag_seconds"] = _lag_sum / _stats["total_settled"] if _stats["total_settled"] else 0.0
+        stats["retry_suppressed"] = len(_failed_until)
+
+    stats["throughput_per_minute"] = window_settled * 60.0 / _THROUGHPUT_WINDOW_SECONDS
+    stats["worker_alive"] = bool(_worker_thread and _worker_thread.is_alive())
+    stats["interval_seconds"] = AUCTION_SETTLEMENT_INTERVAL_SECONDS
+    stats["batch_size"] = AUCTION_SETTLEMENT_BATCH_SIZE
+
+    scheduler = auction_scheduler.get_scheduler_stats()
+    stats["scheduler_alive"] = scheduler["alive"]
+    stats["scheduler_pending"] = scheduler["pending"]
+    stats["scheduler_fired"] = scheduler["fired"]
+    stats["scheduler_settled"] = scheduler["settled"]
+    stats["scheduler_dropped"] = scheduler["dropped"]
+    stats["scheduler_notified"] = scheduler["notified"]
+    stats["scheduler_last_fire_delay_seconds"] = scheduler["last_fire_delay_seconds"]
+    stats["scheduler_max_fire_delay_seconds"] = scheduler["max_fire_delay_seconds"]
+
+    backlog = queries_market.get_auction_settlement_backlog()
+    stats["backlog_pending"] = backlog["pending"]
+    stats["backlog_oldest_lag_seconds"] = backlog["oldest_lag_seconds"]
+    return stats
@@ -0,0 +1,151 @@
+# backend/workers/bot_log_writer.py
+
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from backend.db import queries_bots
+
+"""
+机器人日志的缓冲批量写入。
+- BaseBot.log 只把日志行放入内存队列 (O(1)，不访问数据库，不阻塞机器人回合的事件循环)；
+- 后台线程在队列达到 BOT_LOG_FLUSH_SIZE 行或距上次写入超过 BOT_LOG_FLUSH_INTERVAL_SECONDS 时，
+  用一条多行 INSERT 写入 bot_logs；
+- 背压: 积压超过 BOT_LOG_MAX_PENDING 的一半时，非 ERROR 日志只保留每 BOT_LOG_SAMPLE_EVERY 条中的 1 条；
+  积压达到上限时直接丢弃新日志。丢弃和采样的数量记录在统计中；
+- 进程退出 (或应用关闭) 时写完剩余日志。写入失败的批次会被丢弃 (日志尽力而为，不重试)。
+"""
+
+BOT_LOG_FLUSH_SIZE = int(os.getenv("BOT_LOG_FLUSH_SIZE", "200"))
+BOT_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("BOT_LOG_FLUSH_INTERVAL_SECONDS", "2"))
+BOT_LOG_MAX_PENDING = int(os.getenv("BOT_LOG_MAX_PENDING", "20000"))
+BOT_LOG_SAMPLE_EVERY = max(1, int(os.getenv("BOT_LOG_SAMPLE_EVERY", "10")))
+
+# 背压时不参与采样的日志类型
+UNSAMPLED_ACTION_TYPES = {"ERROR"}
+
+_cv = threading.Condition()
+_pending = deque() # (log_id, timestamp, bot_key, bot_username, action_type, message, data_snapshot_json)
+_stats = {"enqueued": 0, "written": 0, "dropped": 0, "sampled_out": 0, "flushes": 0, "failed_flushes": 0, "failed_rows": 0, "last_flush_ms": 0.0}
+_sample_counter = 0
+_stopping = False
+
+_worker_thread = None
+
+
+def enqueue(bot_key: str, bot_username: str, action_type: str, message: str, data_snapshot: dict = None) -> bool:
+    """放入一条日志，返回是否被接受 (背压时可能被采样或丢弃)。首次调用时自动启动写入线程。"""
+    global _sample_counter
+    with _cv:
+        pending = len(_pending)
+        if pending >= BOT_LOG_MAX_PENDING:
+            _stats["dropped"] += 1
+            return False
+        if pending >= BOT_LOG_MAX_PENDING // 2 and action_type not in UNSAMPLED_ACTION_TYPES:
+            _sample_counter += 1
+            if _sample_counter % BOT_LOG_SAMPLE_EVERY:
+                _stats["sampled_out"] += 1
+                return False
+
+    # 序列化在锁外完成
+    data_json = json.dumps(data_snapshot, ensure_ascii=False) if data_snapshot else None
+    row = (str(uuid.uuid4()), datetime.now(timezone.utc), bot_key, bot_username, action_type, message, data_json)
+
+    with _cv:
+        _pending.append(row)
+        _stats["enqueued"] += 1
+        if len(_pending) >= BOT_LOG_FLUSH_SIZE:
+            _cv.notify()
+    if _worker_thread is None:
+        start_bot_log_writer()
+    return True
+
+
+def flush() -> int:
+    """写入当前积压的全部日志 (每批最多 BOT_LOG_FLUSH_SIZE 行)，返回写入的行数。"""
+    written = 0
+    while True:
+        with _cv:
+            if not _pending:
+                break
+            batch = [_pending.popleft() for _ in range(min(BOT_LOG_FLUSH_SIZE, len(_pending)))]
+
+        started = time.perf_counter()
+        try:
+            queries_bots.insert_bot_logs(batch)
+        except Exception as e:
+            print(f"❌ 机器人日志批量写入失败 ({len(batch)} 条已丢弃): {e}")
+            with _cv:
+                _stats["failed_flushes"] += 1
+                _stats["failed_rows"] += len(batch)
+            break
+
+        written += len(batch)
+        with _cv:
+            _stats["written"] += len(batch)
+            _stats["flushes"] += 1
+            _stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+    return written
+
+
+def run_bot_log_writer_loop():
+    """(后台线程) 按数量或时间阈值批量写入。"""
+    print(f"--- 机器人日志写入线程已启动 (每批 {BOT_LOG_FLUSH_SIZE} 条 / {BOT_LOG_FLUSH_INTERVAL_SECONDS} 秒) ---")
+    while True:
+        with _cv:
+            _cv.wait_for(lambda: _stopping or len(_pending) >= BOT_LOG_FLUSH_SIZE, timeout=BOT_LOG_FLUSH_INTERVAL_SECONDS)
+            stopping = _stopping
+        if stopping:
+            return
+        try:
+            flush()
+        except Exception as e:
+            print(f"❌ 机器人日志写入线程出错: {e}")
+
+
+def start_bot_log_writer() -> threading.Thread:
+    """启动写入守护线程 (重复调用不会启动多个线程)。"""
+    global _worker_thread, _stopping
+    with _cv:
+        if _worker_thread and _worker_thread.is_alive():
+            return _worker_thread
+        _stopping = False
+        _worker_thread = threading.Thread(target=run_bot_log_writer_loop, daemon=True, name="bot-log-writer")
+        _worker_thread.start()
+    return _worker_thread
+
+
+def stop_bot_log_writer(timeout: float = 5.0):
+    """停止写入线程并同步写完剩余日志 (应用关闭时调用，可重复调用)。"""
+    global _stopping
+    with _cv:
+        _stopping = True
+        _cv.notify()
+        thread = _worker_thread
+    if thread and thread.is_alive():
+        thread.join(timeout)
+    try:
+        flush()
+    except Exception as e:
+        print(f"❌ 关闭时写入机器人日志失败: {e}")
+
+
+# 进程退出时写完剩余日志 (队列为空时不访问数据库)
+atexit.register(stop_bot_log_writer)
+
+
+def get_bot_log_writer_stats() -> dict:
+    with _cv:
+        return {
+            "alive": bool(_worker_thread and _worker_thread.is_alive()),
+            "pending": len(_pending),
+            "max_pending": BOT_LOG_MAX_PENDING,
+            "flush_size": BOT_LOG_FLUSH_SIZE,
+            "flush_interval_seconds": BOT_LOG_FLUSH_INTERVAL_SECONDS,
+            **_stats,
+        }
@@ -0,0 +1,92 @@
+# backend/workers/key_pool.py
+
+import os
+import time
+import threading
+from collections import deque
+
+from shared.crypto_utils import generate_key_pair
+
+"""
+预生成的 Ed25519 密钥对池。
+- 注册用户、创世用户和创建机器人时由路由层在获取数据库连接之前取出一对现成的 PEM 密钥传给查询层，不在数据库事务中生成和编码密钥；
+- 池中剩余数量低于 KEY_POOL_LOW_WATERMARK 时唤醒后台线程，补充到 KEY_POOL_SIZE；
+- 池为空 (例如一次性创建大量机器人) 时退化为当场生成，不会阻塞调用方。
+- 取出的密钥对不会再次发放；池只存在于内存中，进程重启后重新生成。
+"""
+
+KEY_POOL_SIZE = int(os.getenv("KEY_POOL_SIZE", "64"))
+KEY_POOL_LOW_WATERMARK = int(os.getenv("KEY_POOL_LOW_WATERMARK", "16"))
+
+_cv = threading.Condition()
+_keys = deque() # (private_key_pem, public_key_pem)
+_stats = {"taken": 0, "misses": 0, "generated": 0, "refills": 0, "last_refill_ms": 0.0}
+
+_worker_thread = None
+
+
+def take_key_pair() -> (str, str):
+    """取出一对密钥 (private_key_pem, public_key_pem)，与 generate_key_pair 的返回值相同。"""
+    with _cv:
+        _stats["taken"] += 1
+        pair = _keys.popleft() if _keys else None
+        if len(_keys) < KEY_POOL_LOW_WATERMARK:
+            _cv.notify()
+        if pair is None:
+            _stats["misses"] += 1
+    return pair or generate_key_pair()
+
+
+def refill() -> int:
+    """补充到 KEY_POOL_SIZE，返回新生成的数量。密钥在锁外生成，取用不会等待补充。"""
+    started = time.perf_counter()
+    generated = 0
+    while True:
+        with _cv:
+            if len(_keys) >= KEY_POOL_SIZE:
+                break
+        pair = generate_key_pair()
+        with _cv:
+            _keys.append(pair)
+        generated += 1
+
+    with _cv:
+        _stats["generated"] += generated
+        if generated:
+            _stats["refills"] += 1
+            _stats["last_refill_ms"] = (time.perf_counter() - started) * 1000
+    return generated
+
+
+def run_key_pool_loop():
+    """(后台线程) 低于水位时补充密钥池。"""
+    print(f"--- 密钥池 worker 已启动 (容量 {KEY_POOL_SIZE}, 低水位 {KEY_POOL_LOW_WATERMARK}) ---")
+    while True:
+        try:
+            refill()
+        except Exception as e:
+            print(f"❌ 密钥池补充失败: {e}")
+        with _cv:
+            # 超时兜底: 即使漏掉通知也会定期检查
+            _cv.wait_for(lambda: len(_keys) < KEY_POOL_LOW_WATERMARK, timeout=60)
+
+
+def start_key_pool_worker() -> threading.Thread:
+    """启动补充守护线程 (重复调用不会启动多个线程)。"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return _worker_thread
+    _worker_thread = threading.Thread(target=run_key_pool_loop, daemon=True, name="key-pool")
+    _worker_thread.start()
+    return _worker_thread
+
+
+def get_key_pool_stats() -> dict:
+    with _cv:
+        return {
+            "alive": bool(_worker_thread and _worker_thread.is_alive()),
+            "size": len(_keys),
+            "target_size": KEY_POOL_SIZE,
+            "low_watermark": KEY_POOL_LOW_WATERMARK,
+            **_stats,
+        }
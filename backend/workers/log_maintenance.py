@@ -0,0 +1,112 @@
+# backend/workers/log_maintenance.py
+
+import os
+import time
+import threading
+
+from backend.db import log_retention
+
+"""
+日志表维护 worker (bot_logs / notifications)。
+每 LOG_MAINTENANCE_INTERVAL_SECONDS (默认每小时) 依次执行:
+  1. 创建后续的时间分区；
+  2. 把已结束的整小时 bot_logs 汇总到 bot_log_hourly_rollups；
+  3. DROP 超过保留期的分区 (bot_logs 只删除已汇总的部分)。
+各步骤互不影响，某一步失败只记录错误，下一轮重试。
+"""
+
+LOG_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_duration_ms": 0.0,
+    "last_error": None,
+    "partitions_created": 0,
+    "partitions_dropped": 0,
+    "rollup_rows": 0,
+    "rolled_up_to": None,
+}
+
+_worker_thread = None
+
+
+def _record_error(step: str, e: Exception):
+    print(f"❌ 日志表维护 ({step}) 出错: {e}")
+    with _stats_lock:
+        _stats["errors"] += 1
+        _stats["last_error"] = f"{step}: {e}"
+
+
+def run_maintenance_once() -> dict:
+    """执行一轮维护，返回 {"created", "rollup", "dropped"}。"""
+    started = time.perf_counter()
+    result = {"created": {}, "rollup": None, "dropped": {}}
+
+    try:
+        result["created"] = log_retention.maintain_partitions()
+    except Exception as e:
+        _record_error("create_partitions", e)
+
+    try:
+        result["rollup"] = log_retention.rollup_bot_logs()
+    except Exception as e:
+        _record_error("rollup", e)
+
+    for table in log_retention.PARTITIONED_TABLES:
+        try:
+            result["dropped"][table] = log_retention.drop_expired_partitions(table)
+        except Exception as e:
+            _record_error(f"drop_{table}", e)
+
+    created = sum(len(names) for names in result["created"].values())
+    dropped = sum(len(names) for names in result["dropped"].values())
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["last_run_at"] = time.time()
+        _stats["last_duration_ms"] = (time.perf_counter() - started) * 1000
+        _stats["partitions_created"] += created
+        _stats["partitions_dropped"] += dropped
+        if result["rollup"]:
+            _stats["rollup_rows"] += result["rollup"]["rows"]
+            _stats["rolled_up_to"] = result["rollup"]["rolled_up_to"]
+
+    if created or dropped:
+        print(f"--- 日志表维护：新建 {created} 个分区，删除 {dropped} 个过期分区。 ---")
+    return result
+
+
+def run_maintenance_loop():
+    """(后台线程) 定期维护日志表。"""
+    print(f"--- 日志表维护 worker 已启动 (间隔 {LOG_MAINTENANCE_INTERVAL_SECONDS}s, 分区: {log_retention.LOG_PARTITION_INTERVAL}) ---")
+    while True:
+        try:
+            run_maintenance_once()
+        except Exception as e:
+            _record_error("loop", e)
+        time.sleep(LOG_MAINTENANCE_INTERVAL_SECONDS)
+
+
+def start_log_maintenance_worker() -> threading.Thread:
+    """启动维护守护线程 (重复调用不会启动多个线程)。"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return _worker_thread
+    _worker_thread = threading.Thread(target=run_maintenance_loop, daemon=True, name="log-maintenance")
+    _worker_thread.start()
+    return _worker_thread
+
+
+def get_log_maintenance_stats() -> dict:
+    """维护指标、保留期配置和当前的分区情况。"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["worker_alive"] = bool(_worker_thread and _worker_thread.is_alive())
+    stats["interval_seconds"] = LOG_MAINTENANCE_INTERVAL_SECONDS
+    stats["partition_interval"] = log_retention.LOG_PARTITION_INTERVAL
+    stats["bot_log_retention_days"] = log_retention.BOT_LOG_RETENTION_DAYS
+    stats["notification_retention_days"] = log_retention.NOTIFICATION_RETENTION_DAYS
+    stats["tables"] = log_retention.get_partition_overview()
+    return stats
@@ -0,0 +1,107 @@
+# benchmarks/bench_bot_turns.py
+"""
+机器人回合吞吐量基准: 对比 http (BotClient 经 HTTP 回环) 与 local (LocalBotClient 进程内调用) 两种模式的 turns/sec。
+
+使用数据库中已激活的机器人 (先通过 /admin/bots/create 创建)，每一轮所有机器人并发执行一个回合，
+与 bot_runner 的调度方式相同。
+- --workload read (默认): 回合开始时的状态读取 (余额 / NFT / 市场活动 / 挂单)，不修改数据
+- --workload turn:        完整的机器人逻辑 execute_turn (会真实交易，只应在测试数据库上运行)，
+                          与 bot_runner 相同，每一轮所有机器人共享一个市场快照 (--no-market-snapshot 关闭)
+
+http 模式需要已启动的后端 (--base-url)，并且与 DATABASE_URL 指向同一个数据库。
+
+用法:
+    DATABASE_URL=postgresql://... python benchmarks/bench_bot_turns.py --base-url http://localhost:8000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from backend.db import database  # noqa: E402
+from backend.db import queries_bots  # noqa: E402
+from backend.bots import BOT_LOGIC_MAP  # noqa: E402
+from backend.bots.bot_client import BotClient  # noqa: E402
+from backend.bots.local_client import LocalBotClient  # noqa: E402
+from backend.bots import bot_runner  # noqa: E402
+
+
+async def _read_turn(client, logic):
+    await client.get_balance()
+    await client.get_my_nfts()
+    await client.get_my_activity()
+    await client.get_market_listings("SALE")
+
+
+async def _full_turn(client, logic):
+    await logic.execute_turn()
+
+
+def _build_fleet(client_class, base_url: str, bots: list) -> list:
+    fleet = []
+    for bot in bots:
+        client = client_class(
+            base_url=base_url,
+            username=bot['username'],
+            public_key=bot['public_key'],
+            private_key_pem=bot['private_key_pem'],
+            uid=bot['uid']
+        )
+        fleet.append((client, BOT_LOGIC_MAP[bot['bot_type']](client)))
+    return fleet
+
+
+async def _run_round(fleet: list, turn, market_snapshot: bool):
+    logics = [logic for _, logic in fleet]
+    snapshot = bot_runner.attach_market_snapshot(logics) if market_snapshot else None
+    try:
+        await asyncio.gather(*(turn(client, logic) for client, logic in fleet))
+    finally:
+        if snapshot is not None:
+            bot_runner.detach_market_snapshot(logics, snapshot)
+
+
+async def _run(client_class, base_url: str, bots: list, turn, rounds: int, market_snapshot: bool) -> float:
+    fleet = _build_fleet(client_class, base_url, bots)
+    await _run_round(fleet, turn, market_snapshot) # 预热 (会话登录 / 连接建立)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await _run_round(fleet, turn, market_snapshot)
+    elapsed = time.perf_counter() - started
+    for client, _ in fleet:
+        await client.close()
+    return len(fleet) * rounds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="机器人回合吞吐量基准 (http vs local)")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="http 模式使用的后端地址")
+    parser.add_argument("--rounds", type=int, default=5, help="每种模式执行的轮数")
+    parser.add_argument("--bots", type=int, default=0, help="最多使用的机器人数量 (0 表示全部)")
+    parser.add_argument("--workload", choices=["read", "turn"], default="read")
+    parser.add_argument("--modes", default="http,local", help="逗号分隔: http,local")
+    parser.add_argument("--no-market-snapshot", action="store_true", help="turn 负载下每个机器人各自查询市场挂单")
+    args = parser.parse_args()
+
+    database.initialize_connection_pool()
+    bots = [b for b in queries_bots.get_all_bots(include_inactive=False) if b['bot_type'] in BOT_LOGIC_MAP]
+    if args.bots:
+        bots = bots[:args.bots]
+    if not bots:
+        sys.exit("数据库中没有已激活的机器人，请先通过 /admin/bots/create 创建。")
+
+    turn = _read_turn if args.workload == "read" else _full_turn
+    classes = {"http": BotClient, "local": LocalBotClient}
+
+    print(f"机器人数量: {len(bots)}  轮数: {args.rounds}  负载: {args.workload}")
+    print(f"{'mode':<8}{'turns/s':>12}")
+    for mode in args.modes.split(","):
+        rate = asyncio.run(_run(classes[mode], args.base_url, bots, turn, args.rounds, args.workload == "turn" and not args.no_market_snapshot))
+        print(f"{mode:<8}{rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_ledger_contention.py
+"""
+账本热点账户压测。
+
+多个线程同时与同一个热点账户 (默认 JFJ_ESCROW) 来回转账，统计 transfers/sec 和失败数。
+- ledger: backend.db.ledger.transfer (存储过程，单次往返)
+- legacy: 改造前的 SELECT ... FOR UPDATE + Python 计算 + UPDATE/UPSERT 写法 (保留在本脚本中作为对照)
+
+压测账户 BENCH_LEDGER_* 与流水 (note='bench_ledger') 会在结束后清理，热点账户余额恢复为压测前的值。
+
+用法 (需要能连上数据库，并已运行过一次 init_db):
+    DATABASE_URL=postgresql://... python benchmarks/bench_ledger_contention.py --threads 32 --duration 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from backend.db import ledger  # noqa: E402
+
+BENCH_NOTE = "bench_ledger"
+BENCH_PREFIX = "BENCH_LEDGER_"
+
+
+def _legacy_transfer(conn, from_key, to_key, amount, message_json, note, timestamp):
+    """改造前 _execute_system_tx_logic 的写法: 每侧 SELECT FOR UPDATE + UPDATE/UPSERT。"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT balance FROM balances WHERE public_key = %s FOR UPDATE", (from_key,))
+        row = cursor.fetchone()
+        current = row[0] if row else Decimal(0)
+        if current < amount:
+            raise ledger.InsufficientFundsError(from_key)
+        cursor.execute("UPDATE balances SET balance = %s WHERE public_key = %s", (current - amount, from_key))
+
+        cursor.execute("SELECT balance FROM balances WHERE public_key = %s FOR UPDATE", (to_key,))
+        row = cursor.fetchone()
+        current = row[0] if row else Decimal(0)
+        cursor.execute(
+            """
+            INSERT INTO balances (public_key, balance) VALUES (%s, %s)
+            ON CONFLICT (public_key) DO UPDATE SET balance = EXCLUDED.balance
+            """,
+            (to_key, current + amount)
+        )
+        cursor.execute(
+            "INSERT INTO transactions (tx_id, from_key, to_key, amount, timestamp, message_json, signature, note) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            (str(uuid.uuid4()), from_key, to_key, amount, timestamp, message_json, "ADMIN_SYSTEM", note)
+        )
+
+
+def _ledger_transfer(conn, from_key, to_key, amount, message_json, note, timestamp):
+    ledger.transfer(conn, from_key, to_key, amount, message_json, "ADMIN_SYSTEM", note, timestamp)
+
+
+def _worker(dsn, mode, account, hot_account, deadline, counters, lock):
+    transfer = _ledger_transfer if mode == "ledger" else _legacy_transfer
+    conn = psycopg2.connect(dsn)
+    done, failed = 0, 0
+    try:
+        direction = 0
+        while time.perf_counter() < deadline:
+            # 交替转入/转出热点账户，保证热点账户余额始终足够
+            from_key, to_key = (account, hot_account) if direction == 0 else (hot_account, account)
+            timestamp = time.time()
+            message_json = json.dumps({"from": from_key, "to": to_key, "amount": 1.0, "timestamp": timestamp}, sort_keys=True)
+            try:
+                transfer(conn, from_key, to_key, Decimal(1), message_json, BENCH_NOTE, timestamp)
+                conn.commit()
+                done += 1
+                direction ^= 1
+            except Exception:
+                conn.rollback()
+                failed += 1
+    finally:
+        conn.close()
+    with lock:
+        counters["done"] += done
+        counters["failed"] += failed
+
+
+def _setup(dsn, threads):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+        ledger.install_ledger_function(cursor)
+        for i in range(threads):
+            cursor.execute(
+                "INSERT INTO balances (public_key, balance) VALUES (%s, 1000000) ON CONFLICT (public_key) DO UPDATE SET balance = 1000000",
+                (f"{BENCH_PREFIX}{i}",)
+            )
+
+
+def _get_balance(dsn, public_key):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT balance FROM balances WHERE public_key = %s", (public_key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def _cleanup(dsn, hot_account, hot_balance):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+        if hot_balance is not None:
+            cursor.execute("UPDATE balances SET balance = %s WHERE public_key = %s", (hot_balance, hot_account))
+        cursor.execute("DELETE FROM transactions WHERE note = %s", (BENCH_NOTE,))
+        cursor.execute("DELETE FROM balances WHERE public_key LIKE %s", (BENCH_PREFIX + "%",))
+
+
+def run(dsn, mode, threads, duration, hot_account):
+    _setup(dsn, threads)
+    counters, lock = {"done": 0, "failed": 0}, threading.Lock()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    workers = [
+        threading.Thread(target=_worker, args=(dsn, mode, f"{BENCH_PREFIX}{i}", hot_account, deadline, counters, lock))
+        for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return counters["done"] / elapsed, counters["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JCoin 账本热点账户压测")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--mode", choices=["ledger", "legacy", "both"], default="both")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--hot-account", default="JFJ_ESCROW")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("需要 --dsn 或 DATABASE_URL")
+
+    modes = ["legacy", "ledger"] if args.mode == "both" else [args.mode]
+    hot_balance = _get_balance(args.dsn, args.hot_account)
+    print(f"热点账户: {args.hot_account}  线程: {args.threads}  时长: {args.duration}s")
+    print(f"{'mode':<10}{'transfers/s':>14}{'failed':>10}")
+    try:
+        for mode in modes:
+            tps, failed = run(args.dsn, mode, args.threads, args.duration, args.hot_account)
+            print(f"{mode:<10}{tps:>14.1f}{failed:>10}")
+    finally:
+        _cleanup(args.dsn, args.hot_account, hot_balance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_read_endpoints.py
+"""
+只读接口吞吐量压测。
+
+对正在运行的后端并发请求 /market/listings、/nfts/my、/history、/notifications/my，
+输出每个接口的 requests/sec 和延迟分位数。
+分别在改造前后的版本上运行同一命令即可对比 (同步 def 路由 vs async def + asyncpg)。
+
+用法:
+    python benchmarks/bench_read_endpoints.py --base-url http://localhost:8000 \
+        --public-key <某个用户的公钥> --concurrency 200 --duration 15
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def build_endpoints(public_key: str) -> dict:
+    return {
+        "/market/listings": {"listing_type": "SALE"},
+        "/nfts/my": {"public_key": public_key},
+        "/history": {"public_key": public_key},
+        "/notifications/my": {"public_key": public_key},
+    }
+
+
+async def _worker(client: httpx.AsyncClient, path: str, params: dict, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(path, params=params)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def bench_endpoint(base_url: str, path: str, params: dict, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        # 预热，同时确认接口可用
+        warmup = await client.get(path, params=params)
+        warmup.raise_for_status()
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(client, path, params, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="JCoin 只读接口吞吐量压测")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--public-key", required=True, help="用于 /nfts/my、/history、/notifications/my 的用户公钥")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0, help="每个接口的压测时长 (秒)")
+    parser.add_argument("--only", default=None, help="只压测指定路径，例如 /history")
+    args = parser.parse_args()
+
+    endpoints = build_endpoints(args.public_key)
+    if args.only:
+        endpoints = {args.only: endpoints[args.only]}
+
+    print(f"目标: {args.base_url}  并发: {args.concurrency}  每个接口时长: {args.duration}s")
+    print(f"{'endpoint':<22}{'req/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'mean(ms)':>10}{'errors':>8}")
+    for path, params in endpoints.items():
+        r = await bench_endpoint(args.base_url, path, params, args.concurrency, args.duration)
+        print(f"{r['path']:<22}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['mean_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
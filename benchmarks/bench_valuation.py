@@ -0,0 +1,95 @@
+# benchmarks/bench_valuation.py
+"""
+NFT 估值微基准: 对比逐个调用 calculate_value (Python 闭包) 与 calculate_values (NumPy 批量向量化) 的 NFTs/sec，
+并分别给出批量估值中字段提取 (extract_fields) 和向量化计算 (calculate_values_from_fields) 的耗时。
+
+NFT 数据由各 handler 自己的生成函数产生 (与探索 / 铸造得到的数据结构相同)。
+另取一份其中约 1% 数据不完整 (缺少字段或未知稀有度) 的副本，校验两种方式对每个 NFT 的估值完全一致 (包括失败时的回退值)。
+导入 handler 需要设置 DATABASE_URL (不会连接数据库)。
+
+用法:
+    DATABASE_URL=postgresql://... python benchmarks/bench_valuation.py --count 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from backend.nft_logic.planet import PlanetHandler  # noqa: E402
+from backend.nft_logic.bio_dna import BioDnaHandler  # noqa: E402
+
+PET_RARITIES = ["COMMON", "UNCOMMON", "RARE", "MYTHIC"]
+
+
+def _planet_datas(count: int) -> list:
+    handler = PlanetHandler()
+    return [handler._generate_planet_data("bench-owner", "bench") for _ in range(count)]
+
+
+def _break_planet(data: dict) -> dict:
+    return {**data, "rarity_score": None}
+
+
+def _pet_datas(count: int) -> list:
+    handler = BioDnaHandler()
+    datas = [
+        handler._generate_pet_data("bench-owner", "bench", random.choice(PET_RARITIES), 0)
+        for _ in range(count)
+    ]
+    for data in datas:
+        data['level'] = random.randint(1, 50)
+        data['breeding_count'] = random.randint(0, 6)
+    return datas
+
+
+def _break_pet(data: dict) -> dict:
+    return {**data, "species_rarity": "UNKNOWN"}
+
+
+def _timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def _bench(name: str, handler_class, datas: list, break_data, repeat: int):
+    valuation = handler_class.get_economic_config_and_valuation()
+    calculate_value = valuation["calculate_value_func"]
+    calculate_values = valuation["calculate_values_func"]
+    extract_fields = valuation["extract_fields_func"]
+    calculate_values_from_fields = valuation["calculate_values_from_fields_func"]
+
+    broken = set(random.sample(range(len(datas)), len(datas) // 100))
+    checked = [break_data(data) if i in broken else data for i, data in enumerate(datas)]
+    mismatches = sum(1 for a, b in zip((calculate_value(d) for d in checked), calculate_values(checked)) if a != b)
+
+    scalar = _timed(lambda: [calculate_value(data) for data in datas], repeat)
+    batch = _timed(lambda: calculate_values(datas), repeat)
+    extract = _timed(lambda: extract_fields(datas), repeat)
+    fields = extract_fields(datas)
+    compute = _timed(lambda: calculate_values_from_fields(fields), repeat)
+
+    count = len(datas)
+    print(f"{name:<10}{count / scalar:>14,.0f}{count / batch:>14,.0f}{scalar / batch:>9.1f}x"
+          f"{extract * 1000:>12.1f}{compute * 1000:>12.2f}{mismatches:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NFT 估值微基准 (逐个 vs 批量)")
+    parser.add_argument("--count", type=int, default=100000, help="每种 NFT 的数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复估值的次数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"NFT 数量: {args.count}  重复: {args.repeat}")
+    print(f"{'type':<10}{'scalar NFT/s':>14}{'batch NFT/s':>14}{'speedup':>10}{'extract ms':>12}{'compute ms':>12}{'mismatches':>12}")
+    _bench("PLANET", PlanetHandler, _planet_datas(args.count), _break_planet, args.repeat)
+    _bench("BIO_DNA", BioDnaHandler, _pet_datas(args.count), _break_pet, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_verify_signature.py
+"""
+签名验证微基准 (单线程，即每核吞吐量)。
+
+对比两种方式的 verifies/sec:
+- uncached: 每次验签都重新解析 PEM 公钥 (改造前 verify_signature 的做法)
+- cached:   通过 shared.crypto_utils._load_public_key 的 LRU 缓存取已解析的公钥
+另外给出 verify_signature 整体函数 (含指标记录) 的吞吐量。
+
+--keys 控制参与验签的不同公钥数量，用于模拟多用户场景下的缓存命中率。
+
+用法:
+    python benchmarks/bench_verify_signature.py --duration 3 --keys 100
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+from cryptography.hazmat.primitives import serialization
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from shared import crypto_utils  # noqa: E402
+
+
+def _build_samples(key_count: int) -> list:
+    samples = []
+    for i in range(key_count):
+        private_key_str, public_key_str = crypto_utils.generate_key_pair()
+        message = {"owner_key": public_key_str, "listing_id": f"bench-{i}", "timestamp": time.time()}
+        message_json = json.dumps(message, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        signature = crypto_utils.sign_message(private_key_str, message)
+        samples.append((public_key_str, message_json, signature))
+    return samples
+
+
+def _verify_uncached(public_key_str, message_json, signature):
+    public_key = serialization.load_pem_public_key(public_key_str.encode('utf-8'))
+    public_key.verify(base64.b64decode(signature.encode('utf-8')), message_json.encode('utf-8'))
+
+
+def _verify_cached(public_key_str, message_json, signature):
+    public_key = crypto_utils._load_public_key(public_key_str)
+    public_key.verify(base64.b64decode(signature.encode('utf-8')), message_json.encode('utf-8'))
+
+
+def _verify_full(public_key_str, message_json, signature):
+    if not crypto_utils.verify_signature(public_key_str, message_json, signature):
+        raise RuntimeError("签名验证失败")
+
+
+def _run(func, samples: list, duration: float) -> float:
+    count = 0
+    n = len(samples)
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        func(*samples[count % n])
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ed25519 验签微基准")
+    parser.add_argument("--duration", type=float, default=3.0, help="每种方式的压测时长 (秒)")
+    parser.add_argument("--keys", type=int, default=100, help="不同公钥的数量")
+    args = parser.parse_args()
+
+    samples = _build_samples(args.keys)
+    crypto_utils._load_public_key.cache_clear()
+
+    print(f"公钥数量: {args.keys}  每项时长: {args.duration}s  (单线程)")
+    print(f"{'mode':<18}{'verifies/s':>14}")
+    for name, func in (("uncached", _verify_uncached), ("cached", _verify_cached)):
+        print(f"{name:<18}{_run(func, samples, args.duration):>14.0f}")
+
+    print(f"{'verify_signature':<18}{_run(_verify_full, samples, args.duration):>14.0f}")
+    print(f"缓存统计: {crypto_utils.get_public_key_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
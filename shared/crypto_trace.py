@@ -0,0 +1,98 @@
+# shared/crypto_trace.py
+
+import os
+import time
+import random
+import threading
+
+"""
+加密操作的分级、采样追踪与指标。
+- 验签路径默认不做任何 I/O: 只更新内存中的计数器和延迟直方图；
+- CRYPTO_TRACE_LEVEL: off (默认) / error / info / debug。debug 会输出公钥前缀和消息字节，仅用于排查签名不一致；
+- CRYPTO_TRACE_SAMPLE_RATE: 0~1，开启追踪后按比例采样输出，避免机器人高负载时刷屏。
+"""
+
+TRACE_LEVELS = {"off": 0, "error": 1, "info": 2, "debug": 3}
+
+# 验签耗时直方图的桶上界 (微秒)，最后一个桶收集所有更慢的验签
+VERIFY_HISTOGRAM_BUCKETS_US = (50, 100, 200, 500, 1000, 5000)
+
+# 验签失败原因
+FAILURE_INVALID_SIGNATURE = "invalid_signature"
+FAILURE_BAD_PUBLIC_KEY = "bad_public_key"
+FAILURE_BAD_SIGNATURE_ENCODING = "bad_signature_encoding"
+FAILURE_ERROR = "error"
+
+_trace_level = TRACE_LEVELS.get(os.getenv("CRYPTO_TRACE_LEVEL", "off").lower(), 0)
+_sample_rate = min(1.0, max(0.0, float(os.getenv("CRYPTO_TRACE_SAMPLE_RATE", "1.0"))))
+
+_lock = threading.Lock()
+_verify_count = 0
+_verify_failed = 0
+_failure_reasons = {}
+_total_verify_us = 0.0
+_max_verify_us = 0.0
+_verify_histogram = [0] * (len(VERIFY_HISTOGRAM_BUCKETS_US) + 1)
+
+
+def configure(level: str = None, sample_rate: float = None):
+    """运行时调整追踪级别和采样率 (例如排查问题时临时开启)。"""
+    global _trace_level, _sample_rate
+    if level is not None:
+        if level.lower() not in TRACE_LEVELS:
+            raise ValueError(f"无效的追踪级别: {level}")
+        _trace_level = TRACE_LEVELS[level.lower()]
+    if sample_rate is not None:
+        _sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+
+def enabled(level: str) -> bool:
+    """指定级别的追踪是否会输出 (含采样)。调用方应先判断，再构造需要输出的内容。"""
+    if _trace_level < TRACE_LEVELS[level]:
+        return False
+    return _sample_rate >= 1.0 or random.random() < _sample_rate
+
+
+def trace(level: str, event: str, **fields):
+    """输出一条追踪记录。调用前应先用 enabled() 判断，避免无谓的格式化开销。"""
+    details = " ".join(f"{k}={v!r}" for k, v in fields.items())
+    print(f"[crypto:{level}] {event} {details}")
+
+
+def record_verify(elapsed_seconds: float, failure_reason: str = None):
+    """记录一次验签的耗时和结果。"""
+    global _verify_count, _verify_failed, _total_verify_us, _max_verify_us
+    elapsed_us = elapsed_seconds * 1_000_000
+    with _lock:
+        _verify_count += 1
+        _total_verify_us += elapsed_us
+        if elapsed_us > _max_verify_us:
+            _max_verify_us = elapsed_us
+        for i, upper in enumerate(VERIFY_HISTOGRAM_BUCKETS_US):
+            if elapsed_us <= upper:
+                _verify_histogram[i] += 1
+                break
+        else:
+            _verify_histogram[-1] += 1
+        if failure_reason:
+            _verify_failed += 1
+            _failure_reasons[failure_reason] = _failure_reasons.get(failure_reason, 0) + 1
+
+
+def get_verify_stats() -> dict:
+    """返回验签指标快照。"""
+    with _lock:
+        histogram = {}
+        for i, upper in enumerate(VERIFY_HISTOGRAM_BUCKETS_US):
+            histogram[f"le_{upper}us"] = _verify_histogram[i]
+        histogram[f"gt_{VERIFY_HISTOGRAM_BUCKETS_US[-1]}us"] = _verify_histogram[-1]
+        return {
+            "verified": _verify_count - _verify_failed,
+            "failed": _verify_failed,
+            "failure_reasons": dict(_failure_reasons),
+            "avg_verify_us": _total_verify_us / _verify_count if _verify_count else 0.0,
+            "max_verify_us": _max_verify_us,
+            "latency_histogram": histogram,
+            "trace_level": next(name for name, value in TRACE_LEVELS.items() if value == _trace_level),
+            "trace_sample_rate": _sample_rate,
+        }
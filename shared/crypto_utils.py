@@ -1,15 +1,61 @@
 # backend/shared/crypto_utils.py
 
+import os
 import json
+import time
+import functools
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import ed25519
 from cryptography.exceptions import InvalidSignature
 import base64
+from shared import crypto_trace
 
 """
 使用 Ed25519 算法进行加密操作。
 """
 
+# 已解析公钥的 LRU 缓存容量。PEM 解析的开销远大于一次 Ed25519 验签，同一用户的请求应复用解析结果
+PUBLIC_KEY_CACHE_SIZE = int(os.getenv("PUBLIC_KEY_CACHE_SIZE", "4096"))
+# 已解析私钥的 LRU 缓存容量 (sign_message 按 PEM 字符串复用解析结果，容量应覆盖整个机器人群)
+PRIVATE_KEY_CACHE_SIZE = int(os.getenv("PRIVATE_KEY_CACHE_SIZE", "2048"))
+
+# --- 规范化 JSON ---
+# 后端和机器人共用的签名消息序列化: 键排序 (包括嵌套字典)、紧凑分隔符、保留非 ASCII 字符。
+# 复用同一个编码器实例，避免 json.dumps 在非默认参数下每次都新建 JSONEncoder。
+_CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+def canonical_json(message: dict) -> str:
+    """返回消息的规范化 JSON 字符串 (签名和验签的字节来源)。"""
+    return _CANONICAL_ENCODER.encode(message)
+
+@functools.lru_cache(maxsize=PRIVATE_KEY_CACHE_SIZE)
+def _load_private_key(private_key_str: str) -> ed25519.Ed25519PrivateKey:
+    """解析 PEM 私钥 (带 LRU 缓存)。非 Ed25519 私钥抛出 ValueError；解析失败不会被缓存。"""
+    private_key = serialization.load_pem_private_key(private_key_str.encode('utf-8'), password=None)
+    if not isinstance(private_key, ed25519.Ed25519PrivateKey):
+        raise ValueError("不是 Ed25519 私钥")
+    return private_key
+
+@functools.lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def _load_public_key(public_key_str: str) -> ed25519.Ed25519PublicKey:
+    """解析 PEM 公钥 (带 LRU 缓存)。非 Ed25519 公钥抛出 ValueError；解析失败不会被缓存。"""
+    public_key = serialization.load_pem_public_key(public_key_str.encode('utf-8'))
+    if not isinstance(public_key, ed25519.Ed25519PublicKey):
+        raise ValueError("不是 Ed25519 公钥")
+    return public_key
+
+def get_public_key_cache_stats() -> dict:
+    """返回公钥缓存的命中/未命中次数和当前大小。"""
+    info = _load_public_key.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
 def generate_key_pair():
     """生成一对新的 Ed25519 密钥（公钥和私钥）。"""
     private_key = ed25519.Ed25519PrivateKey.generate()
@@ -31,25 +77,67 @@ def sign_message(private_key_str: str, message: dict) -> str:
     这会创建后端的规范化 JSON 字符串。
     """
     try:
-        private_key = serialization.load_pem_private_key(
-            private_key_str.encode('utf-8'),
-            password=None
-        )
-        
-        # --- 核心：后端的规范化定义 ---
-        message_bytes = json.dumps(
-            message, 
-            sort_keys=True, 
-            ensure_ascii=False, 
-            separators=(',', ':')
-        ).encode('utf-8')
-        
-        signature = private_key.sign(message_bytes)
+        private_key = _load_private_key(private_key_str)
+        signature = private_key.sign(canonical_json(message).encode('utf-8'))
         return base64.b64encode(signature).decode('utf-8')
     except Exception as e:
-        print(f"签名时出错: {e}")
+        if crypto_trace.enabled("error"):
+            crypto_trace.trace("error", "sign_failed", error=str(e))
         return None
 
+class SigningContext:
+    """
+    持有已解析私钥的签名上下文 (每个机器人一个)，签名时不再解析 PEM。
+    sign() 返回 API 需要的 {"message_json", "signature"} 载荷，message_json 即被签名的规范化字符串。
+    """
+
+    def __init__(self, private_key_str: str):
+        self.private_key = _load_private_key(private_key_str)
+        self.public_key_str = self.private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+
+    def sign(self, message: dict) -> dict:
+        message_json = canonical_json(message)
+        signature = self.private_key.sign(message_json.encode('utf-8'))
+        return {"message_json": message_json, "signature": base64.b64encode(signature).decode('ascii')}
+
+def _verify_message_bytes(public_key_str: str, message_bytes: bytes, signature_b64_str: str, mode: str) -> bool:
+    """验签核心逻辑: 只记录指标，追踪默认关闭 (见 shared.crypto_trace)。"""
+    started = time.perf_counter()
+    failure = None
+    try:
+        try:
+            public_key = _load_public_key(public_key_str)
+        except Exception:
+            failure = crypto_trace.FAILURE_BAD_PUBLIC_KEY
+            return False
+        try:
+            signature = base64.b64decode(signature_b64_str.encode('utf-8'))
+        except Exception:
+            failure = crypto_trace.FAILURE_BAD_SIGNATURE_ENCODING
+            return False
+        try:
+            public_key.verify(signature, message_bytes)
+        except InvalidSignature:
+            failure = crypto_trace.FAILURE_INVALID_SIGNATURE
+            return False
+        return True
+    except Exception:
+        failure = crypto_trace.FAILURE_ERROR
+        return False
+    finally:
+        crypto_trace.record_verify(time.perf_counter() - started, failure)
+        if failure and crypto_trace.enabled("error"):
+            # 跳过 PEM 头 "-----BEGIN PUBLIC KEY-----\n"，只输出公钥正文的前 20 个字符
+            crypto_trace.trace("error", "verify_failed", mode=mode, reason=failure, public_key=(public_key_str or "")[27:47])
+        if crypto_trace.enabled("debug"):
+            crypto_trace.trace(
+                "debug", "verify", mode=mode, ok=failure is None,
+                public_key=(public_key_str or "")[:50], signature=signature_b64_str, message_bytes=message_bytes
+            )
+
 def _verify_signature_from_dict(public_key_str: str, message: dict, signature_b64_str: str) -> bool:
     """
     (内部使用，供机器人验证) 
@@ -57,39 +145,12 @@ def _verify_signature_from_dict(public_key_str: str, message: dict, signature_b6
     注意：此函数会重新序列化字典。
     """
     try:
-        public_key = serialization.load_pem_public_key(
-            public_key_str.encode('utf-8')
-        )
-
-        # --- 核心：后端的规范化定义 ---
-        message_bytes = json.dumps(
-            message, 
-            sort_keys=True, 
-            ensure_ascii=False, 
-            separators=(',', ':')
-        ).encode('utf-8')
-
-        # --- 调试日志（可以保留） ---
-        print("\n--- Python Backend Crypto Debug (Dict Mode) ---")
-        print(f"1. Public Key (first 50 chars): {public_key_str[:50]}")
-        print(f"2. Received Signature (Base64): {signature_b64_str}")
-        print(f"3. Canonical Message Bytes for Verification: {message_bytes!r}")
-        print("-----------------------------------")
-
-        signature = base64.b64decode(signature_b64_str.encode('utf-8'))
-
-        # 验证
-        public_key.verify(signature, message_bytes)
-        print("✅ SIGNATURE VERIFICATION SUCCESSFUL (Dict Mode)\n")
-        return True
-    except InvalidSignature:
-        print("❌ SIGNATURE VERIFICATION FAILED: InvalidSignature exception caught.\n")
-        return False
-    except Exception as e:
-        print(f"❌ An error occurred during signature verification: {e}\n")
+        message_bytes = canonical_json(message).encode('utf-8')
+    except (TypeError, ValueError):
+        crypto_trace.record_verify(0.0, crypto_trace.FAILURE_ERROR)
         return False
+    return _verify_message_bytes(public_key_str, message_bytes, signature_b64_str, "dict")
 
-# +++ 核心改动：添加这个新函数 +++
 def verify_signature(public_key_str: str, message_json_str: str, signature_b64_str: str) -> bool:
     """
     (供前端 API 使用)
@@ -97,43 +158,18 @@ def verify_signature(public_key_str: str, message_json_str: str, signature_b64_s
     这确保了我们验证的是与前端签名完全相同的字节。
     """
     try:
-        public_key = serialization.load_pem_public_key(
-            public_key_str.encode('utf-8')
-        )
-
         # --- 核心：直接使用原始字符串 ---
         message_bytes = message_json_str.encode('utf-8')
-
-        # --- 调试日志 ---
-        print("\n--- Python Backend Crypto Debug (String Mode) ---")
-        print(f"1. Public Key (first 50 chars): {public_key_str[:50]}")
-        print(f"2. Received Signature (Base64): {signature_b64_str}")
-        print(f"3. Raw Message Bytes for Verification: {message_bytes!r}")
-        print("-----------------------------------")
-
-        signature = base64.b64decode(signature_b64_str.encode('utf-8'))
-
-        # 验证
-        public_key.verify(signature, message_bytes)
-        print("✅ SIGNATURE VERIFICATION SUCCESSFUL (String Mode)\n")
-        return True
-    except InvalidSignature:
-        print("❌ SIGNATURE VERIFICATION FAILED: InvalidSignature exception caught.\n")
-        return False
-    except Exception as e:
-        print(f"❌ An error occurred during signature verification: {e}\n")
+    except AttributeError:
+        crypto_trace.record_verify(0.0, crypto_trace.FAILURE_ERROR)
         return False
-# +++ 核心改动结束 +++
+    return _verify_message_bytes(public_key_str, message_bytes, signature_b64_str, "string")
 
 
 def get_public_key_from_private(private_key_str: str) -> str:
     """(辅助功能) 从私钥推导出公钥。"""
     try:
-        private_key = serialization.load_pem_private_key(
-            private_key_str.encode('utf-8'),
-            password=None
-        )
-        public_key = private_key.public_key()
+        public_key = _load_private_key(private_key_str).public_key()
         public_key_str = public_key.public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo
@@ -0,0 +1,39 @@
+# tests/test_aio_placeholders.py
+
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test") # 只导入模块，不连接数据库
+
+import pytest
+
+from backend.db.aio.database import to_asyncpg_placeholders
+from backend.db.queries_market import build_market_listings_query
+
+
+def test_placeholders_are_numbered_in_order():
+    assert to_asyncpg_placeholders("SELECT %s, %s WHERE a = %s") == "SELECT $1, $2 WHERE a = $3"
+
+
+def test_escaped_percent_is_not_a_placeholder():
+    query = "SELECT * FROM t WHERE name LIKE 'a%%' AND x ILIKE %s AND y = %s || '%%s'"
+    assert to_asyncpg_placeholders(query) == "SELECT * FROM t WHERE name LIKE 'a%' AND x ILIKE $1 AND y = $2 || '%s'"
+
+
+def test_query_without_placeholders_is_unchanged():
+    assert to_asyncpg_placeholders("SELECT 1") == "SELECT 1"
+
+
+@pytest.mark.parametrize("query", ["SELECT %(name)s", "SELECT 100 % 7", "SELECT %"])
+def test_unsupported_placeholders_are_rejected(query):
+    with pytest.raises(ValueError):
+        to_asyncpg_placeholders(query)
+
+
+def test_market_listings_query_placeholder_count_matches_params():
+    query, params, _ = build_market_listings_query(
+        "SALE", exclude_owner="key", search_term="50%_off", nft_type="PLANET",
+        min_price=1, max_price=10, sort="price_asc", limit=20
+    )
+    converted = to_asyncpg_placeholders(query)
+    assert "%s" not in converted
+    assert f"${len(params)}" in converted and f"${len(params) + 1}" not in converted
@@ -0,0 +1,90 @@
+# tests/test_batch_valuation.py
+
+import os
+import math
+import random
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test") # 只导入模块，不连接数据库
+
+import pytest
+
+from backend.nft_logic.planet import PlanetHandler
+from backend.nft_logic.bio_dna import BioDnaHandler
+
+
+def _planets(count: int) -> list:
+    handler = PlanetHandler()
+    return [handler._generate_planet_data("test-owner", "test") for _ in range(count)]
+
+
+def _pets(count: int) -> list:
+    handler = BioDnaHandler()
+    datas = []
+    for _ in range(count):
+        data = handler._generate_pet_data("test-owner", "test", random.choice(["COMMON", "UNCOMMON", "RARE", "MYTHIC"]), 0)
+        data['level'] = random.randint(1, 50)
+        data['breeding_count'] = random.randint(0, 6)
+        datas.append(data)
+    return datas
+
+
+# 每一项: 把一个正常的 NFT 改成数据异常的 NFT
+PLANET_BREAKERS = [
+    lambda d: {**d, "rarity_score": None},
+    lambda d: {**d, "rarity_score": {**d["rarity_score"], "total": None}},
+    lambda d: {**d, "rarity_score": {**d["rarity_score"], "total": "5"}},
+    lambda d: {**d, "economic_stats": {**d["economic_stats"], "total_jph": "12.5"}},
+    lambda d: {**d, "economic_stats": {**d["economic_stats"], "total_jph": math.nan}},
+    lambda d: {**d, "economic_stats": {**d["economic_stats"], "total_jph": math.inf}},
+    lambda d: {**d, "rarity_score": {**d["rarity_score"], "total": True}},
+]
+
+PET_BREAKERS = [
+    lambda d: {**d, "species_rarity": "UNKNOWN"},
+    lambda d: {**d, "level": None},
+    lambda d: {**d, "level": "5"},
+    lambda d: {**d, "level": math.nan},
+    lambda d: {**d, "breeding_count": "2"},
+    lambda d: {**d, "economic_stats": {**d["economic_stats"], "total_jph": None}},
+    lambda d: {**d, "economic_stats": {**d["economic_stats"], "total_jph": -math.inf}},
+    lambda d: {**d, "visible_traits": None},
+    lambda d: {**d, "level": False},
+]
+
+
+def _assert_equivalent(handler_class, datas: list):
+    valuation = handler_class.get_economic_config_and_valuation()
+    scalar = [valuation["calculate_value_func"](data) for data in datas]
+    batch = list(valuation["calculate_values_func"](datas))
+    assert batch == scalar
+
+
+@pytest.mark.parametrize("handler_class, generate, breakers", [
+    (PlanetHandler, _planets, PLANET_BREAKERS),
+    (BioDnaHandler, _pets, PET_BREAKERS),
+])
+def test_batch_matches_scalar_on_clean_data(handler_class, generate, breakers):
+    random.seed(0)
+    _assert_equivalent(handler_class, generate(500))
+
+
+@pytest.mark.parametrize("handler_class, generate, breakers", [
+    (PlanetHandler, _planets, PLANET_BREAKERS),
+    (BioDnaHandler, _pets, PET_BREAKERS),
+])
+def test_batch_matches_scalar_with_malformed_rows(handler_class, generate, breakers):
+    random.seed(1)
+    datas = generate(200)
+    for i, breaker in enumerate(breakers):
+        datas[i * 7] = breaker(datas[i * 7])
+    _assert_equivalent(handler_class, datas)
+
+
+@pytest.mark.parametrize("handler_class, generate, breakers", [
+    (PlanetHandler, _planets, PLANET_BREAKERS),
+    (BioDnaHandler, _pets, PET_BREAKERS),
+])
+def test_each_malformed_row_alone(handler_class, generate, breakers):
+    random.seed(2)
+    for breaker in breakers:
+        _assert_equivalent(handler_class, [breaker(data) for data in generate(3)])
@@ -0,0 +1,77 @@
+# tests/test_market_cursor.py
+
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test") # 只导入模块，不连接数据库
+
+from decimal import Decimal
+
+import pytest
+
+from backend.db import database
+from backend.db.aio.database import to_asyncpg_placeholders
+from backend.db.queries_market import (
+    MARKET_LISTING_SORTS, build_market_listings_query, decode_listing_cursor,
+    encode_listing_cursor, paginate_market_listings,
+)
+
+RANK_SQL = "round(word_similarity(%s, l.search_text)::numeric, 6)"
+
+
+@pytest.fixture
+def pg_trgm(monkeypatch):
+    monkeypatch.setattr(database, "_pg_trgm_available", True)
+
+
+def _rank_rows(ranks):
+    # 模拟数据库返回的行: round(...)::numeric 经 psycopg2/asyncpg 读出为 Decimal
+    return [
+        {"listing_id": f"id-{i:02d}", "_search_rank": rank, "_current_price": Decimal("1"), "_cursor_created_at": None}
+        for i, rank in enumerate(ranks)
+    ]
+
+
+def test_relevance_sort_uses_rounded_numeric_rank():
+    assert MARKET_LISTING_SORTS["relevance"][0] == RANK_SQL
+
+
+def test_relevance_query_compares_the_selected_rank(pg_trgm):
+    cursor = encode_listing_cursor("relevance", {"listing_id": "id-03", "_search_rank": Decimal("0.333333")})
+    query, params, sort = build_market_listings_query("SALE", search_term="dragon", sort="relevance", cursor=cursor)
+
+    assert sort == "relevance"
+    # 选出的列、游标比较和 ORDER BY 使用同一个表达式，游标参数为精确的 Decimal
+    assert f"{RANK_SQL} as _search_rank" in query
+    assert f"({RANK_SQL}, l.listing_id) < (%s, %s)" in query
+    assert f"ORDER BY {RANK_SQL} DESC, l.listing_id DESC" in query
+    assert query.count("%s") == len(params)
+    assert to_asyncpg_placeholders(query).count("$") == len(params)
+    assert params == ["dragon", "SALE", "%dragon%", "dragon", Decimal("0.333333"), "id-03", "dragon", 51]
+
+
+def test_cursor_round_trip_over_tied_ranks():
+    # 同一相关度的行跨越分页边界: 游标中的值必须与数据库中的排序值完全相等
+    rows = _rank_rows([Decimal("0.333333")] * 5 + [Decimal("0.25")])
+    # 按 (rank, listing_id) DESC 的行比较取剩余的行: 并列的行既不重复也不遗漏
+    ordered = sorted(rows, key=lambda r: (r["_search_rank"], r["listing_id"]), reverse=True)
+    seen, cursor = [], None
+    while True:
+        if cursor:
+            value, listing_id = decode_listing_cursor(cursor, "relevance")
+            remaining = [r for r in ordered if (r["_search_rank"], r["listing_id"]) < (value, listing_id)]
+        else:
+            remaining = ordered
+        page = paginate_market_listings([dict(r) for r in remaining[:3]], "relevance", 2)
+        if page["next_cursor"]:
+            assert decode_listing_cursor(page["next_cursor"], "relevance")[0] == remaining[1]["_search_rank"]
+        seen.extend(r["listing_id"] for r in page["listings"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [r["listing_id"] for r in ordered]
+
+
+def test_cursor_for_another_sort_is_rejected():
+    cursor = encode_listing_cursor("relevance", {"listing_id": "id-01", "_search_rank": Decimal("0.5")})
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "price_asc")
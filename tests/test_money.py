@@ -0,0 +1,39 @@
+# tests/test_money.py
+
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test") # 只导入模块，不连接数据库
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from shared.crypto_utils import generate_key_pair, SigningContext
+from backend.api import routes_user
+from backend.api.models import TransactionMessage
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(routes_user.router)
+    return TestClient(app)
+
+
+def test_money_accepts_six_decimals():
+    assert TransactionMessage(from_key="a", to_key="b", amount=0.000001, timestamp=0).amount == 0.000001
+
+
+@pytest.mark.parametrize("amount", [0.0000001, 1.0000004, 12.3456785])
+def test_money_rejects_more_than_six_decimals(amount):
+    with pytest.raises(ValidationError):
+        TransactionMessage(from_key="a", to_key="b", amount=amount, timestamp=0)
+
+
+def test_signed_transaction_with_over_precise_amount_is_rejected():
+    private_key, public_key = generate_key_pair()
+    message = {"from_key": public_key, "to_key": public_key, "amount": 1.0000001, "timestamp": time.time()}
+    response = _client().post("/transaction", json=SigningContext(private_key).sign(message))
+
+    assert response.status_code == 422
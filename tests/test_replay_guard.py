@@ -0,0 +1,70 @@
+# tests/test_replay_guard.py
+
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test") # 只导入模块，不连接数据库
+
+import pytest
+
+from backend.db import replay_guard
+
+
+@pytest.fixture(autouse=True)
+def _reset_guard():
+    replay_guard.reset()
+    yield
+    replay_guard.reset()
+
+
+def test_replayed_message_is_rejected():
+    now = time.time()
+    assert replay_guard.check_and_record('{"a":1}', now)[0]
+    assert not replay_guard.check_and_record('{"a":1}', now)[0]
+
+
+def test_released_message_can_be_resubmitted_once():
+    now = time.time()
+    assert replay_guard.check_and_record('{"a":1}', now)[0]
+    replay_guard.release('{"a":1}', now)
+    assert replay_guard.get_replay_guard_stats()["entries"] == 0
+
+    assert replay_guard.check_and_record('{"a":1}', now)[0]
+    assert not replay_guard.check_and_record('{"a":1}', now)[0]
+
+
+def test_release_of_unknown_message_keeps_other_entries():
+    now = time.time()
+    replay_guard.check_and_record('{"a":1}', now)
+    replay_guard.release('{"b":2}', now)
+    assert replay_guard.get_replay_guard_stats()["entries"] == 1
+    assert not replay_guard.check_and_record('{"a":1}', now)[0]
+
+
+def _signed(message_json: str, timestamp: float):
+    from types import SimpleNamespace
+    return SimpleNamespace(message_json=message_json), SimpleNamespace(timestamp=timestamp)
+
+
+def test_failed_single_operation_releases_its_message():
+    from fastapi import HTTPException
+    from backend.api.dependencies import release_on_failure
+
+    now = time.time()
+    request, message = _signed('{"a":1}', now)
+    assert replay_guard.check_and_record(request.message_json, now)[0]
+    with pytest.raises(HTTPException):
+        with release_on_failure(request, message):
+            raise HTTPException(status_code=400, detail="余额不足")
+    assert replay_guard.check_and_record(request.message_json, now)[0]
+
+
+def test_committed_single_operation_keeps_its_message():
+    from backend.api.dependencies import release_on_failure
+
+    now = time.time()
+    request, message = _signed('{"a":1}', now)
+    assert replay_guard.check_and_record(request.message_json, now)[0]
+    with release_on_failure(request, message):
+        pass
+    assert not replay_guard.check_and_record(request.message_json, now)[0]